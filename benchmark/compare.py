@@ -0,0 +1,67 @@
+"""Compare two benchmark.suite results and report regressions
+
+python -m benchmark.compare base.json new.json --threshold 0.2
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# metrics where a bigger number is worse
+_metric_list = [
+    "cold_boot_seconds",
+    "idle_cpu_percent",
+    "rss_bytes_per_runner",
+    "list_latency.p50",
+    "stop_latency.p50",
+    "start_latency.p50",
+    "restart_storm_seconds",
+    "restart_storm_cpu_seconds",
+]
+
+
+def _get_metric(result: dict, metric: str) -> float or None:
+    for key in metric.split("."):
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(base: dict, new: dict, threshold: float) -> list[str]:
+    regression_list = []
+    base_size_dict = {size["runner_num"]: size for size in base["sizes"]}
+    for new_size in new["sizes"]:
+        runner_num = new_size["runner_num"]
+        base_size = base_size_dict.get(runner_num)
+        if base_size is None:
+            continue
+        for metric in _metric_list:
+            base_value = _get_metric(base_size, metric)
+            new_value = _get_metric(new_size, metric)
+            if not base_value or new_value is None:
+                continue
+            change = (new_value - base_value) / base_value
+            line = f"{runner_num:>6} {metric:<28} {base_value:>12.4g} {new_value:>12.4g} {change:>+8.1%}"
+            if change > threshold:
+                line += "  REGRESSION"
+                regression_list.append(line)
+            print(line)
+    return regression_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base", type=str)
+    parser.add_argument("new", type=str)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+    base = json.loads(Path(args.base).read_text())
+    new = json.loads(Path(args.new).read_text())
+    if compare(base, new, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compare path selectors of the command line: linear filters vs PathIndex
+
+python -m benchmark.path_select --num 50000
+"""
+
+import argparse
+import json
+from time import perf_counter
+
+from juststart.path_index import PathIndex
+from juststart.path_utils import filter_path_list, is_parent_dir
+
+
+def build_path_list(num: int) -> list[str]:
+    return sorted(
+        (
+            f"/srv/group{i % 100}/service{i}/run@{i % 4}"
+            if i % 5 == 0
+            else f"/srv/group{i % 100}/service{i}/run"
+        )
+        for i in range(num)
+    )
+
+
+def _time(func, repeat: int) -> float:
+    start = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--num", type=int, default=50000, help="Number of paths")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per selector")
+    args = parser.parse_args()
+
+    path_list = build_path_list(args.num)
+    start = perf_counter()
+    path_index = PathIndex(path_list)
+    result = {"path_num": len(path_list), "index_build": perf_counter() - start}
+    for selector in ["service42", "/srv/group7/*", "*@3", "group9/service"]:
+        result[selector] = {
+            "linear": _time(lambda: filter_path_list(selector, path_list), 1),
+            "index": _time(lambda: path_index.select(selector), args.repeat),
+        }
+    parent_list = ["/srv/group1", "/srv/group2"]
+    result["children"] = {
+        "linear": _time(
+            lambda: [a for p in parent_list for a in path_list if is_parent_dir(p, a)],
+            1,
+        ),
+        "index": _time(
+            lambda: [a for p in parent_list for a in path_index.select_children(p)],
+            args.repeat,
+        ),
+    }
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Report the memory cost of every Runner object
+
+python -m benchmark.runner_memory --num 10000
+python -m benchmark.runner_memory --num 10000 --rev HEAD~20
+
+Runners are built in this process with the Runner class of the tree, or with
+the one of the git revision given by --rev for a before and after comparison.
+Only Runner objects are measured, benchmark.suite reports the RSS of a daemon
+per supervised runner.
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from juststart.runner import Runner
+from juststart.runner_status import BOOTING, RUNNING, RUNNING_READY
+
+
+def _get_rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def build_runner_list(num: int) -> list[Runner]:
+    runner_list = []
+    for i in range(num):
+        # every runner resolves its own env dict, as get_runner_config does
+        env = dict(os.environ) | {"SERVICE_GROUP": str(i % 10)}
+        runner = Runner(
+            path=f"/srv/service/{i}/run",
+            args=["--port", str(8000 + i)],
+            env=env,
+            auto_restart=-1,
+            stdin=f"/run/juststart/runner/srv/service/{i}/std/in",
+            stdout=f"/run/juststart/runner/srv/service/{i}/std/log",
+            stderr=f"/run/juststart/runner/srv/service/{i}/std/log",
+            status_changed_hook=lambda runner, status: None,
+        )
+        runner._set_status(BOOTING)
+        runner._set_status(RUNNING_READY)
+        runner._set_status(RUNNING)
+        runner._update_status({"blocked_run_num": 1})
+        runner_list.append(runner)
+    return runner_list
+
+
+def measure_revision(rev: str, num: int) -> dict[str, int]:
+    """Run this benchmark with the juststart package of a git revision"""
+    repo_dir = Path(__file__).resolve().parent.parent
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive = subprocess.run(
+            ["git", "archive", rev, "juststart"],
+            cwd=repo_dir,
+            check=True,
+            stdout=subprocess.PIPE,
+        ).stdout
+        subprocess.run(["tar", "-x", "-C", tmp_dir], input=archive, check=True)
+        output = subprocess.run(
+            [sys.executable, __file__, "--num", str(num)],
+            env=os.environ | {"PYTHONPATH": tmp_dir},
+            check=True,
+            stdout=subprocess.PIPE,
+        ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--num", type=int, default=10000, help="Number of runners")
+    parser.add_argument("--rev", type=str, help="Git revision to compare the tree with")
+    args = parser.parse_args()
+    base = measure_revision(args.rev, args.num) if args.rev else None
+
+    gc.collect()
+    rss_before = _get_rss()
+    tracemalloc.start()
+    runner_list = build_runner_list(args.num)
+    gc.collect()
+    traced_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _get_rss()
+    result = {
+        "runner_num": len(runner_list),
+        "traced_bytes_per_runner": round(traced_size / args.num),
+        "rss_bytes_per_runner": round((rss_after - rss_before) / args.num),
+    }
+    if base is not None:
+        result = {"base": base | {"rev": args.rev}, "new": result}
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    main()
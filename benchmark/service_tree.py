@@ -0,0 +1,66 @@
+"""Build synthetic service trees for the benchmarks"""
+
+import random
+from pathlib import Path
+
+SLEEP = "sleep"
+CRASH_LOOP = "crash_loop"
+FLAPPING = "flapping"
+
+_script_dict = {
+    SLEEP: "#!/bin/sh\nexec sleep 3600\n",
+    CRASH_LOOP: "#!/bin/sh\nsleep 0.2\nexit 1\n",
+    FLAPPING: '#!/bin/sh\nsleep "$(( $$ % 3 + 1 ))"\nexit 1\n',
+}
+
+
+def _write_script(path: Path, content: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    path.chmod(0o755)
+
+
+def build_service_tree(
+    root: Path,
+    runner_num: int,
+    kind_weight_dict: dict[str, int] = {SLEEP: 1},
+    blocker_ratio: float = 0.1,
+    hook_ratio: float = 0.1,
+    group_size: int = 50,
+    seed: int = 0,
+) -> tuple[Path, list[str]]:
+    """Create a daemon config dir and runner_num services below root
+
+    Services are split in groups sharing args/env/config fragments, so config
+    resolution walks a realistic tree. Return the config dir and runner paths.
+    """
+    rand = random.Random(seed)
+    config_dir = root / "config"
+    (config_dir / "default").mkdir(parents=True, exist_ok=True)
+    (config_dir / "password").write_bytes(b"benchmark")
+    (config_dir / "default" / "env").write_text("+PATH\nJUSTSTART_BENCH=1\n")
+
+    kind_list = list(kind_weight_dict)
+    weight_list = [kind_weight_dict[kind] for kind in kind_list]
+    runner_path_list = []
+    for i in range(runner_num):
+        group_dir = root / "services" / f"group_{i // group_size}"
+        if not group_dir.exists():
+            group_dir.mkdir(parents=True)
+            (group_dir / "args").write_text(f"--group\n{i // group_size}\n")
+            (group_dir / "env").write_text(f"SERVICE_GROUP={i // group_size}\n")
+        service_dir = group_dir / f"service_{i}"
+        kind = rand.choices(kind_list, weight_list)[0]
+        _write_script(service_dir / "run", _script_dict[kind])
+        if kind != SLEEP:
+            (service_dir / "config").write_text("auto_restart=-1\n")
+        if rand.random() < blocker_ratio:
+            _write_script(service_dir / "blocker", "#!/bin/sh\necho 0\n")
+        if rand.random() < hook_ratio:
+            _write_script(service_dir / "running", "#!/bin/sh\nexit 0\n")
+        runner_path_list.append(str(service_dir / "run"))
+
+    (config_dir / "runner_list").write_text(
+        "".join(f"{path}\n" for path in sorted(runner_path_list))
+    )
+    return config_dir, runner_path_list
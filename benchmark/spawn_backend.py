@@ -0,0 +1,75 @@
+"""Compare spawns per second of the runner spawn backends at different heap sizes
+
+python -m benchmark.spawn_backend --num 200 --heap 0 256 1024
+"""
+import argparse
+import json
+import os
+import sys
+from time import perf_counter
+
+from juststart.spawn import POPEN, POSIX_SPAWN, is_posix_spawn_supported, spawn
+
+
+def _grow_heap(size_mb: int) -> list:
+    # touch every page and keep many small objects alive, like a busy daemon
+    ballast = [bytearray(os.urandom(1024 * 1024)) for _ in range(size_mb)]
+    ballast.append([{"key": str(i)} for i in range(size_mb * 1000)])
+    return ballast
+
+
+def bench_backend(backend: str, num: int, cwd: str) -> float:
+    with open(os.devnull, "a+") as null_io:
+        start_time = perf_counter()
+        for _ in range(num):
+            process = spawn(
+                ["/bin/true"],
+                cwd=cwd,
+                stdin=null_io,
+                stdout=null_io,
+                stderr=null_io,
+                env={},
+                backend=backend,
+            )
+            process.wait()
+        return num / (perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--num", type=int, default=200, help="Spawns per run")
+    parser.add_argument(
+        "--heap", type=int, nargs="+", default=[0, 256, 1024], help="Heap sizes in MB"
+    )
+    parser.add_argument(
+        "--cwd", default="/", help="Working directory of the spawned processes"
+    )
+    args = parser.parse_args()
+
+    backend_list = [POPEN]
+    if is_posix_spawn_supported():
+        backend_list.append(POSIX_SPAWN)
+    ballast = []
+    ballast_mb = 0
+    result_list = []
+    for heap_mb in sorted(args.heap):
+        ballast.append(_grow_heap(heap_mb - ballast_mb))
+        ballast_mb = heap_mb
+        for backend in backend_list:
+            spawn_per_sec = bench_backend(backend, args.num, args.cwd)
+            result_list.append(
+                {
+                    "backend": backend,
+                    "heap_mb": heap_mb,
+                    "spawn_per_sec": round(spawn_per_sec, 1),
+                }
+            )
+            print(
+                f"{backend:>12} heap={heap_mb:>5}MB {spawn_per_sec:>8.1f} spawn/s",
+                file=sys.stderr,
+            )
+    print(json.dumps(result_list, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Scale and latency benchmark of a juststart daemon
+
+python -m benchmark.suite --sizes 10 100 500 --output result.json
+python -m benchmark.compare base.json result.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import monotonic, perf_counter, sleep, time
+
+from juststart.daemon import connect_manager, get_objs
+from juststart.runner_manager import RunnerManagerStatus
+
+from .service_tree import CRASH_LOOP, FLAPPING, SLEEP, build_service_tree
+
+_repo_dir = Path(__file__).resolve().parent.parent
+_password = b"benchmark"
+
+
+def _read_proc_stat(pid: int) -> tuple[float, int]:
+    """Return (cpu seconds, rss bytes) of a process"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu_time = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu_time, rss
+
+
+def _summary(latency_list: list[float]) -> dict[str, float]:
+    latency_list = sorted(latency_list)
+    if not latency_list:
+        return {}
+    return {
+        "p50": latency_list[len(latency_list) // 2],
+        "p90": latency_list[int(len(latency_list) * 0.9)],
+        "max": latency_list[-1],
+    }
+
+
+class Daemon:
+    def __init__(self, config_dir: Path, port: int):
+        self.config_dir = config_dir
+        self.port = port
+        self.process = None
+        self.log_io = None
+
+    def start(self):
+        self.log_io = open(self.config_dir / "daemon.log", "w")
+        env = os.environ | {
+            "PYTHONPATH": os.pathsep.join(
+                [str(_repo_dir), os.environ.get("PYTHONPATH", "")]
+            )
+        }
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "juststart", "-c", str(self.config_dir)]
+            + ["-p", str(self.port), "serve"],
+            stdout=self.log_io,
+            stderr=subprocess.STDOUT,
+            env=env,
+        )
+
+    def connect(self, timeout: float = 120):
+        end_time = monotonic() + timeout
+        while True:
+            try:
+                return get_objs(connect_manager("localhost", self.port, _password))
+            except (ConnectionError, EOFError):
+                if monotonic() > end_time or self.process.poll() is not None:
+                    raise
+                sleep(0.05)
+
+    def stop(self, utils):
+        try:
+            utils.shutdown()
+        except (ConnectionError, EOFError):
+            pass
+        try:
+            self.process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log_io.close()
+
+
+def _wait_running(runner_manager, path_list: list[str], timeout: float) -> bool:
+    end_time = monotonic() + timeout
+    while monotonic() < end_time:
+        status_dict = runner_manager.get_runner_status_dict()
+        if all(
+            RunnerManagerStatus.RUNNING in status_dict.get(path, [])
+            for path in path_list
+        ):
+            return True
+        sleep(0.05)
+    return False
+
+
+def bench_size(
+    runner_num: int,
+    kind_weight_dict: dict[str, int],
+    port: int,
+    idle_seconds: float,
+    sample_num: int,
+) -> dict[str, any]:
+    result = {"runner_num": runner_num}
+    with tempfile.TemporaryDirectory(prefix="juststart-bench-") as tmp_dir:
+        config_dir, path_list = build_service_tree(
+            Path(tmp_dir), runner_num, kind_weight_dict
+        )
+        sleep_path_list = [
+            path for path in path_list if "exec sleep" in Path(path).read_text()
+        ]
+
+        daemon = Daemon(config_dir, port)
+        start_time = perf_counter()
+        daemon.start()
+        runner_manager, manager_config, utils = daemon.connect()
+        try:
+            result["cold_boot_all_running"] = _wait_running(
+                runner_manager, sleep_path_list, timeout=max(60, runner_num * 0.5)
+            )
+            result["cold_boot_seconds"] = perf_counter() - start_time
+
+            cpu_before, _ = _read_proc_stat(daemon.process.pid)
+            sleep(idle_seconds)
+            cpu_after, rss = _read_proc_stat(daemon.process.pid)
+            result["idle_cpu_percent"] = (cpu_after - cpu_before) / idle_seconds * 100
+            result["rss_bytes"] = rss
+
+            list_latency_list = []
+            for _ in range(sample_num):
+                start_time = perf_counter()
+                runner_manager.get_runner_status_dict()
+                list_latency_list.append(perf_counter() - start_time)
+            result["list_latency"] = _summary(list_latency_list)
+
+            stop_latency_list = []
+            start_latency_list = []
+            for path in sleep_path_list[:sample_num]:
+                start_time = perf_counter()
+                runner_manager.stop_runner(path)
+                stop_latency_list.append(perf_counter() - start_time)
+                start_time = perf_counter()
+                runner_manager.start_runner(path)
+                start_latency_list.append(perf_counter() - start_time)
+            result["stop_latency"] = _summary(stop_latency_list)
+            result["start_latency"] = _summary(start_latency_list)
+
+            cpu_before, _ = _read_proc_stat(daemon.process.pid)
+            start_time = perf_counter()
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                list(executor.map(runner_manager.restart_runner, path_list))
+            result["restart_storm_seconds"] = perf_counter() - start_time
+            result["restart_storm_all_running"] = _wait_running(
+                runner_manager, sleep_path_list, timeout=max(60, runner_num * 0.5)
+            )
+            cpu_after, _ = _read_proc_stat(daemon.process.pid)
+            result["restart_storm_cpu_seconds"] = cpu_after - cpu_before
+        finally:
+            daemon.stop(utils)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument(
+        "--kinds",
+        nargs="+",
+        default=[f"{SLEEP}=8", f"{CRASH_LOOP}=1", f"{FLAPPING}=1"],
+        help="Script kinds with weights, e.g. sleep=8 crash_loop=1",
+    )
+    parser.add_argument("--port", type=int, default=50900)
+    parser.add_argument("--idle-seconds", type=float, default=5)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--output", type=str, help="Write JSON result to the file")
+    args = parser.parse_args()
+
+    kind_weight_dict = {}
+    for kind in args.kinds:
+        name, _, weight = kind.partition("=")
+        kind_weight_dict[name] = int(weight or 1)
+
+    result = {
+        "time": time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "kinds": kind_weight_dict,
+        "sizes": [],
+    }
+    # a daemon without runners, its RSS is subtracted from the others
+    result["baseline"] = bench_size(
+        0, kind_weight_dict, args.port, args.idle_seconds, args.samples
+    )
+    for i, runner_num in enumerate(args.sizes, start=1):
+        print(f"Benchmarking {runner_num} runners", file=sys.stderr)
+        result["sizes"].append(
+            bench_size(
+                runner_num,
+                kind_weight_dict,
+                args.port + i,
+                args.idle_seconds,
+                args.samples,
+            )
+        )
+        size_result = result["sizes"][-1]
+        size_result["rss_bytes_per_runner"] = (
+            size_result["rss_bytes"] - result["baseline"]["rss_bytes"]
+        ) / max(runner_num, 1)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Admission of process starts by host pressure
+
+Before a runner spawns its process, the manager checks the pressure of the
+host: PSI of CPU and memory (/proc/pressure), the load average per CPU and
+the share of memory available. Above a threshold, starts wait on the event
+loop, critical runners are never held and normal ones are admitted before
+batch ones. Once pressure has been seen, waiting starts are admitted one per
+interval, so every start can show in the next sample before the next one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import os
+from dataclasses import asdict, dataclass
+from itertools import count
+from time import monotonic
+from typing import Callable
+
+# admitted whatever the pressure, e.g. sshd
+CRITICAL = "critical"
+NORMAL = "normal"
+# held first, and frozen first under pressure
+BATCH = "batch"
+PRIORITY_CLASS_LIST = [CRITICAL, NORMAL, BATCH]
+
+
+@dataclass
+class HostPressure:
+    # percent of time some tasks stalled in the last 10 seconds, None without PSI
+    cpu: float or None
+    memory: float or None
+    # 1 minute load average per CPU
+    load: float
+    # percent of memory available
+    mem_available: float or None
+
+    def to_dict(self) -> dict[str, float or None]:
+        return asdict(self)
+
+
+def read_psi_avg10(resource: str) -> float or None:
+    try:
+        with open(f"/proc/pressure/{resource}") as f:
+            line = f.readline()
+    except OSError:
+        return None
+    # some avg10=1.23 avg60=0.50 avg300=0.10 total=12345
+    for field in line.split()[1:]:
+        name, _, value = field.partition("=")
+        if name == "avg10":
+            return float(value)
+    return None
+
+
+def read_mem_available() -> float or None:
+    meminfo = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("MemTotal", "MemAvailable"):
+                    meminfo[name] = int(value.split()[0])
+    except OSError:
+        return None
+    if len(meminfo) < 2 or not meminfo["MemTotal"]:
+        return None
+    return meminfo["MemAvailable"] * 100 / meminfo["MemTotal"]
+
+
+def read_host_pressure() -> HostPressure:
+    return HostPressure(
+        cpu=read_psi_avg10("cpu"),
+        memory=read_psi_avg10("memory"),
+        load=os.getloadavg()[0] / (os.cpu_count() or 1),
+        mem_available=read_mem_available(),
+    )
+
+
+class AdmissionController:
+    """Hold starts of runners on the event loop while the host is overloaded
+
+    A threshold of 0 disables its check. A start waiting max_wait seconds is
+    admitted anyway, so a host that never recovers still boots.
+    """
+
+    def __init__(
+        self,
+        cpu_pressure: float = 0,
+        memory_pressure: float = 0,
+        load: float = 0,
+        min_mem_available: float = 0,
+        interval: float = 1,
+        max_wait: float = 300,
+        read_pressure: Callable[[], HostPressure] = read_host_pressure,
+    ):
+        self.cpu_pressure = cpu_pressure
+        self.memory_pressure = memory_pressure
+        self.load = load
+        self.min_mem_available = min_mem_available
+        self.interval = interval
+        self.max_wait = max_wait
+        self._read_pressure = read_pressure
+        self._pressure: HostPressure = None
+        self._pressure_time = 0
+        # (class rank, seq, future), the first one is the next start admitted
+        self._waiter_heap: list[tuple[int, int, asyncio.Future]] = []
+        self._seq_counter = count()
+        self._next_admit_time = 0
+        self.admitted_num = 0
+        self.delayed_num = 0
+        self.forced_num = 0
+
+    @property
+    def enabled(self) -> bool:
+        return any(
+            (self.cpu_pressure, self.memory_pressure, self.load, self.min_mem_available)
+        )
+
+    def get_pressure(self) -> HostPressure:
+        """The host pressure, sampled at most once per interval"""
+        if self._pressure is None or monotonic() - self._pressure_time >= self.interval:
+            self._pressure = self._read_pressure()
+            self._pressure_time = monotonic()
+        return self._pressure
+
+    def get_overload(self) -> str or None:
+        """Why the host is overloaded, None if it is not"""
+        if not self.enabled:
+            return None
+        pressure = self.get_pressure()
+        if self.cpu_pressure and (pressure.cpu or 0) >= self.cpu_pressure:
+            return f"cpu pressure {pressure.cpu}"
+        if self.memory_pressure and (pressure.memory or 0) >= self.memory_pressure:
+            return f"memory pressure {pressure.memory}"
+        if self.load and pressure.load >= self.load:
+            return f"load {pressure.load:.2f} per cpu"
+        if (
+            self.min_mem_available
+            and pressure.mem_available is not None
+            and pressure.mem_available < self.min_mem_available
+        ):
+            return f"memory available {pressure.mem_available:.1f}%"
+        return None
+
+    async def admit(
+        self, priority_class: str, on_wait: Callable[[str], None] = None
+    ) -> float:
+        """Wait until a start of priority_class is admitted, return the seconds
+        waited; on_wait(reason) is called if it has to wait"""
+        if not self.enabled:
+            return 0
+        reason = None if priority_class == CRITICAL else self.get_overload()
+        if reason is None and (priority_class == CRITICAL or not self._waiter_heap):
+            self.admitted_num += 1
+            return 0
+        start_time = monotonic()
+        self.delayed_num += 1
+        if on_wait:
+            on_wait(reason or "queued")
+        loop = asyncio.get_running_loop()
+        waiter = [
+            PRIORITY_CLASS_LIST.index(priority_class),
+            next(self._seq_counter),
+            loop.create_future(),
+        ]
+        heapq.heappush(self._waiter_heap, waiter)
+        try:
+            while True:
+                while self._waiter_heap[0] is not waiter:
+                    # woken once it is the first waiter
+                    waiter[2] = loop.create_future()
+                    await waiter[2]
+                reason = self.get_overload()
+                waited = monotonic() - start_time
+                if reason is not None and waited >= self.max_wait:
+                    logging.warning(
+                        f"Start admitted after {waited:.0f}s in spite of {reason}"
+                    )
+                    self.forced_num += 1
+                    reason = None
+                if reason is None and monotonic() >= self._next_admit_time:
+                    break
+                await asyncio.sleep(
+                    self._next_admit_time - monotonic()
+                    if reason is None
+                    else self.interval
+                )
+        finally:
+            self._waiter_heap.remove(waiter)
+            heapq.heapify(self._waiter_heap)
+            if self._waiter_heap and not self._waiter_heap[0][2].done():
+                self._waiter_heap[0][2].set_result(None)
+        self._next_admit_time = monotonic() + self.interval
+        self.admitted_num += 1
+        return monotonic() - start_time
+
+    def get_stats(self) -> dict[str, any]:
+        return {
+            "enabled": self.enabled,
+            "pressure": self._pressure.to_dict() if self._pressure else None,
+            "waiting": len(self._waiter_heap),
+            "admitted": self.admitted_num,
+            "delayed": self.delayed_num,
+            "forced": self.forced_num,
+        }
@@ -0,0 +1,1526 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from threading import Lock
+from time import monotonic, time
+from typing import AsyncIterator, Callable
+
+from . import watchdog
+from .admission import BATCH, AdmissionController
+from .config import (
+    admission_cpu_pressure,
+    admission_interval,
+    admission_load,
+    admission_max_wait,
+    admission_memory_pressure,
+    admission_min_mem_available,
+    enable_compatible_runit,
+    freeze_cpu_pressure,
+    freeze_interval,
+    freeze_memory_pressure,
+    gc_batch_size,
+    gc_interval,
+    gc_keep_per_path,
+    gc_log_tail_lines,
+    gc_max_age,
+    gc_max_stopped,
+    history_db,
+    history_retention,
+    hook_timeout,
+    hook_workers,
+    loop_lag_interval,
+    operation_workers,
+    probe_workers,
+    ready_settle_time,
+    status_snapshot_interval,
+    watchdog_interval,
+)
+from .env import intern_env
+from .errors import BaseError, ManagerConfigError, RunnerError, RunnerManagerError
+from .history_db import HOOK, RESTART, HistoryWriter
+from .hook_executor import HookExecutor, HookJob
+from .instance import (
+    apply_instance_overlay,
+    get_instance_path,
+    is_instance_of,
+    sort_instance_path_list,
+    split_instance_path,
+)
+from .instrumentation import InstrumentedThreadPoolExecutor, LoopLagSampler
+from .manifest import ManifestStore
+from .operation_queue import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    OperationQueue,
+)
+from .path_index import PathIndex
+from .probe import ProbeScheduler, parse_probe, run_probe
+from .retention import Tombstone, TombstoneStore, read_log_tail
+from .runner import Runner
+from .runner_config import (
+    RESTART_STRATEGY_LIST,
+    START_STOP,
+    STOP_START,
+    ConfigTrace,
+    RunnerConfig,
+    get_runner_config,
+)
+from .runner_manager_config import RunnerManagerConfig
+from .runner_status import RunnerStatus
+from .shard import get_shard_filter
+from .stdin_pipe import make_stdin_pipe
+from .status_histogram import StatusDurationHistogram
+from .status_snapshot import StatusSnapshotWriter, get_status_snapshot_path
+from .timer import TimerHeap, parse_schedule
+from .utils import delete_directory_and_empty_parents
+
+
+class RunnerManagerStatus:
+    INITED = "INITED"
+    NOT_INITED = "NOT_INITED"
+
+    ENABLED_BOOT = "ENABLED_BOOT"
+    DISABLED_BOOT = "DISABLED_BOOT"
+
+    INITED_BUT_NOT_SAVED = "INITED_BUT_NOT_SAVED"
+
+    RUNNING = "RUNNING"
+    NOT_RUNNING = "NOT_RUNNING"
+
+
+@dataclass
+class StatusEvent:
+    path: str
+    key: str
+    data: dict[str, any]
+
+
+class AsyncRunnerManager:
+    """Supervise runners on the event loop of an asyncio application
+
+        async with AsyncRunnerManager(runner_list, default_dir, tmp_dir) as manager:
+            await manager.start(path)
+            await manager.wait_ready(path)
+            async for event in manager.events():
+                ...
+
+    Monitors, timers, probes, hooks and lifecycle operations run as tasks of
+    the loop the manager is opened on. Starts, stops, restarts and reloads
+    are coroutines queued in the OperationQueue, one at a time per runner.
+    Their blocking steps, such as stopping a process or resolving a config,
+    run in monitor_executor, never in the default executor of the loop.
+
+    Lookups such as get_runner and select_runner_path_list do not wait and
+    may be called from any thread. RunnerManager runs the manager on a loop
+    thread of its own for threaded callers.
+    """
+
+    def __init__(
+        self,
+        runner_list_file_path: str,
+        default_runner_config_path: str,
+        tmp_dir_path: str,
+        manifest_path: str = None,
+        shard: tuple[int, int] = None,
+        history_path: str = None,
+        monitor_executor: InstrumentedThreadPoolExecutor = None,
+        event_queue_size: int = 1024,
+    ):
+        """shard is (shard index, shard number) if the runners are sharded
+
+        Lifecycle events are appended to the SQLite database at history_path,
+        if given.
+
+        Blocking steps of supervision, such as spawning a process, run in
+        monitor_executor, created if None and shut down by close.
+        """
+        self._manager_args = (
+            runner_list_file_path,
+            default_runner_config_path,
+            tmp_dir_path,
+            manifest_path,
+            shard,
+            history_path,
+        )
+        self.monitor_executor = monitor_executor or InstrumentedThreadPoolExecutor()
+        self.event_queue_size = event_queue_size
+        self.loop: asyncio.AbstractEventLoop = None
+        self.operation_queue: OperationQueue = None
+        self.history: HistoryWriter = None
+        self.status_snapshot: StatusSnapshotWriter = None
+        # background coroutines of the manager, cancelled by close
+        self._background_future_list = []
+        # called with every status change of every runner, from any thread
+        self.status_listener_list: list[Callable[[Runner, RunnerStatus], None]] = []
+        self._queue_set: set[asyncio.Queue] = set()
+        self.dropped_event_num = 0
+        self._closed = False
+
+    async def open(self):
+        """Boot the enabled runners of the runner list on the running loop"""
+        if self.loop is not None:
+            raise RunnerManagerError("The manager is already open")
+        self.loop = asyncio.get_running_loop()
+        try:
+            # reads the runner list and manifest, creates the status snapshot
+            await self._run_blocking(self._init_manager, *self._manager_args)
+            await self._load_runners()
+        except BaseException:
+            await self._abort()
+            raise
+
+    async def _abort(self):
+        """Undo a failed open, no runner is left to stop"""
+        self._closed = True
+        for future in self._background_future_list:
+            future.cancel()
+        if self.history:
+            self.history.close()
+        # idle threads only, a constructor that raises leaves no thread behind
+        self.monitor_executor.shutdown()
+
+    async def close(self):
+        """Stop all runners, then the background tasks of the manager"""
+        if self.loop is None or self._closed:
+            return
+        self._closed = True
+        await self._unload_runners()
+        await self.operation_queue.shutdown()
+        if self.status_snapshot:
+            await self._run_blocking(self.status_snapshot.close)
+        # the loop belongs to the caller, only cancel what the manager runs
+        for future in self._background_future_list:
+            future.cancel()
+        if self.history:
+            await self._run_blocking(self.history.close)
+        self.monitor_executor.shutdown(wait=False)
+        for queue in self._queue_set:
+            self._put_event(queue, None)
+        self._queue_set.clear()
+
+    async def __aenter__(self) -> AsyncRunnerManager:
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _run_blocking(self, func: Callable, *args) -> any:
+        """Run a blocking step in monitor_executor"""
+        return await self.loop.run_in_executor(
+            self.monitor_executor, partial(func, *args)
+        )
+
+    def _init_manager(
+        self,
+        runner_list_file_path: str,
+        default_runner_config_path: str,
+        tmp_dir_path: str,
+        manifest_path: str,
+        shard: tuple[int, int],
+        history_path: str,
+    ):
+        # start, stop, restart and reload of a runner never run concurrently
+        self.operation_queue = OperationQueue(self.loop, operation_workers)
+        self._background_future_list.append(self.operation_queue.start())
+        self.loop_lag_sampler = LoopLagSampler(self.loop, loop_lag_interval)
+        self._background_future_list.append(self.loop_lag_sampler.start())
+        if history_path and history_db:
+            self.history = HistoryWriter(history_path, history_retention)
+        self.hook_executor = HookExecutor(
+            self.loop, hook_workers, hook_timeout, self._on_hook_done
+        )
+        self._background_future_list.append(self.hook_executor.start())
+        self.timer_heap = TimerHeap(self.loop, self._fire_timer)
+        self.admission = AdmissionController(
+            admission_cpu_pressure,
+            admission_memory_pressure,
+            admission_load,
+            admission_min_mem_available,
+            admission_interval,
+            admission_max_wait,
+        )
+        self.probe_scheduler = ProbeScheduler(
+            self.loop, probe_workers, self._on_probe_failure
+        )
+        self._background_future_list.append(self.probe_scheduler.start())
+
+        self.default_runner_config_path = default_runner_config_path
+        self.tmp_dir_path = tmp_dir_path
+        self.manifest_store = ManifestStore(manifest_path)
+        self.shard = shard
+        self.manager_config = RunnerManagerConfig(
+            runner_list_file_path,
+            on_change=self._on_runner_list_change,
+            path_filter=get_shard_filter(*shard) if shard else None,
+        )
+        self.runner_dict = dict()
+        # runner list and in memory runners, for path selectors
+        self.path_index = PathIndex()
+        self._path_index_lock = Lock()
+        self._listed_path_set: set[str] = set()
+        self._runner_list_stat: tuple[int, int] = None
+        # resolved config of templates, shared by their instances
+        self.template_config_dict: dict[str, RunnerConfig] = {}
+        self.status_histogram = StatusDurationHistogram()
+        self.tombstone_store = TombstoneStore(gc_keep_per_path)
+        # path -> (runner, monotonic time it was first seen stopped)
+        self._stopped_since_dict: dict[str, tuple[Runner, float]] = {}
+        self.collected_num = 0
+        self._start_status_snapshot()
+        self._start_watchdog()
+        self._start_retention_sweep()
+        # batch runners frozen by _sweep_auto_freeze, thawed by it
+        self._auto_frozen_path_set: set[str] = set()
+        self._start_auto_freeze()
+
+    async def _load_runners(self):
+        future_dict = {
+            path: self._submit(
+                path, partial(self._start_runner, path), ("start",), PRIORITY_BULK
+            )
+            for path, enabled in self.manager_config.runner_info_dict.items()
+            if enabled
+        }
+        for path, enabled in self.manager_config.runner_info_dict.items():
+            if not enabled:
+                logging.info(f"Runner {path} checked")
+                continue
+            try:
+                await future_dict[path]
+                logging.info(f"Runner {path} booted")
+            except Exception as e:
+                logging.exception(e)
+
+    async def _unload_runners(self):
+        for path, result in (
+            await self._stop_runner_list(list(self.runner_dict.keys()), PRIORITY_BULK)
+        ).items():
+            if result == "ok":
+                logging.info(f"Runner {path} stopped")
+            else:
+                logging.info(f"Runner {path} had stopped")
+        await self.clean_runner()
+
+    def _submit(
+        self,
+        path: str,
+        func: Callable,
+        key: tuple = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> asyncio.Future:
+        """Queue an operation on a runner, see OperationQueue for key"""
+        if self.operation_queue is None:
+            raise RunnerManagerError("The manager is not open")
+        return self.operation_queue.submit(path, func, key, priority)
+
+    async def _run(
+        self,
+        path: str,
+        func: Callable,
+        key: tuple = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> any:
+        """Queue an operation and wait for it, see _submit
+
+        The future may be shared with coalesced callers, a caller that is
+        cancelled leaves the operation running for the others.
+        """
+        return await asyncio.shield(self._submit(path, func, key, priority))
+
+    def _get_runner_manager_status(
+        self, path: str, enable: bool or None
+    ) -> list[RunnerManagerStatus]:
+        """enable is None if the runner is not in the runner list"""
+        status_list = set()
+        if enable is None:
+            status_list.add(RunnerManagerStatus.INITED_BUT_NOT_SAVED)
+        elif enable:
+            status_list.add(RunnerManagerStatus.ENABLED_BOOT)
+        else:
+            status_list.add(RunnerManagerStatus.DISABLED_BOOT)
+        runner = self.runner_dict.get(path)
+        if runner is None:
+            status_list.add(RunnerManagerStatus.NOT_INITED)
+        else:
+            if enable is not None:
+                status_list.add(RunnerManagerStatus.INITED)
+            if runner.is_running():
+                status_list.add(RunnerManagerStatus.RUNNING)
+            else:
+                status_list.add(RunnerManagerStatus.NOT_RUNNING)
+        return sorted(status_list)
+
+    def get_runner_status_dict(self) -> dict[str, list[RunnerManagerStatus]]:
+        runner_info_dict = self.manager_config.runner_info_dict
+        path_set = set(runner_info_dict) | set(self.runner_dict)
+        return {
+            path: self._get_runner_manager_status(path, runner_info_dict.get(path))
+            for path in sorted(path_set)
+        }
+
+    def _get_runner_list_stat(self) -> tuple[int, int] or None:
+        try:
+            stat = os.stat(self.manager_config.runner_list_file_path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _sync_path_index(self):
+        """Apply changes of the runner list file, also those made by hand"""
+        runner_list_stat = self._get_runner_list_stat()
+        if runner_list_stat == self._runner_list_stat and runner_list_stat:
+            return
+        self._runner_list_stat = runner_list_stat
+        listed_path_set = set(self.manager_config.runner_info_dict)
+        for path in self._listed_path_set - listed_path_set:
+            if path not in self.runner_dict:
+                self.path_index.remove(path)
+        for path in listed_path_set - self._listed_path_set:
+            self.path_index.add(path)
+        self._listed_path_set = listed_path_set
+
+    def select_runner_path_list(
+        self, selector_list: list[str], kind: str = None
+    ) -> list[str]:
+        """Runner paths matched by command line selectors
+
+        Several selectors select the runners below each of them, a single
+        one matches by name, then by glob, then by substring. kind forces
+        one of children, name, glob or substring for the first selector.
+        """
+        with self._path_index_lock:
+            self._sync_path_index()
+            if kind:
+                return getattr(self.path_index, f"select_{kind}")(selector_list[0])
+            if len(selector_list) > 1:
+                return [
+                    path
+                    for selector in selector_list
+                    for path in self.path_index.select_children(selector)
+                ]
+            return self.path_index.select(selector_list[0])
+
+    def _start_status_snapshot(self):
+        if status_snapshot_interval <= 0:
+            return
+        self.status_snapshot = StatusSnapshotWriter(
+            get_status_snapshot_path(
+                self.tmp_dir_path, self.shard[0] if self.shard else None
+            ),
+            self.loop,
+            self._get_status_row_dict,
+            executor=self.monitor_executor,
+        )
+        self._snapshot_runner_list_stat = self._get_runner_list_stat()
+        self.status_snapshot.mark_dirty(list(self.manager_config.runner_info_dict))
+        self._background_future_list.append(
+            asyncio.run_coroutine_threadsafe(self._sweep_status_snapshot(), self.loop)
+        )
+
+    def _get_status_row_dict(self, path_list: list[str]) -> dict[str, dict or None]:
+        """Rows of the status snapshot, None for paths that are gone
+
+        It checks the runner files, the snapshot runs it in monitor_executor.
+        """
+        runner_info_dict = self.manager_config.runner_info_dict
+        row_dict = {}
+        for path in path_list:
+            runner = self.runner_dict.get(path)
+            if runner is None and path not in runner_info_dict:
+                row_dict[path] = None
+                continue
+            try:
+                RunnerManagerConfig._check_runner(split_instance_path(path)[0])
+                broken = False
+            except ManagerConfigError:
+                broken = True
+            runner_status = None
+            if runner is not None and runner.status is not None:
+                runner_status = runner.status_dict
+                # env may hold secrets, the snapshot is readable without password
+                del runner_status["env"]
+            row_dict[path] = {
+                "status": self._get_runner_manager_status(
+                    path, runner_info_dict.get(path)
+                ),
+                "running": runner is not None and runner.is_running(),
+                "broken": broken,
+                "runner": runner_status,
+            }
+        return row_dict
+
+    async def _sweep_status_snapshot(self):
+        # rows are refreshed by status changes, this only catches what they miss
+        while True:
+            await asyncio.sleep(status_snapshot_interval)
+            path_list = await self.loop.run_in_executor(
+                self.monitor_executor, self._get_stale_snapshot_path_list
+            )
+            self.status_snapshot.mark_dirty(path_list)
+
+    def _get_stale_snapshot_path_list(self) -> list[str]:
+        """Paths whose snapshot row may be outdated
+
+        The runner list may be written by another process or by hand, and a
+        process may exit without a status change, e.g. when its stop failed.
+        """
+        row_dict = self.status_snapshot.row_dict.copy()
+        path_set = set()
+        runner_list_stat = self._get_runner_list_stat()
+        if runner_list_stat != self._snapshot_runner_list_stat:
+            self._snapshot_runner_list_stat = runner_list_stat
+            path_set.update(row_dict, self.manager_config.runner_info_dict)
+        for path, runner in list(self.runner_dict.items()):
+            row = row_dict.get(path)
+            if row is None or runner.is_running() != row["running"]:
+                path_set.add(path)
+        return list(path_set)
+
+    def _on_runner_list_change(self, old_path_list: list[str], path_list: list[str]):
+        # the file may change twice within the resolution of its mtime
+        self._runner_list_stat = None
+        if self.status_snapshot:
+            self.status_snapshot.mark_dirty(list(set(old_path_list) | set(path_list)))
+
+    def _get_runner_config(
+        self, path: str, config_path: str, trace: ConfigTrace = None
+    ) -> RunnerConfig:
+        template_path, instance = split_instance_path(path)
+        if instance is None:
+            return self._resolve_runner_config(path, config_path, trace)
+        base_config = self.template_config_dict.get(template_path)
+        if base_config is None or trace:
+            base_config = self._resolve_runner_config(template_path, config_path, trace)
+            self.template_config_dict[template_path] = base_config
+        template_std_dir = (
+            Path(f"{Path(self.tmp_dir_path) / 'runner'}/{config_path}") / "std"
+        )
+        return apply_instance_overlay(
+            base_config, template_path, instance, template_std_dir, trace
+        )
+
+    def _resolve_runner_config(
+        self, path: str, config_path: str, trace: ConfigTrace = None
+    ) -> RunnerConfig:
+        config = self.manifest_store.get_runner_config(
+            path, config_path, Path(self.tmp_dir_path) / "runner", trace
+        )
+        if config is not None:
+            return config
+        return get_runner_config(
+            path,
+            config_path,
+            self.default_runner_config_path,
+            Path(self.tmp_dir_path) / "runner",
+            trace,
+        )
+
+    def explain_runner_config(self, path: str) -> dict[str, any]:
+        trace = ConfigTrace()
+        config = self._get_runner_config(path, str(Path(path).parent), trace)
+        return {
+            "path": path,
+            "default_config_path": self.default_runner_config_path,
+        } | trace.to_dict(config)
+
+    def _get_config_from_runner(self, runner: Runner) -> RunnerConfig:
+        return RunnerConfig(
+            args=runner.args,
+            env=dict(runner.env),
+            auto_restart=runner.auto_restart,
+            stdin=runner.stdin,
+            stdout=runner.stdout,
+            stderr=runner.stderr,
+            max_rss=runner.max_rss,
+            max_cpu_time=runner.max_cpu_time,
+            schedule=runner.schedule,
+            jitter=runner.jitter,
+            skip_if_running=runner.skip_if_running,
+            stdin_pipe=runner.stdin_pipe,
+            down_timeout=runner.down_timeout,
+            priority_class=runner.priority_class,
+        )
+
+    async def reload(self, path: str):
+        await self._run(path, partial(self._reload_runner, path), ("reload",))
+
+    async def _reload_runner(self, path: str):
+        runner = self.get_runner(path)
+        self.template_config_dict.pop(runner.template_path, None)
+        config_path = str(Path(path).parent)
+        config = await self._run_blocking(self._get_runner_config, path, config_path)
+        await self._run_blocking(self._load_hook_table, path, True)
+        need_stop = False
+        need_start = False
+
+        if runner.args != config.args:
+            runner.args = config.args
+            need_stop = True
+        if runner.env != config.env:
+            runner.env = intern_env(config.env)
+            need_stop = True
+        # the process keeps the pipe it was started with
+        if runner.stdin_pipe != config.stdin_pipe or (
+            config.stdin_pipe and runner.stdin != config.stdin
+        ):
+            runner.stdin_pipe = config.stdin_pipe
+            need_stop = True
+        if need_stop and runner.is_running():
+            await self._run_blocking(runner.stop)
+            need_start = True
+
+        if runner.stdin != config.stdin:
+            runner.stdin = config.stdin
+        if runner.stdout != config.stdout:
+            runner.stdout = config.stdout
+        if runner.stderr != config.stderr:
+            runner.stderr = config.stderr
+        await self._run_blocking(
+            self._init_runner_runtime, self._get_config_from_runner(runner)
+        )
+
+        runner.skip_if_running = config.skip_if_running
+        runner.down_timeout = config.down_timeout
+        runner.priority_class = config.priority_class
+        if runner.schedule != config.schedule or runner.jitter != config.jitter:
+            runner.schedule = config.schedule
+            runner.jitter = config.jitter
+            if runner.schedule:
+                self._schedule_runner(runner)
+            else:
+                self.timer_heap.cancel(path)
+        self._add_probe(runner, config)
+
+        if need_start:
+            if runner.schedule:
+                runner.run_once(self.loop)
+            else:
+                runner.start(self.loop)
+
+    def get_runner(self, path) -> Runner:
+        try:
+            return self.runner_dict[path]
+        except KeyError:
+            raise RunnerError(
+                f"Runner at {path} is not in memory, which means it is never started or been gc"
+            )
+
+    def get_status_histogram(self) -> dict[str, dict[str, any]]:
+        return self.status_histogram.to_dict()
+
+    def get_instrumentation_stats(self) -> dict[str, dict[str, any]]:
+        return {
+            "loop_lag": self.loop_lag_sampler.get_stats(),
+            "executor": self.monitor_executor.get_stats(),
+            "runner_num": len(self.runner_dict),
+            "timer_num": len(self.timer_heap),
+            "probe_num": len(self.probe_scheduler.probe_state_dict),
+            "operation": self.operation_queue.get_stats(),
+            "history": self.history.get_stats() if self.history else None,
+            "admission": self.admission.get_stats(),
+            "auto_frozen": len(self._auto_frozen_path_set),
+            "gc": {
+                "stopped": len(self._stopped_since_dict),
+                "collected": self.collected_num,
+                "tombstone_paths": len(self.tombstone_store),
+            },
+        }
+
+    async def clean_runner(self) -> list[str]:
+        future_dict = {
+            path: self._submit(path, partial(self._clean_runner, path), ("clean",))
+            for path in list(self.runner_dict.keys())
+        }
+        return [path for path, future in future_dict.items() if await future]
+
+    async def _clean_runner(self, path: str) -> bool:
+        runner = self.runner_dict.get(path)
+        if runner is None or not self._is_collectable(runner):
+            return False
+        await self._pop_runner(runner, "gc")
+        return True
+
+    def _is_collectable(self, runner: Runner) -> bool:
+        # a monitored runner may be about to restart
+        return (
+            not runner.is_running()
+            and not runner.is_monitoring()
+            and self.timer_heap.get_next_time(runner.path) is None
+        )
+
+    def _start_retention_sweep(self):
+        if gc_interval <= 0:
+            return
+        self._background_future_list.append(
+            asyncio.run_coroutine_threadsafe(self._sweep_retention(), self.loop)
+        )
+
+    async def _sweep_retention(self):
+        while True:
+            await asyncio.sleep(gc_interval)
+            now = monotonic()
+            # (stopped since, path), checked a batch per loop iteration
+            stopped_list = []
+            path_list = list(self.runner_dict)
+            for i in range(0, len(path_list), max(1, gc_batch_size)):
+                for path in path_list[i : i + max(1, gc_batch_size)]:
+                    runner = self.runner_dict.get(path)
+                    if runner is None or not self._is_collectable(runner):
+                        self._stopped_since_dict.pop(path, None)
+                        continue
+                    stopped_runner, since = self._stopped_since_dict.get(
+                        path, (None, now)
+                    )
+                    if stopped_runner is not runner:
+                        since = now
+                        self._stopped_since_dict[path] = (runner, since)
+                    stopped_list.append((since, path))
+                await asyncio.sleep(0)
+            stopped_list.sort()
+            excess_num = len(stopped_list) - gc_max_stopped
+            for i, (since, path) in enumerate(stopped_list):
+                if i < excess_num or now - since >= gc_max_age:
+                    # checked again when it runs, the runner may have started
+                    self._submit(
+                        path,
+                        partial(self._clean_runner, path),
+                        ("clean",),
+                        PRIORITY_BULK,
+                    )
+
+    async def restart(self, path: str, strategy: str = None):
+        """Restart a runner, strategy overrides its restart_strategy config
+
+        With start_stop the new process is started next to the old one, which
+        is only stopped once the new one is ready (e.g. SO_REUSEPORT servers).
+        """
+        await self._run(
+            path, partial(self._restart_runner, path, strategy), ("restart", strategy)
+        )
+
+    async def _restart_runner(
+        self, path, strategy: str = None, reason: str = "command"
+    ) -> tuple[bool, RunnerConfig]:
+        """Return if the restarted runner is already known to be ready"""
+        runner = self.runner_dict.get(path)
+        config = await self._run_blocking(
+            self._get_runner_config, path, str(Path(path).parent)
+        )
+        strategy = strategy or config.restart_strategy or STOP_START
+        if strategy not in RESTART_STRATEGY_LIST:
+            raise RunnerManagerError(f"Unknown restart strategy {strategy}")
+        if self.history:
+            self.history.record(path, RESTART, detail=f"{reason}, {strategy}")
+        if (
+            strategy == START_STOP
+            and runner
+            and runner.is_running()
+            and not config.schedule
+        ):
+            await self._replace_runner(runner, config)
+            return True, config
+        try:
+            await self._stop_runner(path, reason="restart")
+        except RunnerError as e:
+            logging.info(e.message)
+        await self._start_runner(path, config)
+        return False, config
+
+    async def _replace_runner(self, runner: Runner, config: RunnerConfig):
+        new_runner = await self._run_blocking(self._create_runner, runner.path, config)
+        new_runner.start(self.loop)
+        if not await self._wait_ready(new_runner, config):
+            if new_runner.monitor_future:
+                new_runner.monitor_future.cancel()
+            if new_runner.is_running():
+                await self._run_blocking(new_runner.stop)
+            raise RunnerError(
+                f"New process of {runner.path} is not ready, the old one is kept"
+            )
+        self.runner_dict[runner.path] = new_runner
+        self._add_probe(new_runner, config)
+        if runner.is_running():
+            await self._run_blocking(runner.stop)
+
+    async def wait_ready(self, path: str, timeout: float = None) -> bool:
+        """Wait until the ready script or probe of the runner passes, see
+        _wait_ready
+
+        timeout defaults to the ready_timeout of the runner config.
+        """
+        runner = self.get_runner(path)
+        config = await self._run_blocking(
+            self._get_runner_config, path, str(Path(path).parent)
+        )
+        if timeout is not None:
+            config.ready_timeout = timeout
+        return await self._wait_ready(runner, config)
+
+    async def _wait_ready(self, runner: Runner, config: RunnerConfig) -> bool:
+        """Wait until the process runs and its ready script or probe passes
+
+        Without both, the process is ready once it keeps running for
+        ready_settle_time seconds.
+        """
+        if runner.schedule:
+            return True
+        ready_path = Path(runner.template_path).parent / "ready"
+        probe = parse_probe(config.probe) if config.probe else None
+        end_time = monotonic() + config.ready_timeout
+        while monotonic() < end_time:
+            if runner.is_running():
+                if os.access(ready_path, os.X_OK):
+                    if await self._run_ready_script(ready_path, runner, end_time):
+                        return True
+                elif probe:
+                    if await run_probe(probe, runner, config.probe_timeout) is None:
+                        return True
+                else:
+                    await asyncio.sleep(
+                        min(ready_settle_time, max(end_time - monotonic(), 0))
+                    )
+                    return runner.is_running()
+            elif not runner.is_monitoring():
+                return False
+            await asyncio.sleep(0.1)
+        return False
+
+    @staticmethod
+    async def _run_ready_script(
+        ready_path: Path, runner: Runner, end_time: float
+    ) -> bool:
+        process = await asyncio.create_subprocess_exec(
+            str(ready_path),
+            *runner.args,
+            cwd=str(ready_path.parent),
+            env=runner.env,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            returncode = await asyncio.wait_for(
+                process.wait(), max(end_time - monotonic(), 0.1)
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return False
+        return returncode == 0
+
+    async def start(
+        self,
+        path: str,
+        config: RunnerConfig = None,
+        status_changed_hook: Callable[[Runner, RunnerStatus], None] = None,
+    ) -> Runner:
+        # only plain starts are interchangeable
+        key = ("start",) if config is None and status_changed_hook is None else None
+        return await self._run(
+            path, partial(self._start_runner, path, config, status_changed_hook), key
+        )
+
+    async def _start_runner(
+        self,
+        path,
+        config: RunnerConfig = None,
+        status_changed_hook: Callable[[Runner, RunnerStatus], None] = None,
+    ) -> Runner:
+        config_path = str(Path(path).parent)
+        if config is None:
+            try:
+                config = await self._run_blocking(
+                    self._get_runner_config, path, config_path
+                )
+            except Exception as e:
+                logging.exception(e)
+        runner = await self._run_blocking(
+            self._create_runner, path, config, status_changed_hook
+        )
+        self.runner_dict[path] = runner
+        with self._path_index_lock:
+            self.path_index.add(path)
+        if runner.schedule:
+            self._schedule_runner(runner)
+        else:
+            runner.start(self.loop)
+        self._add_probe(runner, config)
+        return runner
+
+    def _add_probe(self, runner: Runner, config: RunnerConfig):
+        if not config.probe or runner.schedule:
+            self.probe_scheduler.remove(runner.path)
+            return
+        self.probe_scheduler.add(
+            runner,
+            parse_probe(config.probe),
+            config.probe_interval,
+            config.probe_timeout,
+            config.probe_failure_threshold,
+        )
+
+    def _on_probe_failure(self, runner: Runner, reason: str):
+        # called on the event loop, the restart is queued without waiting
+        self._submit(
+            runner.path,
+            partial(self._probe_restart_runner, runner, reason),
+            ("probe_restart",),
+            PRIORITY_BACKGROUND,
+        )
+
+    async def _probe_restart_runner(self, runner: Runner, reason: str):
+        if self.runner_dict.get(runner.path) is not runner:
+            return
+        try:
+            await self._restart_runner(runner.path, reason=f"probe: {reason}")
+        except Exception as e:
+            logging.exception(e)
+            return
+        self.get_runner(runner.path).record_status(
+            {
+                "probe_restart_num": runner.status_record.get("probe_restart_num", 0)
+                + 1,
+                "probe_restart_reason": reason,
+            }
+        )
+
+    def _load_hook_table(self, path: str, research: bool = False):
+        """Take the hooks of a runner from its manifest, or search the disk"""
+        hook_table = self.manifest_store.get_hook_table(split_instance_path(path)[0])
+        self.hook_executor.load_hook_table(path, hook_table, research)
+
+    def _create_runner(
+        self,
+        path,
+        config: RunnerConfig,
+        status_changed_hook: Callable[[Runner, RunnerStatus], None] = None,
+    ) -> Runner:
+        if status_changed_hook:
+            extra_status_changed_hook = status_changed_hook
+
+            def status_changed_hook(runner, status):
+                self._run_runner_status_hook(runner, status)
+                extra_status_changed_hook(runner, status)
+
+        else:
+            status_changed_hook = lambda runner, status: self._run_runner_status_hook(
+                runner, status
+            )
+        self._load_hook_table(path)
+        runner = Runner(
+            path=path,
+            args=config.args,
+            env=config.env,
+            auto_restart=config.auto_restart,
+            stdin=config.stdin,
+            stdout=config.stdout,
+            stderr=config.stderr,
+            status_changed_hook=status_changed_hook,
+            max_rss=config.max_rss,
+            max_cpu_time=config.max_cpu_time,
+            status_histogram=self.status_histogram,
+            schedule=config.schedule,
+            jitter=config.jitter,
+            skip_if_running=config.skip_if_running,
+            template_path=split_instance_path(path)[0],
+            stdin_pipe=config.stdin_pipe,
+            down_timeout=config.down_timeout,
+            priority_class=config.priority_class,
+            admission=self.admission,
+            executor=self.monitor_executor,
+            status_updated_hook=self._on_runner_status_updated,
+        )
+        self._init_runner_runtime(self._get_config_from_runner(runner))
+        return runner
+
+    def get_instance_path_list(self, template_path: str) -> list[str]:
+        return sort_instance_path_list(
+            [path for path in self.runner_dict if is_instance_of(path, template_path)]
+        )
+
+    async def scale_runner(
+        self, template_path: str, instance_num: int
+    ) -> dict[str, list]:
+        """Run the instances template@1 to template@instance_num
+
+        Numbered instances above instance_num are stopped, named instances are
+        left alone. The template config is resolved once for all new instances.
+        """
+        if instance_num < 0:
+            raise RunnerManagerError(f"Invalid instance number {instance_num}")
+        RunnerManagerConfig._check_runner(template_path)
+        self.template_config_dict.pop(template_path, None)
+        wanted_path_list = [
+            get_instance_path(template_path, str(i)) for i in range(1, instance_num + 1)
+        ]
+        started_path_list = [
+            path for path in wanted_path_list if path not in self.runner_dict
+        ]
+        for future in [
+            self._submit(path, partial(self._start_runner, path), ("start",))
+            for path in started_path_list
+        ]:
+            await future
+        stopped_path_list = [
+            path
+            for path in self.get_instance_path_list(template_path)
+            if path not in wanted_path_list and split_instance_path(path)[1].isdigit()
+        ]
+        for path, result in (
+            await self._stop_runner_list(list(reversed(stopped_path_list)))
+        ).items():
+            if result != "ok":
+                raise RunnerManagerError(result)
+        return {"started": started_path_list, "stopped": stopped_path_list}
+
+    async def restart_instances(
+        self, template_path: str, batch_size: int = 1, strategy: str = None
+    ) -> dict[str, list[str]]:
+        """Restart the running instances of a template batch by batch"""
+        self.template_config_dict.pop(template_path, None)
+        return await self.rolling_restart(
+            self.get_instance_path_list(template_path), batch_size, strategy=strategy
+        )
+
+    async def rolling_restart(
+        self,
+        path_list: list[str],
+        batch_size: int = 1,
+        pause: float = 0,
+        strategy: str = None,
+    ) -> dict[str, list[str]]:
+        """Restart batch_size runners at a time
+
+        The next batch starts once the runners of this batch are ready again
+        and pause seconds have passed. The first batch that fails stops the
+        rollout, so at most one batch of capacity is lost.
+        """
+        if batch_size < 1:
+            raise RunnerManagerError(f"Invalid batch size {batch_size}")
+        result = {"restarted": [], "failed": [], "skipped": []}
+        for i in range(0, len(path_list), batch_size):
+            if result["failed"]:
+                result["skipped"].extend(path_list[i:])
+                break
+            if i and pause > 0:
+                await asyncio.sleep(pause)
+            batch_path_list = path_list[i : i + batch_size]
+            # runners of a batch restart concurrently in the operation queue
+            future_list = [
+                self._submit(
+                    path,
+                    partial(self._restart_runner_until_ready, path, strategy),
+                    ("rolling_restart", strategy),
+                    PRIORITY_BULK,
+                )
+                for path in batch_path_list
+            ]
+            for path, future in zip(batch_path_list, future_list):
+                result["restarted" if await future else "failed"].append(path)
+        return result
+
+    async def _restart_runner_until_ready(self, path: str, strategy: str) -> bool:
+        """The runner is held until it is ready again, or found not to be"""
+        try:
+            ready, config = await self._restart_runner(path, strategy, "rolling")
+            if ready:
+                return True
+            runner = self.get_runner(path)
+        except BaseError as e:
+            logging.error(e.message)
+            return False
+        if await self._wait_ready(runner, config):
+            return True
+        logging.error(f"Runner {path} is not ready after restart")
+        return False
+
+    def _schedule_runner(self, runner: Runner):
+        next_run_time = self.timer_heap.schedule(
+            runner.path, parse_schedule(runner.schedule), runner.jitter
+        )
+        runner.schedule_next_run(next_run_time)
+
+    def _fire_timer(self, path: str):
+        # called on the event loop, the run is queued without waiting
+        self._submit(
+            path, partial(self._run_timer_runner, path), ("timer",), PRIORITY_BACKGROUND
+        )
+
+    async def _run_timer_runner(self, path: str):
+        runner = self.runner_dict.get(path)
+        if runner is None or not runner.schedule:
+            self.timer_heap.cancel(path)
+            return
+        runner.schedule_next_run(self.timer_heap.get_next_time(path))
+        try:
+            if runner.is_running() or runner.is_monitoring():
+                if runner.skip_if_running:
+                    logging.info(f"Timer runner {path} is still running, skipped")
+                    skipped_run_num = runner.status_record.get("skipped_run_num", 0)
+                    runner.record_status({"skipped_run_num": skipped_run_num + 1})
+                    return
+                if runner.is_running():
+                    await self._run_blocking(runner.stop)
+            runner.run_once(self.loop)
+        except Exception as e:
+            logging.exception(e)
+
+    async def stop(self, path: str, check_running: bool = False):
+        await self._run(
+            path,
+            partial(self._stop_runner, path, check_running),
+            ("stop", check_running),
+        )
+
+    async def stop_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        """Stop runners, return "ok" or the error by path, see _stop_runner_list"""
+        return await self._stop_runner_list(path_list)
+
+    async def _stop_runner_list(
+        self, path_list: list[str], priority: int = PRIORITY_INTERACTIVE
+    ) -> dict[str, str]:
+        """The down scripts of all runners run at once, and every runner is
+        stopped as soon as its own down script exits
+
+        Each down script is started by a queued operation that does not wait
+        for it, so it never runs while another operation holds its runner.
+        """
+        # queued first, the down scripts start before a stop holds a worker
+        pre_stop_future_dict = {
+            path: self._submit(
+                path, partial(self._pre_stop_runner, path), priority=priority
+            )
+            for path in path_list
+        }
+        future_dict = {
+            path: self._submit(
+                path,
+                partial(self._stop_runner, path, pre_stop_future=pre_stop_future),
+                priority=priority,
+            )
+            for path, pre_stop_future in pre_stop_future_dict.items()
+        }
+        result = {}
+        for path, future in future_dict.items():
+            try:
+                await future
+                result[path] = "ok"
+            except BaseError as e:
+                result[path] = e.message
+            except Exception as e:
+                logging.exception(e)
+                result[path] = f"Failed to stop {path}: {e}"
+        return result
+
+    async def _pre_stop_runner(self, path) -> asyncio.Task or None:
+        """Start the down script of a runner, return its task"""
+        return self._start_down_script(self.get_runner(path))
+
+    def _get_down_script_path(self, runner: Runner) -> str or None:
+        down_path = f"{runner.template_path}.down"
+        if "down" in enable_compatible_runit and Path(runner.path).name != "down":
+            down_path = str(Path(runner.path).parent / "down")
+        try:
+            RunnerManagerConfig._check_runner(down_path)
+        except ManagerConfigError:
+            return None
+        return down_path
+
+    def _start_down_script(self, runner: Runner) -> asyncio.Task or None:
+        """Run the down script of a runner on the loop, None if it has none"""
+        down_path = self._get_down_script_path(runner)
+        if down_path is None:
+            return None
+        logging.info(f"Pre-run {down_path}")
+        return self.loop.create_task(self._run_down_script(down_path, runner))
+
+    async def _run_down_script(self, down_path: str, runner: Runner) -> int or None:
+        with open(runner.stdout, "a") as stdout_io, open(
+            runner.stderr, "a"
+        ) as stderr_io:
+            process = await asyncio.create_subprocess_exec(
+                down_path,
+                *runner.args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=stdout_io,
+                stderr=stderr_io,
+                cwd=str(Path(down_path).parent),
+                env=runner.env,
+            )
+        try:
+            returncode = await asyncio.wait_for(process.wait(), runner.down_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                f"Down script {down_path} is still running after "
+                f"{runner.down_timeout}s, killing it"
+            )
+            process.kill()
+            await process.wait()
+            returncode = None
+        if self.history:
+            self.history.record(
+                runner.path, HOOK, returncode=returncode, detail=f"down: {down_path}"
+            )
+        return returncode
+
+    async def _stop_runner(
+        self,
+        path,
+        check_running: bool = False,
+        reason: str = "stop",
+        pre_stop_future: asyncio.Future = None,
+    ):
+        """pre_stop_future is the _pre_stop_runner queued before this operation"""
+        if pre_stop_future is None:
+            down_task = await self._pre_stop_runner(path)
+        else:
+            # done, it ran before this operation in the queue of the runner
+            down_task = pre_stop_future.result()
+        runner = self.get_runner(path)
+        if down_task is not None:
+            try:
+                await down_task
+            except Exception as e:
+                logging.error(f"Down script of {path} failed: {e}")
+        # an idle timer runner has nothing to stop
+        scheduled = self.timer_heap.cancel(path)
+        # Stop the runner if check_running is False or the runner is running
+        if runner.is_running() or not (check_running or scheduled):
+            await self._run_blocking(runner.stop)
+        await self._pop_runner(runner, reason)
+
+    def _start_watchdog(self):
+        if watchdog_interval <= 0:
+            return
+        if not watchdog.is_supported():
+            logging.warning("Resource watchdog is not supported on this platform")
+            return
+        self._background_future_list.append(
+            asyncio.run_coroutine_threadsafe(self._watch_runner_usage(), self.loop)
+        )
+
+    async def _watch_runner_usage(self):
+        while True:
+            await asyncio.sleep(watchdog_interval)
+            runner_dict = {
+                runner.pid: runner
+                for runner in list(self.runner_dict.values())
+                if (runner.max_rss or runner.max_cpu_time)
+                and runner.is_running()
+                and not runner.is_frozen()
+            }
+            if not runner_dict:
+                continue
+            usage_dict = await self.loop.run_in_executor(
+                self.monitor_executor, watchdog.sweep_process_usage, list(runner_dict)
+            )
+            for pid, usage in usage_dict.items():
+                runner = runner_dict[pid]
+                event = watchdog.check_usage_limit(
+                    usage, runner.max_rss, runner.max_cpu_time
+                )
+                if event is None:
+                    continue
+                event["time"] = time()
+                logging.warning(
+                    f"Runner {runner.path} exceeded {event['reason']}, restarting"
+                )
+                runner.record_status({"watchdog": event})
+                # queued without waiting, like probe restarts
+                self._submit(
+                    runner.path,
+                    partial(self._watchdog_restart_runner, runner, event),
+                    ("watchdog_restart",),
+                    PRIORITY_BACKGROUND,
+                )
+
+    async def _watchdog_restart_runner(self, runner: Runner, event: dict[str, any]):
+        if self.runner_dict.get(runner.path) is not runner:
+            return
+        try:
+            await self._restart_runner(
+                runner.path, reason=f"watchdog: {event['reason']}"
+            )
+        except Exception as e:
+            logging.exception(e)
+            return
+        self.get_runner(runner.path).record_status(
+            {
+                "watchdog": event,
+                "watchdog_restart_num": runner.status_record.get(
+                    "watchdog_restart_num", 0
+                )
+                + 1,
+            }
+        )
+
+    def send_input_runner(self, path: str, data: bytes) -> int:
+        """Write data to the stdin pipe of a runner, see Runner.write_stdin
+
+        The write never blocks, so it is not queued behind other operations;
+        the runner locks its pipe against a concurrent stop.
+        """
+        return self.get_runner(path).write_stdin(data)
+
+    def send_input_runner_list(
+        self, path_list: list[str], data: bytes
+    ) -> dict[str, int or str]:
+        """Send data to many runners, return bytes written or error by path"""
+        result = {}
+        for path in path_list:
+            try:
+                result[path] = self.send_input_runner(path, data)
+            except BaseError as e:
+                result[path] = e.message
+            except Exception as e:
+                result[path] = f"Failed to send to {path}: {e}"
+        return result
+
+    async def freeze_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        """SIGSTOP the process groups of runners, return "ok" or the error by path"""
+        return await self._run_runner_list(
+            path_list, lambda path: self.get_runner(path).freeze(), ("freeze",)
+        )
+
+    async def thaw_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        """SIGCONT the process groups of frozen runners, see freeze_runner_list"""
+        return await self._run_runner_list(
+            path_list, lambda path: self.get_runner(path).thaw(), ("thaw",)
+        )
+
+    async def _run_runner_list(
+        self, path_list: list[str], func: Callable[[str], None], key: tuple
+    ) -> dict[str, str]:
+        async def operation(path: str):
+            func(path)
+
+        future_dict = {
+            path: self._submit(path, partial(operation, path), key)
+            for path in path_list
+        }
+        result = {}
+        for path, future in future_dict.items():
+            try:
+                await future
+                result[path] = "ok"
+            except BaseError as e:
+                result[path] = e.message
+            except Exception as e:
+                logging.exception(e)
+                result[path] = f"Failed to {key[0]} {path}: {e}"
+        return result
+
+    def _start_auto_freeze(self):
+        if freeze_interval <= 0 or not (freeze_cpu_pressure or freeze_memory_pressure):
+            return
+        self._background_future_list.append(
+            asyncio.run_coroutine_threadsafe(self._sweep_auto_freeze(), self.loop)
+        )
+
+    async def _sweep_auto_freeze(self):
+        while True:
+            await asyncio.sleep(freeze_interval)
+            pressure = self.admission.get_pressure()
+            # the highest pressure relative to its threshold
+            level = 0
+            if freeze_cpu_pressure:
+                level = max(level, (pressure.cpu or 0) / freeze_cpu_pressure)
+            if freeze_memory_pressure:
+                level = max(level, (pressure.memory or 0) / freeze_memory_pressure)
+            if level >= 1:
+                path_list = [
+                    path
+                    for path, runner in list(self.runner_dict.items())
+                    if runner.priority_class == BATCH
+                    and runner.is_running()
+                    and not runner.is_frozen()
+                ]
+                if path_list:
+                    logging.warning(
+                        f"Freezing {len(path_list)} batch runners, {pressure}"
+                    )
+                for path in path_list:
+                    self._auto_frozen_path_set.add(path)
+                    self._submit(
+                        path,
+                        partial(self._auto_freeze_runner, path, True),
+                        ("freeze",),
+                        PRIORITY_BACKGROUND,
+                    )
+            elif level < 0.5 and self._auto_frozen_path_set:
+                logging.warning(
+                    f"Thawing {len(self._auto_frozen_path_set)} batch runners"
+                )
+                for path in self._auto_frozen_path_set:
+                    self._submit(
+                        path,
+                        partial(self._auto_freeze_runner, path, False),
+                        ("thaw",),
+                        PRIORITY_BACKGROUND,
+                    )
+                self._auto_frozen_path_set = set()
+
+    async def _auto_freeze_runner(self, path: str, freeze: bool):
+        runner = self.runner_dict.get(path)
+        # thawed, stopped or restarted meanwhile
+        try:
+            if freeze and runner and runner.is_running():
+                runner.freeze("pressure")
+            elif not freeze and runner and runner.is_frozen():
+                runner.thaw("pressure")
+        except RunnerError as e:
+            logging.info(e.message)
+
+    async def send_signal_runner(self, path: str, signal):
+        await self._run(
+            path, partial(self._send_signal_runner, path, signal), ("signal", signal)
+        )
+
+    async def _send_signal_runner(self, path: str, signal):
+        self.get_runner(path).send_signal(signal)
+
+    async def _pop_runner(self, runner: Runner, reason: str = "stop"):
+        if runner.process is not None:
+            self.tombstone_store.add(
+                await self._run_blocking(self._get_tombstone, runner, reason)
+            )
+        if reason == "gc":
+            self.collected_num += 1
+        # a restart starts the runner again in the same runtime directories
+        if reason != "restart":
+            await self._run_blocking(self._destroy_runner_runtime, runner)
+        del self.runner_dict[runner.path]
+        self._stopped_since_dict.pop(runner.path, None)
+        if self.history:
+            self.history.forget(runner)
+        with self._path_index_lock:
+            if runner.path not in self._listed_path_set:
+                self.path_index.remove(runner.path)
+        if self.status_snapshot:
+            self.status_snapshot.mark_dirty([runner.path])
+        self.hook_executor.drop_hook_table(runner.path)
+        self.probe_scheduler.remove(runner.path)
+        if runner.template_path != runner.path and not self.get_instance_path_list(
+            runner.template_path
+        ):
+            self.template_config_dict.pop(runner.template_path, None)
+
+    @staticmethod
+    def _get_tombstone(runner: Runner, reason: str) -> Tombstone:
+        return Tombstone(
+            path=runner.path,
+            reason=reason,
+            status=str(runner.status.key) if runner.status else None,
+            pid=runner.pid,
+            returncode=runner.get_returncode(),
+            booted_num=runner.booted_num,
+            stopped_time=time(),
+            log_tail=read_log_tail(runner.stdout, gc_log_tail_lines),
+            error_tail=(
+                read_log_tail(runner.stderr, gc_log_tail_lines)
+                if runner.stderr != runner.stdout
+                else []
+            ),
+        )
+
+    @staticmethod
+    def _init_runner_runtime(config: RunnerConfig):
+        if config.stdin_pipe:
+            make_stdin_pipe(config.stdin)
+        # stdin, stdout and stderr usually share their directory
+        for path in {config.stdin, config.stdout, config.stderr}:
+            if not Path(path).exists():
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                Path(path).touch()
+
+    @staticmethod
+    def _get_runtime_dir_set(runner: Runner) -> set[Path]:
+        return {
+            Path(path).parent for path in (runner.stdin, runner.stdout, runner.stderr)
+        }
+
+    def _destroy_runner_runtime(self, runner: Runner):
+        """Delete the runtime directories of a runner below the runtime root
+
+        Runners of the same directory share their std directory by default,
+        it is kept while one of them is in memory.
+        """
+        dir_set = self._get_runtime_dir_set(runner)
+        with self._path_index_lock:
+            path_list = self.path_index.select_children(str(Path(runner.path).parent))
+        for path in path_list:
+            other_runner = self.runner_dict.get(path)
+            if other_runner is not None and other_runner is not runner:
+                dir_set -= self._get_runtime_dir_set(other_runner)
+        tmp_path = Path(self.tmp_dir_path) / "runner"
+        for dir_path in dir_set:
+            delete_directory_and_empty_parents(dir_path, tmp_path)
+
+    def _on_hook_done(self, job: HookJob, returncode: int or None):
+        if self.history:
+            self.history.record(
+                job.runner_path,
+                HOOK,
+                returncode=returncode,
+                detail=f"{job.status_key}: {job.script_path}",
+            )
+
+    def _on_runner_status_updated(self, runner: Runner, status: RunnerStatus):
+        # data only, the status hooks and listeners wait for the next key
+        if self.history and "returncode" in status.data:
+            self.history.observe_exit(runner)
+        if self.status_snapshot:
+            self.status_snapshot.mark_dirty([runner.path])
+
+    def _run_runner_status_hook(self, runner: Runner, status: RunnerStatus):
+        if self.history:
+            self.history.observe_status(runner, status)
+        for listener in self.status_listener_list:
+            try:
+                listener(runner, status)
+            except Exception as e:
+                logging.exception(e)
+        if self._queue_set:
+            # status changes happen on the loop and in executor threads
+            event = StatusEvent(runner.path, str(status.key), dict(status.data))
+            self.loop.call_soon_threadsafe(self._publish, event)
+        if self.status_snapshot:
+            self.status_snapshot.mark_dirty([runner.path])
+        self.hook_executor.submit(runner, status)
+
+    def events(self) -> AsyncIterator[StatusEvent]:
+        """Status changes of all runners, from this call until the manager
+        closes, even the ones before the first iteration
+
+        A consumer that falls behind by event_queue_size events loses the
+        oldest ones, counted in dropped_event_num.
+        """
+        queue = asyncio.Queue(self.event_queue_size)
+        self._queue_set.add(queue)
+        return self._iter_events(queue)
+
+    async def _iter_events(self, queue: asyncio.Queue) -> AsyncIterator[StatusEvent]:
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self._queue_set.discard(queue)
+
+    def _publish(self, event: StatusEvent):
+        for queue in self._queue_set:
+            self._put_event(queue, event)
+
+    def _put_event(self, queue: asyncio.Queue, event: StatusEvent or None):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped_event_num += 1
+        queue.put_nowait(event)
@@ -4,6 +4,7 @@ from json import dumps
 from pathlib import Path
 
 from .errors import ManagerConfigError
+from .instance import split_instance_path
 from .runner_manager import RunnerManagerStatus
 from .runner_manager_config import RunnerManagerConfig
 
@@ -66,8 +67,10 @@ def get_absolute_path(path) -> str:
 
 
 def runner_status_dict_to_str(
-    runner_status_dict: dict[str, list[RunnerManagerStatus]]
+    runner_status_dict: dict[str, list[RunnerManagerStatus]],
+    broken_dict: dict[str, bool] = None,
 ) -> str:
+    """broken_dict skips checking the runner files, e.g. from a status snapshot"""
     result = ""
     for path, status_list in runner_status_dict.items():
         result_list = [f"{path}:"]
@@ -84,15 +87,35 @@ def runner_status_dict_to_str(
             result_list.append("boot")
         if len(result_list) == 1:
             result_list.append("[idle]")
-        try:
-            RunnerManagerConfig._check_runner(path)
-        except ManagerConfigError:
-            result_list.append("[broken]")
+        if broken_dict is not None:
+            if broken_dict.get(path):
+                result_list.append("[broken]")
+        else:
+            try:
+                RunnerManagerConfig._check_runner(split_instance_path(path)[0])
+            except ManagerConfigError:
+                result_list.append("[broken]")
         result_list.append("\n")
         result += " ".join(result_list)
     return result[:-1]
 
 
+def fanout_result_to_str(command: str, result_dict: dict[str, dict]) -> str:
+    """Merge the results of a command run on several daemons into one table"""
+    line_list = []
+    for name, target_result in result_dict.items():
+        if "error" in target_result:
+            line_list.append(f"{name}: [error] {target_result['error']}")
+        elif command == "list":
+            # runner files live on the target, they are not checked here
+            status_str = runner_status_dict_to_str(target_result["result"], {})
+            line_list.extend(f"{name} {line}" for line in status_str.splitlines())
+        else:
+            line_list.append(f"{name}:")
+            line_list.append(pretty_print_str(target_result["result"], 1).rstrip())
+    return "\n".join(line_list)
+
+
 """Search current directory and its child directoty and its parent directory by keyword in the keyword_list
 Search all child directory but ended when the parent directory not have any match file.
 Return a dict of file key is keyword and value is the path list which include the keyword in the name.
@@ -6,3 +6,77 @@ _lowercase_env_vars = {k.lower(): v for k, v in os.environ.items()}
 enable_compatible_runit = (
     _lowercase_env_vars.get("compatible_runit", "").lower().split(",")
 )
+
+# seconds between two resource watchdog sweeps, 0 to disable
+watchdog_interval = float(_lowercase_env_vars.get("watchdog_interval", "10"))
+
+# process spawn backend of runners: posix_spawn or popen
+spawn_backend = _lowercase_env_vars.get("spawn_backend", "popen").lower()
+
+# status hook scripts run at most hook_workers at a time, killed after hook_timeout
+hook_workers = int(_lowercase_env_vars.get("hook_workers", "4"))
+hook_timeout = float(_lowercase_env_vars.get("hook_timeout", "60"))
+
+# supervisor processes the runners are split across, 0 or 1 to supervise in the daemon
+shards = int(_lowercase_env_vars.get("shards", "0"))
+# a dead shard process is found and started again within shard_check_interval seconds
+shard_check_interval = float(_lowercase_env_vars.get("shard_check_interval", "1"))
+
+# health probes of all runners run at most probe_workers at a time
+probe_workers = int(_lowercase_env_vars.get("probe_workers", "16"))
+
+# number of status transitions kept in the history of every runner
+status_history_size = int(_lowercase_env_vars.get("status_history_size", "32"))
+
+# seconds a new process must keep running to be ready when it has no ready script
+ready_settle_time = float(_lowercase_env_vars.get("ready_settle_time", "1"))
+
+# seconds between two liveness sweeps of the status snapshot, 0 to disable it
+status_snapshot_interval = float(
+    _lowercase_env_vars.get("status_snapshot_interval", "1")
+)
+
+# seconds between two event loop lag samples
+loop_lag_interval = float(_lowercase_env_vars.get("loop_lag_interval", "0.5"))
+
+# start, stop, restart and reload operations of different runners running at once
+operation_workers = int(_lowercase_env_vars.get("operation_workers", "16"))
+
+# stopped runners are removed from memory gc_max_age seconds after they stopped,
+# or the oldest first above gc_max_stopped; swept every gc_interval seconds,
+# gc_batch_size runners per loop iteration, 0 disables the sweep
+gc_interval = float(_lowercase_env_vars.get("gc_interval", "30"))
+gc_max_age = float(_lowercase_env_vars.get("gc_max_age", "600"))
+gc_max_stopped = int(_lowercase_env_vars.get("gc_max_stopped", "256"))
+gc_batch_size = int(_lowercase_env_vars.get("gc_batch_size", "256"))
+
+# exit records kept per runner path, with the last lines of its logs
+gc_keep_per_path = int(_lowercase_env_vars.get("gc_keep_per_path", "3"))
+gc_log_tail_lines = int(_lowercase_env_vars.get("gc_log_tail_lines", "20"))
+
+# lifecycle history database of the daemon, events older than history_retention
+# seconds are deleted, 0 keeps them
+history_db = _lowercase_env_vars.get("history_db", "1").lower() not in ("0", "false")
+history_retention = float(_lowercase_env_vars.get("history_retention", "2592000"))
+
+# starts wait while cpu or memory PSI avg10 (percent), the 1 minute load average
+# per cpu or the percent of memory available cross these, 0 disables a check and
+# all are disabled by default; waiting starts are admitted one per
+# admission_interval seconds, and anyway after admission_max_wait seconds
+admission_cpu_pressure = float(_lowercase_env_vars.get("admission_cpu_pressure", "0"))
+admission_memory_pressure = float(
+    _lowercase_env_vars.get("admission_memory_pressure", "0")
+)
+admission_load = float(_lowercase_env_vars.get("admission_load", "0"))
+admission_min_mem_available = float(
+    _lowercase_env_vars.get("admission_min_mem_available", "0")
+)
+admission_interval = float(_lowercase_env_vars.get("admission_interval", "1"))
+admission_max_wait = float(_lowercase_env_vars.get("admission_max_wait", "300"))
+
+# running batch runners are frozen while cpu or memory PSI avg10 (percent) reach
+# these, checked every freeze_interval seconds, and thawed once both are below
+# half of them; 0 disables a check
+freeze_cpu_pressure = float(_lowercase_env_vars.get("freeze_cpu_pressure", "0"))
+freeze_memory_pressure = float(_lowercase_env_vars.get("freeze_memory_pressure", "0"))
+freeze_interval = float(_lowercase_env_vars.get("freeze_interval", "5"))
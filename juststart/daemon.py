@@ -1,26 +1,74 @@
 import shutil
 import asyncio
 import logging
+import multiprocessing
+import os
 import signal
+import tempfile
 from multiprocessing.managers import BaseManager
 from pathlib import Path
-from threading import Thread
+from threading import Event, Thread
+from time import monotonic, sleep
+from typing import Callable
 
-from .errors import BaseError
+from .config import shard_check_interval, shards
+from .errors import BaseError, RunnerError, RunnerManagerError
+from .history_db import get_history_path
+from .instrumentation import instrument_rpc, sample_profile
+from .manifest import MANIFEST_FILE_NAME
 from .runner_manager import RunnerManager
 from .runner_manager_config import RunnerManagerConfig
+from .shard import ShardedRunnerManager
+from .status_histogram import DurationHistogram
+from .status_snapshot import remove_status_snapshots
+from .utils import cancel_all_tasks
+
+RUNTIME_DIR_NAME = "runtime_tmp"
 
 
 class MyManager(BaseManager):
     pass
 
 
+class ShardClientManager(MyManager):
+    """Client of a shard in the front, registered apart from the server of
+    the front, so connecting to a restarted shard leaves the server intact"""
+
+
+# Runner objects are not picklable, return them as proxies
+_runner_manager_method_to_typeid = {"start_runner": "Runner", "get_runner": "Runner"}
+
+
 class Utils:
     def __init__(self, runner_manager: RunnerManager):
         self.runner_manager = runner_manager
+        self.rpc_histogram = DurationHistogram(min_bound=0.00005, bucket_num=24)
+
+    def get_runner_status(self, path: str, history: bool = False) -> dict:
+        tombstone_list = self.runner_manager.tombstone_store.get_list(path)
+        try:
+            runner = self.runner_manager.get_runner(path)
+        except RunnerError:
+            # removed from memory, report how it ended
+            if not tombstone_list:
+                raise
+            return {"path": path, "tombstones": tombstone_list}
+        status_dict = runner.status_dict
+        if history:
+            status_dict["history"] = runner.get_status_history()
+            status_dict["tombstones"] = tombstone_list
+        return status_dict
+
+    def get_status_histogram(self) -> dict:
+        return self.runner_manager.get_status_histogram()
+
+    def get_instrumentation_stats(self) -> dict:
+        return self.runner_manager.get_instrumentation_stats() | {
+            "rpc": self.rpc_histogram.to_dict()
+        }
 
-    def get_runner_status(self, path: str) -> dict:
-        return self.runner_manager.get_runner(path).status_dict
+    def profile(self, seconds: float) -> str:
+        return sample_profile(seconds)
 
     def shutdown(self):
         global shutdown
@@ -40,15 +88,30 @@ def _handle_sigterm(signum, frame):
 signal.signal(signal.SIGTERM, _handle_sigterm)
 
 
-def get_manager(address: tuple[str, int], authkey: bytes) -> BaseManager:
-    return MyManager(address=address, authkey=authkey)
+def get_manager(
+    address: tuple[str, int] or str,
+    authkey: bytes,
+    manager_class: type[BaseManager] = MyManager,
+) -> BaseManager:
+    return manager_class(address=address, authkey=authkey)
 
 
 def connect_manager(address: str, port: int, password: bytes) -> MyManager:
-    MyManager.register("get_runner_manager")
-    MyManager.register("get_runner_manager_config")
-    MyManager.register("get_utils")
-    manager = get_manager(address=(address, port), authkey=password)
+    return _connect_manager((address, port), password)
+
+
+def _connect_manager(
+    address: tuple[str, int] or str,
+    password: bytes,
+    manager_class: type[MyManager] = MyManager,
+) -> MyManager:
+    manager_class.register("Runner", create_method=False)
+    manager_class.register(
+        "get_runner_manager", method_to_typeid=_runner_manager_method_to_typeid
+    )
+    manager_class.register("get_runner_manager_config")
+    manager_class.register("get_utils")
+    manager = get_manager(address, password, manager_class)
     manager.connect()
     return manager
 
@@ -69,48 +132,191 @@ def test_is_running(address: str, port: int, password: bytes):
         return False
 
 
-async def cancel_all_tasks():
-    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
-    [task.cancel() for task in tasks]
-    await asyncio.gather(*tasks, return_exceptions=True)
+class ShardedUtils(Utils):
+    """Utils of the front of a sharded daemon"""
 
+    def get_runner_status(self, path: str, history: bool = False) -> dict:
+        return self.runner_manager.get_shard_utils(path).get_runner_status(
+            path, history
+        )
 
-def run_deamon(address: str, port: int, password: bytes, config_dir_path: str):
-    global shutdown
-    shutdown = False
-    config_dir = Path(config_dir_path)
-
-    # monkey patch
-    monkey_patch_dir = config_dir / "monkey_patch"
-    if monkey_patch_dir.exists():
-        for patch_file in monkey_patch_dir.iterdir():
-            exec(patch_file.read_text())
 
+def _create_runner_manager(
+    config_dir: Path, shard: tuple[int, int] = None
+) -> RunnerManager:
     runner_list_file_path = config_dir / "runner_list"
     default_runner_config_file_path = config_dir / "default"
     default_runner_config_file_path.mkdir(parents=True, exist_ok=True)
-    tmp_dir_path = config_dir / "runtime_tmp"
+    tmp_dir_path = config_dir / RUNTIME_DIR_NAME
     tmp_dir_path.mkdir(parents=True, exist_ok=True)
-    runner_manager = RunnerManager(
+    return RunnerManager(
         runner_list_file_path=str(runner_list_file_path),
         default_runner_config_path=str(default_runner_config_file_path),
         tmp_dir_path=str(tmp_dir_path),
+        manifest_path=str(config_dir / MANIFEST_FILE_NAME),
+        shard=shard,
+        history_path=get_history_path(str(config_dir), shard[0] if shard else None),
+    )
+
+
+def _apply_monkey_patches(config_dir: Path):
+    monkey_patch_dir = config_dir / "monkey_patch"
+    if monkey_patch_dir.exists():
+        for patch_file in monkey_patch_dir.iterdir():
+            exec(patch_file.read_text())
+
+
+def run_shard(
+    config_dir_path: str, address: str, shard_index: int, shard_num: int, password
+):
+    """Entry point of a shard process, serves its runner manager on address"""
+    logging.basicConfig(level=logging.INFO)
+    global shutdown
+    shutdown = False
+    # a spawned process starts from a fresh interpreter, without the patches
+    _apply_monkey_patches(Path(config_dir_path))
+    # the front is the only one listening to the terminal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent_pid = os.getppid()
+    runner_manager = _create_runner_manager(
+        Path(config_dir_path), (shard_index, shard_num)
     )
     utils = Utils(runner_manager)
-    logging.warning("runner_manager: %s", runner_manager)
-    MyManager.register("get_runner_manager", lambda: runner_manager)
+    _serve(
+        address,
+        password,
+        runner_manager,
+        runner_manager.manager_config,
+        utils,
+        is_orphan=lambda: os.getppid() != parent_pid,
+    )
+
+
+def _connect_shard(address: str, password: bytes, process, timeout: float = 60):
+    end_time = monotonic() + timeout
+    while True:
+        try:
+            manager = _connect_manager(address, password, ShardClientManager)
+            runner_manager, _, utils = get_objs(manager)
+            return runner_manager, utils
+        except (FileNotFoundError, ConnectionError, EOFError):
+            if not process.is_alive() or monotonic() > end_time:
+                raise RunnerManagerError(f"Shard {process.name} failed to start")
+            sleep(0.05)
+
+
+def _start_shards(config_dir: Path, password: bytes, shard_num: int):
+    """Start the shard processes, and a thread starting again the ones that
+    die; their proxies in shard_list are replaced in place"""
+    # unix socket paths are short, the config dir may not be
+    socket_dir = tempfile.mkdtemp(prefix="juststart-")
+    context = multiprocessing.get_context("spawn")
+    address_list = [
+        os.path.join(socket_dir, f"shard{shard_index}.sock")
+        for shard_index in range(shard_num)
+    ]
+
+    def start_shard(shard_index: int):
+        process = context.Process(
+            target=run_shard,
+            args=(
+                str(config_dir),
+                address_list[shard_index],
+                shard_index,
+                shard_num,
+                password,
+            ),
+            name=f"juststart-shard{shard_index}",
+        )
+        process.start()
+        return process
+
+    process_list = [start_shard(shard_index) for shard_index in range(shard_num)]
+    shard_list = [
+        _connect_shard(address, password, process)
+        for address, process in zip(address_list, process_list)
+    ]
+    stopping = Event()
+
+    def watch_shards():
+        while not stopping.wait(shard_check_interval):
+            for shard_index, process in enumerate(process_list):
+                if process.is_alive() or stopping.is_set():
+                    continue
+                logging.error(
+                    f"Shard {shard_index} exited with {process.exitcode}, "
+                    "starting it again"
+                )
+                # the socket of the dead server is still bound to its path
+                try:
+                    os.unlink(address_list[shard_index])
+                except FileNotFoundError:
+                    pass
+                process = start_shard(shard_index)
+                process_list[shard_index] = process
+                try:
+                    shard_list[shard_index] = _connect_shard(
+                        address_list[shard_index], password, process
+                    )
+                except RunnerManagerError as e:
+                    logging.error(e)
+
+    watch_thread = Thread(target=watch_shards, name="juststart-shard-watch")
+    watch_thread.start()
+
+    def stop_shards():
+        stopping.set()
+        watch_thread.join()
+        for _, utils in shard_list:
+            try:
+                utils.shutdown()
+            except (ConnectionError, EOFError, FileNotFoundError):
+                pass
+        for process in process_list:
+            process.join(timeout=60)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+    return shard_list, stop_shards
+
+
+def _serve(
+    address: tuple[str, int] or str,
+    password: bytes,
+    runner_manager: RunnerManager,
+    manager_config: RunnerManagerConfig,
+    utils: Utils,
+    is_orphan: Callable[[], bool] = lambda: False,
+):
+    global shutdown
+    rpc_runner_manager = instrument_rpc(
+        runner_manager, "runner_manager", utils.rpc_histogram
+    )
+    rpc_manager_config = instrument_rpc(
+        manager_config, "manager_config", utils.rpc_histogram
+    )
+    rpc_utils = instrument_rpc(utils, "utils", utils.rpc_histogram)
+    MyManager.register("Runner", create_method=False)
     MyManager.register(
-        "get_runner_manager_config", lambda: runner_manager.manager_config
+        "get_runner_manager",
+        lambda: rpc_runner_manager,
+        method_to_typeid=_runner_manager_method_to_typeid,
     )
-    MyManager.register("get_utils", lambda: utils)
-    manager = get_manager(address=(address, port), authkey=password)
+    MyManager.register("get_runner_manager_config", lambda: rpc_manager_config)
+    MyManager.register("get_utils", lambda: rpc_utils)
+    manager = get_manager(address=address, authkey=password)
     server = manager.get_server()
-    logging.warning("server: address=%s, port=%s", address, port)
+    logging.warning("server: address=%s", address)
     server_thread = Thread(target=server.serve_forever, daemon=True)
     server_thread.start()
     try:
         while server_thread.is_alive() and not shutdown:
             server_thread.join(timeout=1)
+            if is_orphan():
+                logging.warning("Daemon exited, shutting down the shard")
+                break
         logging.warning("Client ask shutdown")
     except KeyboardInterrupt:
         pass
@@ -121,3 +327,31 @@ def run_deamon(address: str, port: int, password: bytes, config_dir_path: str):
         logging.warning("Server stopped")
         logging.warning("Lock file deleted")
         logging.warning("Bye!")
+
+
+def run_deamon(address: str, port: int, password: bytes, config_dir_path: str):
+    global shutdown
+    shutdown = False
+    config_dir = Path(config_dir_path)
+
+    _apply_monkey_patches(config_dir)
+
+    tmp_dir_path = config_dir / RUNTIME_DIR_NAME
+    tmp_dir_path.mkdir(parents=True, exist_ok=True)
+    remove_status_snapshots(str(tmp_dir_path))
+    if shards > 1:
+        shard_list, stop_shards = _start_shards(config_dir, password, shards)
+        runner_manager = ShardedRunnerManager(
+            RunnerManagerConfig(str(config_dir / "runner_list")),
+            shard_list,
+            stop_shards,
+        )
+        utils = ShardedUtils(runner_manager)
+        logging.warning("runner_manager: %s shards", shards)
+    else:
+        runner_manager = _create_runner_manager(config_dir)
+        utils = Utils(runner_manager)
+        logging.warning("runner_manager: %s", runner_manager)
+    _serve(
+        (address, port), password, runner_manager, runner_manager.manager_config, utils
+    )
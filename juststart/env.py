@@ -1,5 +1,39 @@
 import os
 import subprocess
+from weakref import WeakValueDictionary
+
+
+class SharedEnv(dict):
+    """Environment shared by every runner that resolved to the same variables
+
+    It is read-only, a change in place would change the env of all of them;
+    build a new dict and intern it instead.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("SharedEnv is read-only, intern a modified copy instead")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        # unpickling a dict subclass sets its items one by one
+        return SharedEnv, (dict(self),)
+
+
+_shared_env_dict = WeakValueDictionary()
+
+
+def intern_env(env: dict[str, str]) -> SharedEnv:
+    """Return the shared read-only copy of env"""
+    if isinstance(env, SharedEnv):
+        return env
+    env_key = frozenset(env.items())
+    shared_env = _shared_env_dict.get(env_key)
+    if shared_env is None:
+        shared_env = SharedEnv(env)
+        _shared_env_dict[env_key] = shared_env
+    return shared_env
 
 
 def _parse_env_output(output):
@@ -0,0 +1,118 @@
+"""Run one command on several daemons, e.g. one daemon per host
+
+An inventory file lists one target per line, an optional password file may
+follow the address, otherwise the password of the command line is used:
+
+    # host:port [password_file]
+    web1:50000
+    web2:50000 /etc/juststart/web2.password
+"""
+
+from __future__ import annotations
+
+import queue
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Thread
+from time import monotonic
+from typing import Callable
+
+from .daemon import connect_manager, get_objs
+from .errors import BaseError
+
+DEFAULT_PORT = 50000
+
+
+@dataclass
+class Target:
+    address: str
+    port: int
+    password: bytes
+
+    @property
+    def name(self) -> str:
+        return f"{self.address}:{self.port}"
+
+
+def parse_target(value: str, password: bytes or None) -> Target:
+    """Parse host[:port], or [ipv6]:port"""
+    address, _, port = value.strip().rpartition(":")
+    if not address or not port.isdigit():
+        address, port = value.strip(), DEFAULT_PORT
+    address = address.removeprefix("[").removesuffix("]")
+    if not address:
+        raise ValueError(f"Invalid target {value}")
+    return Target(address, int(port), password)
+
+
+def load_inventory(path: str, password: bytes or None) -> list[Target]:
+    target_list = []
+    for line in Path(path).read_text().splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        value, _, password_path = line.partition(" ")
+        target_password = password
+        if password_path.strip():
+            target_password = Path(password_path.strip()).expanduser().read_bytes()
+        target_list.append(parse_target(value, target_password))
+    return target_list
+
+
+def _run_target(target: Target, func: Callable) -> dict[str, any]:
+    if target.password is None:
+        return {"error": "no password"}
+    try:
+        manager = connect_manager(target.address, target.port, target.password)
+        return {"result": func(*get_objs(manager))}
+    except BaseError as e:
+        return {"error": e.message}
+    except Exception as e:
+        return {"error": str(e) or type(e).__name__}
+
+
+def run_fanout(
+    target_list: list[Target],
+    func: Callable,
+    parallel: int = 16,
+    timeout: float = 30,
+) -> dict[str, dict[str, any]]:
+    """Call func(runner_manager, manager_config, utils) on every target
+
+    At most parallel targets are connected at a time, and a target that
+    has not answered within timeout seconds is reported as timed out and
+    frees its slot. Its daemon thread is abandoned, since the blocking
+    reads of the RPC connection cannot be interrupted.
+    Return {target name: {"result": ...} or {"error": ...}} in target order.
+    """
+    target_list = list({target.name: target for target in target_list}.values())
+    done_queue = queue.Queue()
+    result_dict = {}
+    # target name -> deadline, of the targets being run
+    deadline_dict: dict[str, float] = {}
+    pending_list = list(reversed(target_list))
+    while pending_list or deadline_dict:
+        while pending_list and len(deadline_dict) < max(1, parallel):
+            target = pending_list.pop()
+            deadline_dict[target.name] = monotonic() + timeout
+            Thread(
+                target=lambda target=target: done_queue.put(
+                    (target.name, _run_target(target, func))
+                ),
+                daemon=True,
+            ).start()
+        try:
+            name, target_result = done_queue.get(
+                timeout=max(0, min(deadline_dict.values()) - monotonic())
+            )
+        except queue.Empty:
+            now = monotonic()
+            for name, deadline in list(deadline_dict.items()):
+                if deadline <= now:
+                    del deadline_dict[name]
+                    result_dict[name] = {"error": f"timed out after {timeout}s"}
+            continue
+        # a late answer of a timed out target is dropped
+        if deadline_dict.pop(name, None) is not None:
+            result_dict[name] = target_result
+    return {target.name: result_dict[target.name] for target in target_list}
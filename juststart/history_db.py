@@ -0,0 +1,283 @@
+"""Lifecycle history of runners in SQLite, kept across daemon restarts
+
+The daemon appends starts, exits, restarts, blocker waits, signals and hook
+runs to history.db in the config directory (history.<i>.db per shard). Rows
+are batched by a writer thread, the event loop only queues them. The command
+line reads the files directly, queries are answered from the indexes.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from threading import Thread
+from time import monotonic, time
+
+from .runner_status import (
+    BLOCKING,
+    FROZEN,
+    RUNNING,
+    SIGNAL_READY,
+    SIGNAL_SENT,
+    STOPPED,
+    STOPPING,
+    RunnerStatus,
+)
+
+HISTORY_FILE_NAME = "history.db"
+_HISTORY_GLOB = "history*.db"
+
+START = "start"
+EXIT = "exit"
+RESTART = "restart"
+BLOCKER = "blocker"
+SIGNAL = "signal"
+HOOK = "hook"
+EVENT_KIND_LIST = [START, EXIT, RESTART, BLOCKER, SIGNAL, HOOK]
+
+# a process may exit on its own while the runner is in one of these
+_RUNNING_KEY_SET = {RUNNING, SIGNAL_READY, SIGNAL_SENT, FROZEN}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS event (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    pid INTEGER,
+    returncode INTEGER,
+    signal INTEGER,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS event_time ON event(time);
+CREATE INDEX IF NOT EXISTS event_path_time ON event(path, time);
+CREATE INDEX IF NOT EXISTS event_kind_time_path ON event(kind, time, path);
+"""
+_INSERT = (
+    "INSERT INTO event (time, path, kind, pid, returncode, signal, detail)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+_COLUMN_LIST = ["time", "path", "kind", "pid", "returncode", "signal", "detail"]
+
+
+def get_history_path(config_dir: str, shard_index: int = None) -> str:
+    if shard_index is None:
+        return str(Path(config_dir) / HISTORY_FILE_NAME)
+    return str(Path(config_dir) / f"history.{shard_index}.db")
+
+
+class HistoryWriter:
+    """Append lifecycle events to the history database from any thread
+
+    observe_status turns the status changes of a runner into events, it
+    must see every status change of the runners it is given.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        retention: float = 0,
+        batch_size: int = 512,
+        flush_interval: float = 0.5,
+    ):
+        self.path = path
+        self.retention = retention
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written_num = 0
+        self.dropped_num = 0
+        # the latest status of every runner, to tell changes from updates
+        self._status_dict: dict[str, RunnerStatus] = {}
+        # the last process of every runner whose exit is recorded
+        self._exited_pid_dict: dict[str, int] = {}
+        self._queue = queue.SimpleQueue()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(
+        self,
+        path: str,
+        kind: str,
+        pid: int = None,
+        returncode: int = None,
+        detail: str = None,
+    ):
+        # a negative return code is the signal that killed the process
+        signal = -returncode if returncode is not None and returncode < 0 else None
+        self._queue.put((time(), path, kind, pid, returncode, signal, detail))
+
+    def observe_status(self, runner, status: RunnerStatus):
+        if self._status_dict.get(runner.path) is status:
+            # data of the current status changed
+            return
+        self._status_dict[runner.path] = status
+        history = runner.status_history
+        old_key = history[-2][1] if len(history) > 1 else None
+        reason = history[-1][2] if history else None
+        if old_key in _RUNNING_KEY_SET and status.key != STOPPING:
+            self._record_exit(runner)
+        if status.key == FROZEN or (status.key == RUNNING and old_key == FROZEN):
+            self.record(runner.path, SIGNAL, runner.pid, detail=reason)
+        elif status.key == RUNNING:
+            # boot or restart, from the reason of running_ready
+            detail = history[-2][2] if len(history) > 1 else reason
+            self.record(runner.path, START, runner.pid, detail=detail)
+        elif status.key == STOPPED:
+            self._record_exit(runner, "stop")
+        elif status.key == BLOCKING:
+            self.record(
+                runner.path, BLOCKER, detail=json.dumps(status.data.get("block_list"))
+            )
+        elif status.key == SIGNAL_SENT:
+            self.record(runner.path, SIGNAL, runner.pid, detail=reason)
+
+    def observe_exit(self, runner):
+        """Record the exit of a process that is not restarted
+
+        No status change follows it, the monitor of the runner reports it
+        once the process is reaped.
+        """
+        status = self._status_dict.get(runner.path)
+        if status is not None and status.key in _RUNNING_KEY_SET:
+            self._record_exit(runner)
+
+    def _record_exit(self, runner, detail: str = None):
+        if runner.process is None or runner.process.poll() is None:
+            return
+        # reported by the monitor, then seen again by the next status change
+        if self._exited_pid_dict.get(runner.path) == runner.pid:
+            return
+        self._exited_pid_dict[runner.path] = runner.pid
+        self.record(runner.path, EXIT, runner.pid, runner.get_returncode(), detail)
+
+    def forget(self, runner):
+        """Record the exit a runner removed from memory has not reported"""
+        status = self._status_dict.pop(runner.path, None)
+        if status is not None and status.key in _RUNNING_KEY_SET:
+            self._record_exit(runner)
+        self._exited_pid_dict.pop(runner.path, None)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def _run(self):
+        try:
+            connection = self._connect()
+        except sqlite3.Error as e:
+            logging.error(f"History database {self.path} is not available: {e}")
+            connection = None
+        prune_time = 0
+        stopped = False
+        while not stopped:
+            row = self._queue.get()
+            row_list = []
+            end_time = monotonic() + self.flush_interval
+            while row is not None and len(row_list) < self.batch_size:
+                row_list.append(row)
+                try:
+                    row = self._queue.get(timeout=max(end_time - monotonic(), 0))
+                except queue.Empty:
+                    break
+            stopped = row is None
+            if connection is None:
+                self.dropped_num += len(row_list)
+                continue
+            try:
+                with connection:
+                    connection.executemany(_INSERT, row_list)
+                    if self.retention > 0 and monotonic() >= prune_time:
+                        prune_time = monotonic() + 3600
+                        connection.execute(
+                            "DELETE FROM event WHERE time < ?",
+                            (time() - self.retention,),
+                        )
+                self.written_num += len(row_list)
+            except sqlite3.Error as e:
+                logging.error(f"Failed to write the history: {e}")
+                self.dropped_num += len(row_list)
+        if connection is not None:
+            connection.close()
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written_num,
+            "dropped": self.dropped_num,
+        }
+
+
+def _connect_read_only(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def _get_history_path_list(config_dir: str) -> list[str]:
+    return sorted(str(path) for path in Path(config_dir).glob(_HISTORY_GLOB))
+
+
+def query_history(
+    config_dir: str,
+    path: str = None,
+    since: float = None,
+    kind: str = None,
+    limit: int = 100,
+) -> list[dict[str, any]]:
+    """The latest limit events, oldest first
+
+    path selects the runner at path and the runners below it.
+    """
+    condition_list = []
+    param_list = []
+    if path is not None:
+        prefix = path.rstrip("/")
+        # "0" follows "/", the range is every path below prefix
+        condition_list.append("(path = ? OR (path > ? AND path < ?))")
+        param_list += [path, f"{prefix}/", f"{prefix}0"]
+    if since is not None:
+        condition_list.append("time >= ?")
+        param_list.append(since)
+    if kind is not None:
+        condition_list.append("kind = ?")
+        param_list.append(kind)
+    where = f"WHERE {' AND '.join(condition_list)}" if condition_list else ""
+    sql = (
+        f"SELECT {', '.join(_COLUMN_LIST)} FROM event {where}"
+        " ORDER BY time DESC LIMIT ?"
+    )
+    row_list = []
+    for db_path in _get_history_path_list(config_dir):
+        with closing(_connect_read_only(db_path)) as connection:
+            row_list += connection.execute(sql, param_list + [limit]).fetchall()
+    row_list = sorted(row_list, key=lambda row: row[0])[-limit:]
+    return [dict(zip(_COLUMN_LIST, row)) for row in row_list]
+
+
+def query_flapping(
+    config_dir: str, since: float, limit: int = 10
+) -> list[dict[str, any]]:
+    """Runners with the most exits since, most first"""
+    sql = (
+        "SELECT path, COUNT(*) FROM event WHERE kind = ? AND time >= ?" " GROUP BY path"
+    )
+    exit_num_dict = {}
+    for db_path in _get_history_path_list(config_dir):
+        with closing(_connect_read_only(db_path)) as connection:
+            for path, exit_num in connection.execute(sql, (EXIT, since)):
+                exit_num_dict[path] = exit_num_dict.get(path, 0) + exit_num
+    return [
+        {"path": path, "exits": exit_num}
+        for path, exit_num in sorted(
+            exit_num_dict.items(), key=lambda item: (-item[1], item[0])
+        )[:limit]
+    ]
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from .errors import ManagerConfigError
+from .instance import split_instance_path
+from .path_utils import search_file_by_keywords
+from .runner import Runner
+from .runner_manager_config import RunnerManagerConfig
+from .runner_status import STATUS_KEY_LIST, RunnerStatus
+
+
+@dataclass
+class HookJob:
+    script_path: str
+    runner_path: str
+    status_key: str
+    args: list[str]
+    env: dict[str, str]
+    stdout: str
+    stderr: str
+
+
+def _is_script_available(script_path: str) -> bool:
+    try:
+        RunnerManagerConfig._check_runner(script_path)
+        return True
+    except ManagerConfigError:
+        return False
+
+
+def search_hook_table(runner_path: str) -> dict[str, list[str]]:
+    """Map every status key to the executable hook scripts of a runner"""
+    # instances share the hook scripts of their template
+    runner_path = split_instance_path(runner_path)[0]
+    path = Path(runner_path)
+    keyword_dict = search_file_by_keywords(
+        STATUS_KEY_LIST, path.parent, compound_word=path.name, search_parent=True
+    )
+    hook_table = {}
+    for status_key, script_path_list in keyword_dict.items():
+        script_path_list = [
+            script_path
+            for script_path in dict.fromkeys(script_path_list)
+            if script_path != runner_path and _is_script_available(script_path)
+        ]
+        if script_path_list:
+            hook_table[status_key] = script_path_list
+    return hook_table
+
+
+class HookExecutor:
+    """Run status hook scripts in a bounded worker pool on the manager loop
+
+    A hook waiting in the queue is replaced by the newest status of its runner,
+    so a burst of transitions costs at most one queued run per script.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        worker_num: int,
+        timeout: float,
+        on_done: Callable[[HookJob, int or None], None] = None,
+    ):
+        """on_done is called with every job run and its return code, None if
+        the script could not be run"""
+        self.loop = loop
+        self.worker_num = worker_num
+        self.timeout = timeout
+        self.on_done = on_done
+        self.hook_table_dict: dict[str, dict[str, list[str]]] = {}
+        # the scripts found on disk by template path, the scan walks the tree
+        self._searched_hook_table_dict: dict[str, dict[str, list[str]]] = {}
+        self._pending_job_dict: dict[tuple[str, str], HookJob] = {}
+        self._queue = asyncio.Queue()
+
+    def start(self):
+        return asyncio.run_coroutine_threadsafe(self._run_workers(), self.loop)
+
+    def load_hook_table(
+        self,
+        runner_path: str,
+        hook_table: dict[str, list[str]] = None,
+        research: bool = False,
+    ) -> dict[str, list[str]]:
+        """hook_table is the scripts given by a manifest, without it the disk is
+        searched once per template, and again with research"""
+        if hook_table is not None:
+            hook_table = {
+                status_key: [path for path in path_list if _is_script_available(path)]
+                for status_key, path_list in hook_table.items()
+            }
+        else:
+            template_path = split_instance_path(runner_path)[0]
+            if not research:
+                hook_table = self._searched_hook_table_dict.get(template_path)
+            if hook_table is None:
+                hook_table = search_hook_table(runner_path)
+                self._searched_hook_table_dict[template_path] = hook_table
+        self.hook_table_dict[runner_path] = hook_table
+        return hook_table
+
+    def drop_hook_table(self, runner_path: str):
+        # the searched table is kept, the runner is usually started again
+        self.hook_table_dict.pop(runner_path, None)
+
+    def submit(self, runner: Runner, status: RunnerStatus):
+        hook_table = self.hook_table_dict.get(runner.path)
+        if not hook_table:
+            return
+        job_list = [
+            HookJob(
+                script_path=script_path,
+                runner_path=runner.path,
+                status_key=str(status.key),
+                args=runner.args,
+                env=runner.env,
+                stdout=runner.stdout,
+                stderr=runner.stderr,
+            )
+            for script_path in hook_table.get(str(status.key), [])
+        ]
+        if job_list:
+            self.loop.call_soon_threadsafe(self._enqueue, job_list)
+
+    def _enqueue(self, job_list: list[HookJob]):
+        for job in job_list:
+            job_key = (job.runner_path, job.script_path)
+            if job_key not in self._pending_job_dict:
+                self._queue.put_nowait(job_key)
+            self._pending_job_dict[job_key] = job
+
+    async def _run_workers(self):
+        await asyncio.gather(*[self._work() for _ in range(self.worker_num)])
+
+    async def _work(self):
+        while True:
+            job_key = await self._queue.get()
+            job = self._pending_job_dict.pop(job_key)
+            returncode = None
+            try:
+                returncode = await self._run_job(job)
+            except Exception as e:
+                logging.error(f"Hook {job.script_path} failed: {e}")
+            finally:
+                self._queue.task_done()
+            if self.on_done:
+                self.on_done(job, returncode)
+
+    async def _run_job(self, job: HookJob):
+        with open(job.stdout, "a") as stdout_io, open(job.stderr, "a") as stderr_io:
+            process = await asyncio.create_subprocess_exec(
+                job.script_path,
+                *job.args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=stdout_io,
+                stderr=stderr_io,
+                cwd=str(Path(job.script_path).parent),
+                env=job.env
+                | {
+                    "JUSTSTART_RUNNER_PATH": job.runner_path,
+                    "JUSTSTART_RUNNER_STATUS": job.status_key,
+                },
+            )
+        try:
+            await asyncio.wait_for(process.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Hook {job.script_path} timed out, killing it")
+            process.kill()
+            await process.wait()
+        return process.returncode
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import os
+from dataclasses import replace
+from pathlib import Path
+
+from .env import get_env
+from .runner_config import ConfigTrace, RunnerConfig, _parse_args
+
+INSTANCE_SEPARATOR = "@"
+# replaced by the instance identifier in args and env values of the template
+INSTANCE_PLACEHOLDER = "%i"
+
+
+def split_instance_path(path: str) -> tuple[str, str or None]:
+    """Split /srv/worker/run@3 into (/srv/worker/run, 3)
+
+    A path is only an instance path if it does not exist itself, so scripts
+    with a separator in their name keep working, and if the instance is not
+    a glob pattern.
+    """
+    name = Path(path).name
+    if INSTANCE_SEPARATOR not in name or os.path.exists(path):
+        return path, None
+    template_name, _, instance = name.rpartition(INSTANCE_SEPARATOR)
+    if not template_name or not instance or any(c in instance for c in "*?["):
+        return path, None
+    return str(Path(path).with_name(template_name)), instance
+
+
+def get_instance_path(template_path: str, instance: str) -> str:
+    return f"{template_path}{INSTANCE_SEPARATOR}{instance}"
+
+
+def is_instance_of(path: str, template_path: str) -> bool:
+    return path.startswith(f"{template_path}{INSTANCE_SEPARATOR}")
+
+
+def _instance_sort_key(path: str) -> tuple[int, int, str]:
+    instance = path.rpartition(INSTANCE_SEPARATOR)[2]
+    return (0, int(instance), "") if instance.isdigit() else (1, 0, instance)
+
+
+def sort_instance_path_list(path_list: list[str]) -> list[str]:
+    """Sort instances numerically: run@2 before run@10"""
+    return sorted(path_list, key=_instance_sort_key)
+
+
+def _replace_placeholder(value, instance: str):
+    if isinstance(value, str):
+        return value.replace(INSTANCE_PLACEHOLDER, instance)
+    return value
+
+
+def _get_instance_std_path(path, template_std_dir: Path, instance: str):
+    # instances must not share the stdin and log of the template
+    if path and Path(path).parent == template_std_dir:
+        return (
+            template_std_dir.with_name(
+                f"{template_std_dir.name}{INSTANCE_SEPARATOR}{instance}"
+            )
+            / Path(path).name
+        )
+    return path
+
+
+def apply_instance_overlay(
+    base_config: RunnerConfig,
+    template_path: str,
+    instance: str,
+    template_std_dir: Path,
+    trace: ConfigTrace = None,
+) -> RunnerConfig:
+    """Build the config of an instance from the shared config of its template
+
+    The base config is not modified. %i in args and env values becomes the
+    instance, JUSTSTART_INSTANCE is set, and the overlay files
+    <name>@<instance>.args and <name>@<instance>.env next to the template
+    are applied on top.
+    """
+    config = replace(
+        base_config,
+        args=[_replace_placeholder(arg, instance) for arg in base_config.args],
+        env={
+            key: _replace_placeholder(value, instance)
+            for key, value in base_config.env.items()
+        }
+        | {"JUSTSTART_INSTANCE": instance},
+        stdin=_get_instance_std_path(base_config.stdin, template_std_dir, instance),
+        stdout=_get_instance_std_path(base_config.stdout, template_std_dir, instance),
+        stderr=_get_instance_std_path(base_config.stderr, template_std_dir, instance),
+    )
+    overlay_path = get_instance_path(template_path, instance)
+    args_path = f"{overlay_path}.args"
+    if os.path.isfile(args_path):
+        args = _parse_args(args_path)
+        config.update(
+            args=args,
+            env={},
+            auto_restart=config.auto_restart,
+            stdin=None,
+            stdout=None,
+            stderr=None,
+        )
+        if trace:
+            trace.add_fragment("instance", "args", args_path, args)
+    env_path = f"{overlay_path}.env"
+    if os.path.isfile(env_path):
+        config.env = get_env(config.env, env_path)
+        if trace:
+            trace.add_fragment("instance", "env", env_path, config.env)
+    return config
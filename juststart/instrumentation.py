@@ -0,0 +1,131 @@
+import asyncio
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from time import monotonic, perf_counter, sleep
+from types import SimpleNamespace
+
+from .status_histogram import DurationHistogram
+
+
+class InstrumentedThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that knows its queue depth and busy threads"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._busy_lock = threading.Lock()
+        self.busy_thread_num = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        @wraps(fn)
+        def run(*args, **kwargs):
+            with self._busy_lock:
+                self.busy_thread_num += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._busy_lock:
+                    self.busy_thread_num -= 1
+
+        return super().submit(run, *args, **kwargs)
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "max_workers": self._max_workers,
+            "threads": len(self._threads),
+            "busy_threads": self.busy_thread_num,
+            "queue_depth": self._work_queue.qsize(),
+        }
+
+
+class LoopLagSampler:
+    """Measure how late the event loop wakes up a sleeping coroutine"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float):
+        self.loop = loop
+        self.interval = interval
+        self.histogram = DurationHistogram(min_bound=0.0001, bucket_num=20)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        return asyncio.run_coroutine_threadsafe(self._sample(), self.loop)
+
+    async def _sample(self):
+        while True:
+            expected_time = self.loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(self.loop.time() - expected_time, 0.0)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.histogram.observe("loop_lag", lag)
+
+    def get_stats(self) -> dict[str, any]:
+        return {
+            "last": self.last_lag,
+            "max": self.max_lag,
+            "interval": self.interval,
+        } | self.histogram.to_dict().get("loop_lag", {})
+
+
+def instrument_rpc(obj, name: str, histogram: DurationHistogram) -> SimpleNamespace:
+    """Wrap the public methods of an object served by the manager server
+
+    The server exposes every public callable attribute, so the returned
+    namespace is served in place of obj and times every remote call.
+    """
+
+    def wrap(method_name: str, method):
+        key = f"{name}.{method_name}"
+
+        @wraps(method)
+        def timed_method(*args, **kwargs):
+            start_time = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.observe(key, perf_counter() - start_time)
+
+        return timed_method
+
+    method_dict = {}
+    for method_name in dir(obj):
+        if method_name.startswith("_"):
+            continue
+        method = getattr(obj, method_name)
+        if callable(method):
+            method_dict[method_name] = wrap(method_name, method)
+    return SimpleNamespace(**method_dict)
+
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def sample_profile(seconds: float, interval: float = 0.005) -> str:
+    """Sample the stacks of all threads, return them in folded stack format
+
+    Every line is "thread;outer frame;...;inner frame count", which
+    flamegraph.pl, speedscope and most flame graph tools read.
+    """
+    current_thread_id = threading.get_ident()
+    thread_name_dict = {}
+    stack_counter = Counter()
+    end_time = monotonic() + seconds
+    while monotonic() < end_time:
+        for thread in threading.enumerate():
+            thread_name_dict[thread.ident] = thread.name
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == current_thread_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_format_frame(frame))
+                frame = frame.f_back
+            stack.append(thread_name_dict.get(thread_id, str(thread_id)))
+            stack_counter[";".join(reversed(stack))] += 1
+        sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in stack_counter.items())
@@ -2,13 +2,20 @@ import argparse
 import logging
 import sys
 from pathlib import Path
+from time import localtime, strftime, time
 
 from .cli_utils import *
-from .daemon import Utils, connect_manager, get_objs, run_deamon
+from .daemon import RUNTIME_DIR_NAME, Utils, connect_manager, get_objs, run_deamon
 from .errors import BaseError
-from .path_utils import check_path_valid, filter_path_list, is_parent_dir
+from .fanout import load_inventory, parse_target, run_fanout
+from .history_db import EVENT_KIND_LIST, query_flapping, query_history
+from .instance import split_instance_path
+from .path_utils import check_path_valid
+from .runner_config import RESTART_STRATEGY_LIST
 from .runner_manager import RunnerManager
 from .runner_manager_config import RunnerManagerConfig
+from .status_snapshot import read_status_snapshot_dir
+from .utils import parse_duration
 
 output_json = False
 
@@ -19,7 +26,9 @@ def multi_path_command(
     runner_manager: RunnerManager,
     manager_config: RunnerManagerConfig,
     utils: Utils,
+    options: dict or None = None,
 ):
+    options = options or {}
     if not output_json:
         print_terminal(
             msg=f"Running command {command} for {path_list}", json_format=output_json
@@ -29,6 +38,11 @@ def multi_path_command(
             data={"command": command, "path_list": path_list},
             json_format=output_json,
         )
+    if command == "stop":
+        # the down scripts of all runners run at once
+        stop_result = runner_manager.stop_runner_list(
+            [get_absolute_path(path) for path in path_list]
+        )
     for path in path_list:
         if not output_json:
             print()
@@ -37,7 +51,14 @@ def multi_path_command(
             print_screen_divider()
         else:
             print_terminal(data={"path": path}, json_format=output_json)
-        single_path_command(command, path, runner_manager, manager_config, utils)
+        if command == "stop":
+            message = stop_result[get_absolute_path(path)]
+            if message != "ok":
+                logging.error(message)
+            continue
+        single_path_command(
+            command, path, runner_manager, manager_config, utils, options
+        )
 
 
 def single_path_command(
@@ -46,7 +67,9 @@ def single_path_command(
     runner_manager: RunnerManager,
     manager_config: RunnerManagerConfig,
     utils: Utils,
+    options: dict or None = None,
 ):
+    options = options or {}
     path = get_absolute_path(path)
     try:
         if command == "add":
@@ -60,13 +83,15 @@ def single_path_command(
         elif command == "start":
             runner_manager.start_runner(path)
         elif command == "restart":
-            runner_manager.restart_runner(path)
+            runner_manager.restart_runner(path, options.get("strategy"))
         elif command == "stop":
             runner_manager.stop_runner(path)
         elif command == "reload_config":
             runner_manager.reload_runner(path)
         elif command == "status":
-            pretty_print(utils.get_runner_status(path))
+            pretty_print(
+                utils.get_runner_status(path, history=options.get("history", False))
+            )
         else:
             print_terminal(msg=f"Unknown command {command}", json_format=output_json)
             raise SystemExit(1)
@@ -82,31 +107,176 @@ def single_path_command(
             logging.error(message)
 
 
+def get_path_list(paths: list[str], runner_manager: RunnerManager) -> list[str]:
+    """Expand the paths given on the command line to runner paths"""
+    if len(paths) > 1:
+        return runner_manager.select_runner_path_list(paths)
+    path = get_expanduser_path(paths[0])
+    if check_path_valid(split_instance_path(path)[0]):
+        return [path]
+    return runner_manager.select_runner_path_list([path])
+
+
 def run_command_for_runner(
     command: str,
     paths: list[str],
     runner_manager: RunnerManager,
     manager_config: RunnerManagerConfig,
     utils: Utils,
+    options: dict or None = None,
 ):
-    if len(paths) > 1:
-        all_path_list = runner_manager.get_runner_status_dict().keys()
-        path_list = [a for p in paths for a in all_path_list if is_parent_dir(p, a)]
-        multi_path_command(command, path_list, runner_manager, manager_config, utils)
-        return
-    path = get_expanduser_path(paths[0])
-    if check_path_valid(path):
-        single_path_command(command, path, runner_manager, manager_config, utils)
-    else:
-        all_path_list = runner_manager.get_runner_status_dict().keys()
-        path_list = filter_path_list(path, all_path_list)
+    path_list = get_path_list(paths, runner_manager)
+    if len(paths) == 1:
+        if path_list == [get_expanduser_path(paths[0])]:
+            single_path_command(
+                command, path_list[0], runner_manager, manager_config, utils, options
+            )
+            return
         if not path_list:
             print_terminal(
                 msg=f"No valid path specified for {command}",
                 json_format=output_json,
             )
             raise SystemExit(1)
-        multi_path_command(command, path_list, runner_manager, manager_config, utils)
+    multi_path_command(
+        command, path_list, runner_manager, manager_config, utils, options
+    )
+
+
+def fanout_command(
+    args,
+    runner_manager: RunnerManager,
+    manager_config: RunnerManagerConfig,
+    utils: Utils,
+):
+    """Run the command on one daemon of a fan-out and return its result"""
+    command = args.command
+    if command == "list":
+        return runner_manager.get_runner_status_dict()
+    if command == "stats":
+        return utils.get_instrumentation_stats()
+    if command == "gc":
+        return runner_manager.clean_runner()
+    if command == "shutdown":
+        utils.shutdown()
+        return "ok"
+    # paths are paths on the target host, they are not resolved locally
+    if command == "config":
+        return runner_manager.explain_runner_config(args.path)
+    if command == "scale":
+        return runner_manager.scale_runner(args.path, args.instance_num)
+    if command == "send":
+        return runner_manager.send_input_runner_list(
+            runner_manager.select_runner_path_list([args.path]), args.data
+        )
+    if command in ("add", "del"):
+        path_list = args.path
+    else:
+        path_list = runner_manager.select_runner_path_list(args.path)
+    if command == "restart" and args.rolling:
+        return runner_manager.rolling_restart(
+            path_list, args.batch_size, args.pause, args.strategy
+        )
+    if command == "stop":
+        return runner_manager.stop_runner_list(path_list)
+    if command == "freeze":
+        return runner_manager.freeze_runner_list(path_list)
+    if command == "thaw":
+        return runner_manager.thaw_runner_list(path_list)
+    operation_dict = {
+        "add": manager_config.add_runner,
+        "del": manager_config.delete_runner,
+        "enable": manager_config.enable_runner,
+        "disable": manager_config.disable_runner,
+        "start": runner_manager.start_runner,
+        "restart": lambda path: runner_manager.restart_runner(path, args.strategy),
+        "reload": runner_manager.reload_runner,
+        "status": lambda path: utils.get_runner_status(path, history=args.history),
+    }
+    if command not in operation_dict:
+        raise BaseError(f"{command} is not supported with --target", "error")
+    result = {}
+    for path in path_list:
+        try:
+            value = operation_dict[command](path)
+            result[path] = value if command == "status" else "ok"
+        except BaseError as e:
+            result[path] = e.message
+    return result
+
+
+def get_send_data(args) -> bytes:
+    """Data of send, read once before it is sent to every runner"""
+    if args.data == "-":
+        return sys.stdin.buffer.read()
+    data = args.data.encode()
+    return data if args.no_newline else data + b"\n"
+
+
+def history_command(args, config_path: str, json_format: bool):
+    """Query the history database of the daemon, without RPC"""
+    since = time() - parse_duration(args.since) if args.since else None
+    if args.flapping:
+        result = query_flapping(config_path, since or time() - 86400, args.limit)
+        if json_format:
+            print_terminal(data=result, json_format=json_format)
+        else:
+            for row in result:
+                print(f"{row['exits']:>6} {row['path']}")
+        return
+    path = get_absolute_path(get_expanduser_path(args.path)) if args.path else None
+    result = query_history(config_path, path, since, args.kind, args.limit)
+    if json_format:
+        print(dumps(result))
+        return
+    for row in result:
+        field_list = [
+            strftime("%Y-%m-%d %H:%M:%S", localtime(row["time"])),
+            row["path"],
+            row["kind"],
+        ]
+        if row["pid"] is not None:
+            field_list.append(f"pid={row['pid']}")
+        if row["returncode"] is not None:
+            field_list.append(f"returncode={row['returncode']}")
+        if row["signal"] is not None:
+            field_list.append(f"signal={row['signal']}")
+        if row["detail"]:
+            field_list.append(row["detail"])
+        print(" ".join(field_list))
+
+
+def read_snapshot_command(args, config_path: str, json_format: bool) -> bool:
+    """Answer list and status from the status snapshot, without RPC
+
+    Return False if the command needs the daemon or there is no live snapshot.
+    """
+    is_list = args.command == "list" and not args.histogram
+    is_status = args.command == "status" and not args.history and len(args.path) == 1
+    if not (is_list or is_status):
+        return False
+    snapshot = read_status_snapshot_dir(str(Path(config_path) / RUNTIME_DIR_NAME))
+    if snapshot is None:
+        return False
+    row_dict = snapshot["runners"]
+    if is_list:
+        status_dict = {path: row_dict[path]["status"] for path in sorted(row_dict)}
+        if json_format:
+            print_terminal(data=status_dict, json_format=json_format)
+        else:
+            print_terminal(
+                msg=runner_status_dict_to_str(
+                    status_dict,
+                    {path: row["broken"] for path, row in row_dict.items()},
+                )
+            )
+        return True
+    row = row_dict.get(get_absolute_path(get_expanduser_path(args.path[0])))
+    if row is None or row["runner"] is None:
+        # not in memory, let the daemon report the error
+        return False
+    pretty_print(row["runner"])
+    return True
 
 
 def main():
@@ -143,6 +313,31 @@ def main():
         type=str,
         help="Path to config file",
     )
+    # juststart --target <host:port> --target <host:port> <command>
+    parser.add_argument(
+        "--target",
+        "-t",
+        action="append",
+        help="Run the command on this daemon, may be repeated",
+    )
+    parser.add_argument(
+        "--inventory",
+        "-i",
+        type=str,
+        help="File of daemons to run the command on, one host:port per line",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=16,
+        help="Daemons connected at a time with --target or --inventory",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=30,
+        help="Seconds to wait for a daemon with --target or --inventory",
+    )
     parser.add_argument(
         "--json",
         action=argparse.BooleanOptionalAction,
@@ -186,6 +381,41 @@ def main():
     restart_parser.add_argument(
         "path", nargs="+", help="One or multiple paths for services"
     )
+    restart_parser.add_argument(
+        "--strategy",
+        choices=RESTART_STRATEGY_LIST,
+        help="start_stop stops the old process once the new one is ready",
+    )
+    restart_parser.add_argument(
+        "--rolling",
+        action="store_true",
+        help="Restart batch by batch, waiting for each batch to be ready",
+    )
+    restart_parser.add_argument(
+        "--batch-size", type=int, default=1, help="Services restarted at a time"
+    )
+    restart_parser.add_argument(
+        "--pause", type=float, default=0, help="Seconds to wait between two batches"
+    )
+
+    # juststart scale <path> <instance_num>
+    scale_parser = subparsers.add_parser(
+        "scale", help="Run instances path@1 to path@N of a service template"
+    )
+    scale_parser.add_argument("path", help="Path of the service template")
+    scale_parser.add_argument("instance_num", type=int, help="Number of instances")
+
+    # juststart send <path> [data]
+    send_parser = subparsers.add_parser(
+        "send", help="Write to the stdin pipe of services, see stdin_pipe"
+    )
+    send_parser.add_argument("path", help="Path or selector of the services")
+    send_parser.add_argument(
+        "data", nargs="?", default="-", help="Line to send, - sends stdin as is"
+    )
+    send_parser.add_argument(
+        "--no-newline", action="store_true", help="Do not end the line with a newline"
+    )
 
     # juststart stop <path>
     stop_parser = subparsers.add_parser("stop", help="Stop a service")
@@ -193,6 +423,20 @@ def main():
         "path", nargs="+", help="One or multiple paths for services"
     )
 
+    # juststart freeze/thaw <path>
+    freeze_parser = subparsers.add_parser(
+        "freeze", help="Pause services with SIGSTOP, keeping their state"
+    )
+    freeze_parser.add_argument(
+        "path", nargs="+", help="One or multiple paths or selectors for services"
+    )
+    thaw_parser = subparsers.add_parser(
+        "thaw", help="Continue frozen services with SIGCONT"
+    )
+    thaw_parser.add_argument(
+        "path", nargs="+", help="One or multiple paths or selectors for services"
+    )
+
     # juststart reload_config <path>
     reload_config_parser = subparsers.add_parser(
         "reload", help="Reload config for a service"
@@ -204,14 +448,69 @@ def main():
     # juststart status <path>
     status_parser = subparsers.add_parser("status", help="Status of a service")
     status_parser.add_argument("path", nargs="+", help="One or multiple paths")
+    status_parser.add_argument(
+        "--history",
+        action="store_true",
+        help="Show the latest status transitions",
+    )
 
     # juststart list
     status_parser = subparsers.add_parser("list", help="List all services")
+    status_parser.add_argument(
+        "--histogram",
+        action="store_true",
+        help="Show the time all services spent in each status",
+    )
+    # juststart history
+    history_parser = subparsers.add_parser(
+        "history", help="Lifecycle events of services, from the history database"
+    )
+    history_parser.add_argument(
+        "--path", help="Events of the service at path, or of the services below it"
+    )
+    history_parser.add_argument(
+        "--since", help="Events of the last duration, e.g. 30m, 2h, 7d"
+    )
+    history_parser.add_argument("--kind", choices=EVENT_KIND_LIST)
+    history_parser.add_argument(
+        "--limit", type=int, default=100, help="Latest events or services shown"
+    )
+    history_parser.add_argument(
+        "--flapping",
+        action="store_true",
+        help="Services with the most exits since --since (default 1d)",
+    )
     # juststart gc
     status_parser = subparsers.add_parser(
         "gc", help="Garbage collect for stoped services"
     )
 
+    # juststart config explain <path>
+    config_parser = subparsers.add_parser("config", help="Inspect runner configs")
+    config_subparsers = config_parser.add_subparsers(
+        dest="config_command", help="Available config commands"
+    )
+    config_explain_parser = config_subparsers.add_parser(
+        "explain", help="Show how the config of a service is resolved"
+    )
+    config_explain_parser.add_argument("path", help="Path of the service")
+
+    # juststart stats
+    subparsers.add_parser(
+        "stats", help="Event loop, executor and RPC statistics of the daemon"
+    )
+
+    # juststart profile --seconds <seconds>
+    profile_parser = subparsers.add_parser(
+        "profile", help="Sample the daemon stacks in folded stack format"
+    )
+    profile_parser.add_argument(
+        "--seconds", type=float, default=10, help="Seconds to sample"
+    )
+    profile_parser.add_argument(
+        "--output", "-o", type=str, help="Output file, print to stdout if not set"
+    )
+
     # juststart shutdown
     status_parser = subparsers.add_parser("shutdown", help="Shutdown Daemon")
 
@@ -236,8 +535,10 @@ def main():
         else:
             return config_path
 
-    password = args.password
-    if password is None:
+    is_fanout = bool(args.target or args.inventory)
+    password = args.password.encode() if args.password else None
+    # the inventory may name the password of every daemon
+    if password is None and not (is_fanout and not args.config):
         config_path = get_config_path()
         if not config_path:
             print_terminal(
@@ -248,12 +549,43 @@ def main():
         password = get_password_from_config_path(config_path)
 
     command = args.command
-    if command:
+    if command == "send":
+        args.data = get_send_data(args)
+    if command and is_fanout:
+        if command in ("serve", "profile", "history"):
+            print_terminal(
+                msg=f"{command} does not support --target", json_format=output_json
+            )
+            raise SystemExit(1)
+        target_list = [parse_target(target, password) for target in args.target or []]
+        if args.inventory:
+            target_list += load_inventory(args.inventory, password)
+        result_dict = run_fanout(
+            target_list,
+            lambda *objs: fanout_command(args, *objs),
+            args.parallel,
+            args.timeout,
+        )
+        if output_json:
+            print(dumps(result_dict, default=str))
+        else:
+            print(fanout_result_to_str(command, result_dict))
+        if any("error" in target_result for target_result in result_dict.values()):
+            raise SystemExit(1)
+    elif command:
         if command == "serve":
             config_path = get_config_path()
             if config_path:
                 run_deamon(args.address, args.port, password, config_path)
                 return
+        if command == "history":
+            config_path = get_config_path()
+            if not config_path:
+                raise SystemExit(1)
+            history_command(args, config_path, output_json)
+            return
+        if args.config and read_snapshot_command(args, args.config, output_json):
+            return
 
         share_manager = connect_manager(
             address=args.address, port=args.port, password=password
@@ -264,6 +596,72 @@ def main():
         uitls: Utils
         if command == "shutdown":
             utils.shutdown()
+        elif command == "config":
+            if args.config_command != "explain":
+                config_parser.print_help()
+                raise SystemExit(1)
+            explain_dict = runner_manager.explain_runner_config(
+                get_absolute_path(get_expanduser_path(args.path))
+            )
+            print_terminal(data=explain_dict, json_format=output_json)
+        elif command == "scale":
+            scale_dict = runner_manager.scale_runner(
+                get_absolute_path(get_expanduser_path(args.path)), args.instance_num
+            )
+            print_terminal(data=scale_dict, json_format=output_json)
+        elif command == "restart" and args.rolling:
+            path_list = [
+                get_absolute_path(path)
+                for path in get_path_list(args.path, runner_manager)
+            ]
+            result = runner_manager.rolling_restart(
+                path_list, args.batch_size, args.pause, args.strategy
+            )
+            print_terminal(data=result, json_format=output_json)
+            if result["failed"]:
+                raise SystemExit(1)
+        elif command == "send":
+            path_list = [
+                get_absolute_path(path)
+                for path in get_path_list([args.path], runner_manager)
+            ]
+            if not path_list:
+                print_terminal(
+                    msg=f"No valid path specified for {command}",
+                    json_format=output_json,
+                )
+                raise SystemExit(1)
+            result = runner_manager.send_input_runner_list(path_list, args.data)
+            print_terminal(data=result, json_format=output_json)
+            if any(isinstance(value, str) for value in result.values()):
+                raise SystemExit(1)
+        elif command in ("freeze", "thaw"):
+            path_list = [
+                get_absolute_path(path)
+                for path in get_path_list(args.path, runner_manager)
+            ]
+            if command == "freeze":
+                result = runner_manager.freeze_runner_list(path_list)
+            else:
+                result = runner_manager.thaw_runner_list(path_list)
+            print_terminal(data=result, json_format=output_json)
+            if any(value != "ok" for value in result.values()):
+                raise SystemExit(1)
+        elif command == "stats":
+            print_terminal(
+                data=utils.get_instrumentation_stats(), json_format=output_json
+            )
+        elif command == "profile":
+            folded_stacks = utils.profile(args.seconds)
+            if args.output:
+                Path(args.output).write_text(folded_stacks)
+                print_terminal(
+                    msg=f"Profile saved to {args.output}", json_format=output_json
+                )
+            else:
+                print(folded_stacks, end="")
+        elif command == "list" and args.histogram:
+            print_terminal(data=utils.get_status_histogram(), json_format=output_json)
         elif command == "list":
             status_dict = runner_manager.get_runner_status_dict()
             if output_json:
@@ -275,14 +673,15 @@ def main():
             if output_json:
                 print_terminal(data=path_list, json_format=output_json)
             else:
-                print_terminal(
-                    msg="\n".join(runner_manager.clean_runner()),
-                    json_format=output_json,
-                )
+                print_terminal(msg="\n".join(path_list), json_format=output_json)
         else:
             paths = args.path
+            options = {
+                "history": getattr(args, "history", False),
+                "strategy": getattr(args, "strategy", None),
+            }
             run_command_for_runner(
-                command, paths, runner_manager, manager_config, utils
+                command, paths, runner_manager, manager_config, utils, options
             )
     else:
         parser.print_help()
@@ -0,0 +1,279 @@
+"""Single file runner configs, an alternative to scanning config fragments
+
+A manifest is a JSON file:
+
+{
+    "default": {"env": {"LANG": "C.UTF-8"}, "env_inherit": ["PATH"]},
+    "runners": {
+        "/srv/web/run": {"args": ["--port", "80"], "auto_restart": -1},
+        "worker/run": {"max_rss": "512M", "stdout": "/var/log/worker.log"}
+    }
+}
+
+Relative runner paths are relative to the manifest directory. The default
+block and then the runner block are applied on the built-in default config
+with the same inheritance rules as config fragments (RunnerConfig.update).
+
+A block can list the status hook scripts of its runners by status key,
+"hooks": {"stopped": ["notify"]}; the runner block wins per status key. The
+hooks of a runner declared in a manifest are never searched on disk.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from contextlib import nullcontext
+from pathlib import Path
+
+from .admission import PRIORITY_CLASS_LIST
+from .errors import RunnerConfigError
+from .runner_config import (
+    RESTART_STRATEGY_LIST,
+    ConfigTrace,
+    RunnerConfig,
+    get_default_config,
+)
+from .probe import check_probe
+from .runner_status import STATUS_KEY_LIST
+from .timer import check_schedule
+from .utils import parse_duration, parse_size
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+def _is_str_list(value) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def _is_str_dict(value) -> bool:
+    return isinstance(value, dict) and all(
+        isinstance(key, str) and isinstance(item, str) for key, item in value.items()
+    )
+
+
+def _is_optional_str(value) -> bool:
+    return value is None or isinstance(value, str)
+
+
+def _is_hook_table(value) -> bool:
+    return isinstance(value, dict) and all(
+        key in STATUS_KEY_LIST and _is_str_list(item) for key, item in value.items()
+    )
+
+
+_block_checker_dict = {
+    "args": _is_str_list,
+    "env": _is_str_dict,
+    "env_inherit": _is_str_list,
+    "auto_restart": lambda value: isinstance(value, int),
+    "stdin": _is_optional_str,
+    "stdout": _is_optional_str,
+    "stderr": _is_optional_str,
+    "max_rss": lambda value: value is None or isinstance(value, (int, str)),
+    "max_cpu_time": lambda value: value is None or isinstance(value, (int, float)),
+    "schedule": _is_optional_str,
+    "jitter": lambda value: value is None or isinstance(value, (int, float, str)),
+    "skip_if_running": lambda value: isinstance(value, bool),
+    "restart_strategy": lambda value: value in RESTART_STRATEGY_LIST,
+    "ready_timeout": lambda value: isinstance(value, (int, float)),
+    "probe": _is_optional_str,
+    "probe_interval": lambda value: isinstance(value, (int, float)) and value > 0,
+    "probe_timeout": lambda value: isinstance(value, (int, float)) and value > 0,
+    "probe_failure_threshold": lambda value: isinstance(value, int) and value > 0,
+    "stdin_pipe": lambda value: isinstance(value, bool),
+    "down_timeout": lambda value: isinstance(value, (int, float)) and value > 0,
+    "priority_class": lambda value: value in PRIORITY_CLASS_LIST,
+    "hooks": _is_hook_table,
+}
+
+
+def _validate_block(block: dict, where: str, base_path: Path) -> dict[str, any]:
+    if not isinstance(block, dict):
+        raise RunnerConfigError(f"{where} must be an object")
+    for key, value in block.items():
+        checker = _block_checker_dict.get(key)
+        if checker is None:
+            raise RunnerConfigError(f"{where} has unknown key {key}")
+        if not checker(value):
+            raise RunnerConfigError(f"{where} has invalid value for {key}: {value}")
+    block = dict(block)
+    if isinstance(block.get("max_rss"), str):
+        try:
+            block["max_rss"] = parse_size(block["max_rss"])
+        except ValueError:
+            raise RunnerConfigError(f"{where} has invalid max_rss {block['max_rss']}")
+    if isinstance(block.get("jitter"), str):
+        try:
+            block["jitter"] = parse_duration(block["jitter"])
+        except ValueError:
+            raise RunnerConfigError(f"{where} has invalid jitter {block['jitter']}")
+    if block.get("schedule"):
+        try:
+            block["schedule"] = check_schedule(block["schedule"])
+        except ValueError as e:
+            raise RunnerConfigError(f"{where} has invalid schedule: {e}")
+    if block.get("probe"):
+        try:
+            block["probe"] = check_probe(block["probe"])
+        except ValueError as e:
+            raise RunnerConfigError(f"{where} has invalid probe: {e}")
+    if "hooks" in block:
+        block["hooks"] = {
+            status_key: [
+                os.path.normpath(base_path / script_path)
+                for script_path in script_path_list
+            ]
+            for status_key, script_path_list in block["hooks"].items()
+        }
+    return block
+
+
+class Manifest:
+    def __init__(self, path: str, default: dict, runner_dict: dict[str, dict]):
+        self.path = path
+        self.default = default
+        self.runner_dict = runner_dict
+
+    @classmethod
+    def load(cls, path: str) -> Manifest:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise RunnerConfigError(f"Manifest {path} is not valid JSON: {e}")
+        if not isinstance(data, dict):
+            raise RunnerConfigError(f"Manifest {path} must be an object")
+        unknown_key_list = set(data) - {"default", "runners"}
+        if unknown_key_list:
+            raise RunnerConfigError(
+                f"Manifest {path} has unknown keys {sorted(unknown_key_list)}"
+            )
+        base_path = Path(path).parent
+        default = _validate_block(
+            data.get("default", {}), f"{path}: default", base_path
+        )
+        runners = data.get("runners", {})
+        if not isinstance(runners, dict):
+            raise RunnerConfigError(f"Manifest {path}: runners must be an object")
+        runner_dict = {}
+        for runner_path, block in runners.items():
+            abs_runner_path = os.path.normpath(base_path / runner_path)
+            runner_dict[abs_runner_path] = _validate_block(
+                block, f"{path}: runners.{runner_path}", base_path
+            )
+        return cls(path, default, runner_dict)
+
+
+_setting_key_list = [
+    "max_rss",
+    "max_cpu_time",
+    "schedule",
+    "jitter",
+    "skip_if_running",
+    "restart_strategy",
+    "ready_timeout",
+    "probe",
+    "probe_interval",
+    "probe_timeout",
+    "probe_failure_threshold",
+    "stdin_pipe",
+    "down_timeout",
+    "priority_class",
+]
+
+
+def _apply_block(
+    config: RunnerConfig, block: dict[str, any], base_env: dict[str, str]
+) -> RunnerConfig:
+    env = {}
+    for key in block.get("env_inherit", []):
+        if key == "*":
+            env |= base_env
+        elif key in base_env:
+            env[key] = base_env[key]
+    env |= block.get("env", {})
+    settings = {key: block[key] for key in _setting_key_list if key in block}
+    return config.update(
+        args=list(block.get("args", [])),
+        env=env,
+        auto_restart=block.get("auto_restart", config.auto_restart),
+        stdin=block.get("stdin"),
+        stdout=block.get("stdout"),
+        stderr=block.get("stderr"),
+        **settings,
+    )
+
+
+class ManifestStore:
+    """Cache manifests by file and resolve runner configs from them
+
+    A manifest is read again only when its modification time changes.
+    The manifest in the runner directory wins over the host manifest.
+    """
+
+    def __init__(self, host_manifest_path: str = None):
+        self.host_manifest_path = host_manifest_path
+        self._manifest_dict: dict[str, tuple[int, Manifest or None]] = {}
+
+    def _get_manifest(self, path: str) -> Manifest or None:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._manifest_dict.pop(path, None)
+            return None
+        cached = self._manifest_dict.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        manifest = Manifest.load(path)
+        self._manifest_dict[path] = (mtime, manifest)
+        return manifest
+
+    def find_manifest(self, runner_path: str) -> Manifest or None:
+        runner_path = os.path.normpath(runner_path)
+        manifest_path_list = [str(Path(runner_path).parent / MANIFEST_FILE_NAME)]
+        if self.host_manifest_path:
+            manifest_path_list.append(self.host_manifest_path)
+        for manifest_path in manifest_path_list:
+            manifest = self._get_manifest(manifest_path)
+            if manifest and runner_path in manifest.runner_dict:
+                return manifest
+        return None
+
+    def get_runner_config(
+        self,
+        runner_path: str,
+        work_path: str,
+        tmp_dir_path: str,
+        trace: ConfigTrace = None,
+    ) -> RunnerConfig or None:
+        """Resolve the config of a runner, None if no manifest declares it"""
+        timing = trace.timing if trace else lambda phase: nullcontext()
+        with timing("search"):
+            manifest = self.find_manifest(runner_path)
+        if manifest is None:
+            return None
+        work_path = Path(work_path)
+        config = get_default_config(
+            work_path, std_path=Path(f"{tmp_dir_path}/{work_path}") / "std"
+        )
+        base_env = dict(os.environ)
+        block_list = [
+            ("default", manifest.default),
+            ("runner", manifest.runner_dict[os.path.normpath(runner_path)]),
+        ]
+        for kind, block in block_list:
+            with timing("merge"):
+                config = _apply_block(config, block, base_env)
+            if trace:
+                trace.add_fragment("manifest", kind, manifest.path, block)
+        return config
+
+    def get_hook_table(self, runner_path: str) -> dict[str, list[str]] or None:
+        """The hook scripts of a runner by status key, None if no manifest
+        declares it"""
+        manifest = self.find_manifest(runner_path)
+        if manifest is None:
+            return None
+        block = manifest.runner_dict[os.path.normpath(runner_path)]
+        return manifest.default.get("hooks", {}) | block.get("hooks", {})
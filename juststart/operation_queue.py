@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+from collections import deque
+from concurrent.futures import Future
+from itertools import count
+from typing import Awaitable, Callable
+
+from .errors import RunnerManagerError
+
+# commands of the command line and embedding applications
+PRIORITY_INTERACTIVE = 0
+# automatic recovery: timers, probe and watchdog restarts
+PRIORITY_BACKGROUND = 1
+# work on many runners at once: boot, shutdown, rolling restarts, scaling
+PRIORITY_BULK = 2
+
+
+class Operation:
+    __slots__ = ("path", "func", "key", "priority", "seq", "future")
+
+    def __init__(
+        self,
+        path: str,
+        func: Callable[[], Awaitable],
+        key,
+        priority: int,
+        seq: int,
+        future: asyncio.Future,
+    ):
+        self.path = path
+        self.func = func
+        self.key = key
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+
+
+class OperationQueue:
+    """Run the lifecycle operations of runners on the manager loop, one at a
+    time per runner
+
+    An operation is a coroutine function, called when its turn comes.
+    Operations of a runner run in submission order, and at most worker_num
+    operations of different runners run at a time, lower priority first. An
+    operation waiting behind a higher priority one of the same runner
+    inherits its priority.
+
+    An operation with the same key as the last waiting operation of its
+    runner is coalesced: both callers get the future of the waiting one, so
+    ten restarts in a row run once. Operations without a key never are.
+
+    An operation submitted from an operation of the same runner runs at once
+    in a task of its own, as the runner is already serialized by the outer
+    one and would wait for it forever. Operations of other runners are queued.
+
+    submit must be called on the loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, worker_num: int):
+        self.loop = loop
+        self.worker_num = max(1, worker_num)
+        # waiting operations of every runner, the first one is next to run
+        self._path_queue_dict: dict[str, deque[Operation]] = {}
+        self._running_path_set: set[str] = set()
+        # (priority, seq, path) of the first operation of runners not running
+        self._ready_heap: list[tuple[int, int, str]] = []
+        self._seq_counter = count()
+        # futures of the idle workers, set to wake them up
+        self._waiter_list: deque[asyncio.Future] = deque()
+        # runner path of the operation run by a task, see submit
+        self._task_path_dict: dict[asyncio.Task, str] = {}
+        self._worker_future: Future = None
+        self._stopped = False
+        self.submitted_num = 0
+        self.coalesced_num = 0
+
+    def start(self) -> Future:
+        self._worker_future = asyncio.run_coroutine_threadsafe(
+            self._run_workers(), self.loop
+        )
+        return self._worker_future
+
+    def submit(
+        self,
+        path: str,
+        func: Callable[[], Awaitable],
+        key=None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> asyncio.Future:
+        """Queue func() as an operation on the runner at path"""
+        if self._task_path_dict.get(asyncio.current_task()) == path:
+            return self._run_inline(path, func)
+        if self._stopped:
+            future = self.loop.create_future()
+            future.set_exception(RunnerManagerError("The manager is stopped"))
+            return future
+        self.submitted_num += 1
+        path_queue = self._path_queue_dict.setdefault(path, deque())
+        if path_queue and key is not None and path_queue[-1].key == key:
+            self.coalesced_num += 1
+            operation = path_queue[-1]
+        else:
+            operation = Operation(
+                path,
+                func,
+                key,
+                priority,
+                next(self._seq_counter),
+                self.loop.create_future(),
+            )
+            path_queue.append(operation)
+        head = path_queue[0]
+        if priority < head.priority or head is operation:
+            head.priority = min(head.priority, priority)
+            if path not in self._running_path_set:
+                self._push_ready(head)
+        return operation.future
+
+    def _run_inline(self, path: str, func: Callable[[], Awaitable]) -> asyncio.Task:
+        task = self.loop.create_task(func())
+        self._task_path_dict[task] = path
+        task.add_done_callback(self._task_path_dict.pop)
+        return task
+
+    def _wake(self, all_workers: bool = False):
+        while self._waiter_list:
+            waiter = self._waiter_list.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                if not all_workers:
+                    return
+
+    def _push_ready(self, operation: Operation):
+        # outdated entries of the runner are skipped by _pop_ready
+        heapq.heappush(
+            self._ready_heap, (operation.priority, operation.seq, operation.path)
+        )
+        self._wake()
+
+    def _pop_ready(self) -> Operation or None:
+        while self._ready_heap:
+            priority, seq, path = heapq.heappop(self._ready_heap)
+            path_queue = self._path_queue_dict.get(path)
+            if (
+                path in self._running_path_set
+                or not path_queue
+                or path_queue[0].seq != seq
+                or path_queue[0].priority != priority
+            ):
+                continue
+            self._running_path_set.add(path)
+            return path_queue.popleft()
+        return None
+
+    async def _run_workers(self):
+        await asyncio.gather(*[self._work() for _ in range(self.worker_num)])
+
+    async def _work(self):
+        while True:
+            operation = self._pop_ready()
+            while operation is None:
+                if self._stopped and not self._path_queue_dict:
+                    return
+                waiter = self.loop.create_future()
+                self._waiter_list.append(waiter)
+                await waiter
+                operation = self._pop_ready()
+            try:
+                if not operation.future.done():
+                    await self._run(operation)
+            finally:
+                self._finish(operation.path)
+
+    async def _run(self, operation: Operation):
+        task = asyncio.current_task()
+        self._task_path_dict[task] = operation.path
+        try:
+            result = await operation.func()
+        except asyncio.CancelledError:
+            operation.future.cancel()
+            raise
+        except BaseException as e:
+            if not operation.future.done():
+                operation.future.set_exception(e)
+        else:
+            if not operation.future.done():
+                operation.future.set_result(result)
+        finally:
+            del self._task_path_dict[task]
+
+    def _finish(self, path: str):
+        self._running_path_set.discard(path)
+        path_queue = self._path_queue_dict[path]
+        if path_queue:
+            self._push_ready(path_queue[0])
+        else:
+            del self._path_queue_dict[path]
+            if self._stopped and not self._path_queue_dict:
+                self._wake(all_workers=True)
+
+    async def shutdown(self):
+        """Run the waiting operations, then stop the workers"""
+        self._stopped = True
+        self._wake(all_workers=True)
+        if self._worker_future is not None:
+            await asyncio.wrap_future(self._worker_future)
+
+    def get_stats(self) -> dict[str, int]:
+        # read from other threads, the queues change meanwhile
+        return {
+            "workers": self.worker_num,
+            "running": len(self._running_path_set),
+            "waiting": sum(map(len, list(self._path_queue_dict.values()))),
+            "submitted": self.submitted_num,
+            "coalesced": self.coalesced_num,
+        }
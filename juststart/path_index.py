@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import re
+from fnmatch import translate
+from functools import lru_cache
+from pathlib import Path
+
+_GLOB_CHAR_LIST = "*?["
+
+
+@lru_cache(maxsize=256)
+def _compile_glob(pattern: str) -> re.Pattern:
+    return re.compile(translate(pattern))
+
+
+def _has_glob(pattern: str) -> bool:
+    return any(c in pattern for c in _GLOB_CHAR_LIST)
+
+
+class _Node:
+    __slots__ = ("name", "parent", "children", "path")
+
+    def __init__(self, name: str, parent: _Node = None):
+        self.name = name
+        self.parent = parent
+        self.children: dict[str, _Node] = {}
+        # set if a runner path ends at this node
+        self.path: str = None
+
+
+class PathIndex:
+    """Index runner paths for the selectors of the command line
+
+    Paths are stored in a trie of their components, and every trie node is
+    indexed by its name, so a selector only walks the paths it returns:
+
+    - a directory selects every path below it (is_parent_dir)
+    - a name selects every path with a component of that name
+    - a glob is only matched against the subtree of its literal prefix
+    - a substring is the last resort and scans all paths
+    """
+
+    def __init__(self, path_list: list[str] = ()):
+        self._root = _Node("")
+        self._name_dict: dict[str, set[_Node]] = {}
+        self._path_set: set[str] = set()
+        for path in path_list:
+            self.add(path)
+
+    def __len__(self) -> int:
+        return len(self._path_set)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._path_set
+
+    def add(self, path: str):
+        if path in self._path_set:
+            return
+        node = self._root
+        for name in Path(path).parts:
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[name] = _Node(name, node)
+                # the root "/" is not a name, as Path("/").name is empty
+                if node is not self._root:
+                    self._name_dict.setdefault(name, set()).add(child)
+            node = child
+        node.path = path
+        self._path_set.add(path)
+
+    def remove(self, path: str):
+        if path not in self._path_set:
+            return
+        self._path_set.remove(path)
+        node = self._find_node(path)
+        node.path = None
+        # prune the branch that no longer leads to a path
+        while node is not self._root and not node.children and node.path is None:
+            del node.parent.children[node.name]
+            node_set = self._name_dict.get(node.name)
+            if node_set is not None:
+                node_set.discard(node)
+                if not node_set:
+                    del self._name_dict[node.name]
+            node = node.parent
+
+    def _find_node(self, path: str) -> _Node or None:
+        node = self._root
+        for name in Path(path).parts:
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def _collect(node: _Node, path_list: list[str]):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.path is not None:
+                path_list.append(node.path)
+            stack.extend(node.children.values())
+
+    def select_children(self, parent_path: str) -> list[str]:
+        """Paths equal to or below parent_path"""
+        path_list = []
+        node = self._find_node(parent_path)
+        if node is not None:
+            self._collect(node, path_list)
+        return sorted(path_list)
+
+    def select_name(self, name: str) -> list[str]:
+        """Paths with a component named name"""
+        path_set = set()
+        for node in self._name_dict.get(name, ()):
+            path_list = []
+            self._collect(node, path_list)
+            path_set.update(path_list)
+        return sorted(path_set)
+
+    def select_glob(self, pattern: str) -> list[str]:
+        regex = _compile_glob(pattern)
+        literal_prefix = re.split(r"[*?\[]", pattern, 1)[0]
+        if literal_prefix.startswith("/"):
+            # a match starts with the prefix, so search below its directory
+            path_list = self.select_children(
+                literal_prefix[: literal_prefix.rfind("/") + 1]
+            )
+        else:
+            path_list = self._path_set
+        return sorted(path for path in path_list if regex.match(path))
+
+    def select_substring(self, value: str) -> list[str]:
+        if _has_glob(value):
+            return self.select_glob(f"*{value}*")
+        return sorted(path for path in self._path_set if value in path)
+
+    def select(self, selector: str) -> list[str]:
+        """Name, then glob, then substring, as filter_path_list"""
+        return (
+            self.select_name(selector)
+            or self.select_glob(selector)
+            or self.select_substring(selector)
+        )
@@ -89,7 +89,7 @@ def _search_file_by_keywords(
         matching_files = [file for file in path.glob(pattern) if file != path]
         if dir_regex_pattern:
             matching_files = [
-                file for file in matching_files if re.match(regex_pattern, str(file))
+                file for file in matching_files if re.match(dir_regex_pattern, str(file))
             ]
         for file in matching_files:
             result[keyword].extend(add_files_recursively(file, file_regex_pattern))
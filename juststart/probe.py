@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from time import time
+from typing import Callable
+from urllib.parse import urlsplit
+
+from .runner import Runner
+from .timer import IntervalSchedule, TimerHeap
+
+EXEC = "exec"
+TCP = "tcp"
+HTTP = "http"
+
+
+@dataclass
+class Probe:
+    kind: str
+    # script path of exec probes, host of tcp and http probes
+    target: str
+    port: int = None
+    url_path: str = "/"
+
+    def __str__(self):
+        if self.kind == EXEC:
+            return f"{EXEC}:{self.target}"
+        if self.kind == TCP:
+            return f"{TCP}:{self.target}:{self.port}"
+        return f"{HTTP}://{self.target}:{self.port}{self.url_path}"
+
+
+def parse_probe(value: str) -> Probe:
+    """Parse exec:<script>, tcp:[host:]port or http://host[:port]/path"""
+    value = value.strip()
+    kind, _, target = value.partition(":")
+    if kind == EXEC and target:
+        return Probe(EXEC, target)
+    if kind == TCP and target:
+        host, _, port = target.rpartition(":")
+        return Probe(TCP, host or "127.0.0.1", int(port))
+    if kind == HTTP:
+        url = urlsplit(value)
+        return Probe(HTTP, url.hostname or "127.0.0.1", url.port or 80, url.path or "/")
+    raise ValueError(f"Unknown probe {value}")
+
+
+def check_probe(value: str) -> str:
+    parse_probe(value)
+    return value.strip()
+
+
+async def _run_exec_probe(probe: Probe, runner: Runner):
+    script_path = Path(runner.template_path).parent / probe.target
+    process = await asyncio.create_subprocess_exec(
+        str(script_path),
+        *runner.args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+        cwd=str(script_path.parent),
+        env=runner.env,
+    )
+    try:
+        returncode = await process.wait()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    if returncode != 0:
+        raise RuntimeError(f"exit code {returncode}")
+
+
+async def _run_http_probe(probe: Probe):
+    reader, writer = await asyncio.open_connection(probe.target, probe.port)
+    try:
+        writer.write(
+            f"GET {probe.url_path} HTTP/1.0\r\nHost: {probe.target}\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status_line = (await reader.readline()).decode(errors="replace").split()
+    finally:
+        writer.close()
+    if len(status_line) < 2 or not status_line[1].isdigit():
+        raise RuntimeError("invalid HTTP response")
+    if not 200 <= int(status_line[1]) < 400:
+        raise RuntimeError(f"HTTP status {status_line[1]}")
+
+
+async def _run_tcp_probe(probe: Probe):
+    _, writer = await asyncio.open_connection(probe.target, probe.port)
+    writer.close()
+
+
+async def run_probe(probe: Probe, runner: Runner, timeout: float) -> str or None:
+    """Run a probe once, return None if healthy or the reason of the failure"""
+    if probe.kind == EXEC:
+        coroutine = _run_exec_probe(probe, runner)
+    elif probe.kind == TCP:
+        coroutine = _run_tcp_probe(probe)
+    else:
+        coroutine = _run_http_probe(probe)
+    try:
+        await asyncio.wait_for(coroutine, timeout)
+    except asyncio.TimeoutError:
+        return f"timed out after {timeout}s"
+    except (OSError, RuntimeError) as e:
+        return str(e) or type(e).__name__
+    return None
+
+
+@dataclass
+class ProbeState:
+    runner: Runner
+    probe: Probe
+    interval: float
+    timeout: float
+    failure_threshold: int
+    failure_num: int = 0
+    healthy: bool = None
+
+
+class ProbeScheduler:
+    """Run the health probes of all runners from the manager loop
+
+    Due times come from one TimerHeap and at most worker_num probes run at a
+    time. A probe still queued or running is not queued again, so slow
+    probes never pile up. on_failure is called on the loop once a runner
+    failed failure_threshold probes in a row.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        worker_num: int,
+        on_failure: Callable[[Runner, str], None],
+    ):
+        self.loop = loop
+        self.worker_num = worker_num
+        self.on_failure = on_failure
+        self.timer_heap = TimerHeap(loop, self._enqueue)
+        self.probe_state_dict: dict[str, ProbeState] = {}
+        self._pending_path_set: set[str] = set()
+        self._queue = asyncio.Queue()
+
+    def start(self):
+        return asyncio.run_coroutine_threadsafe(self._run_workers(), self.loop)
+
+    def add(self, runner: Runner, probe: Probe, interval, timeout, failure_threshold):
+        self.probe_state_dict[runner.path] = ProbeState(
+            runner, probe, interval, timeout, failure_threshold
+        )
+        self.timer_heap.schedule(runner.path, IntervalSchedule(interval))
+
+    def remove(self, runner_path: str):
+        self.timer_heap.cancel(runner_path)
+        self.probe_state_dict.pop(runner_path, None)
+
+    def _enqueue(self, runner_path: str):
+        if runner_path in self._pending_path_set:
+            return
+        self._pending_path_set.add(runner_path)
+        self._queue.put_nowait(runner_path)
+
+    async def _run_workers(self):
+        await asyncio.gather(*[self._work() for _ in range(self.worker_num)])
+
+    async def _work(self):
+        while True:
+            runner_path = await self._queue.get()
+            try:
+                await self._probe(runner_path)
+            except Exception as e:
+                logging.error(f"Probe of {runner_path} failed: {e}")
+            finally:
+                self._pending_path_set.discard(runner_path)
+                self._queue.task_done()
+
+    async def _probe(self, runner_path: str):
+        state = self.probe_state_dict.get(runner_path)
+        # a booting or blocked runner has nothing to probe yet, a frozen one
+        # cannot answer
+        if state is None or not state.runner.is_running() or state.runner.is_frozen():
+            return
+        reason = await run_probe(state.probe, state.runner, state.timeout)
+        # removed, or frozen while probed
+        if (
+            self.probe_state_dict.get(runner_path) is not state
+            or state.runner.is_frozen()
+        ):
+            return
+        state.failure_num = 0 if reason is None else state.failure_num + 1
+        # status changes run hooks, a probe that stays healthy is not recorded
+        if not (state.healthy and reason is None):
+            state.runner.record_status(
+                {
+                    "probe": {
+                        "target": str(state.probe),
+                        "healthy": reason is None,
+                        "reason": reason,
+                        "failure_num": state.failure_num,
+                        "time": time(),
+                    }
+                }
+            )
+        state.healthy = reason is None
+        if state.failure_num >= state.failure_threshold:
+            logging.warning(
+                f"Runner {runner_path} failed {state.failure_num} probes: {reason}"
+            )
+            state.failure_num = 0
+            self.on_failure(state.runner, reason)
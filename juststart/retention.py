@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import os
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from threading import Lock
+
+# paths with tombstones, the least recently stopped ones are forgotten first
+MAX_TOMBSTONE_PATH_NUM = 4096
+# bytes read from the end of a log for its tail
+_LOG_TAIL_SIZE = 16384
+
+
+@dataclass
+class Tombstone:
+    """What is kept of a runner once it is removed from memory"""
+
+    path: str
+    reason: str
+    status: str
+    pid: int or None
+    returncode: int or None
+    booted_num: int
+    stopped_time: float
+    log_tail: list[str] = field(default_factory=list)
+    error_tail: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, any]:
+        return asdict(self)
+
+
+def read_log_tail(path: str, line_num: int) -> list[str]:
+    """Last line_num lines of a log, from its last bytes only"""
+    if line_num <= 0:
+        return []
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(size - _LOG_TAIL_SIZE, 0))
+            data = f.read()
+    except OSError:
+        return []
+    line_list = data.decode(errors="replace").splitlines()
+    if size > _LOG_TAIL_SIZE and line_list:
+        # the first line is cut
+        line_list = line_list[1:]
+    return line_list[-line_num:]
+
+
+class TombstoneStore:
+    """The last keep_num tombstones of every runner path"""
+
+    def __init__(self, keep_num: int, max_path_num: int = MAX_TOMBSTONE_PATH_NUM):
+        self.keep_num = keep_num
+        self.max_path_num = max_path_num
+        self._tombstone_dict: OrderedDict[str, deque[Tombstone]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._tombstone_dict)
+
+    def add(self, tombstone: Tombstone):
+        if self.keep_num <= 0:
+            return
+        with self._lock:
+            tombstone_queue = self._tombstone_dict.pop(tombstone.path, None)
+            if tombstone_queue is None:
+                tombstone_queue = deque(maxlen=self.keep_num)
+            tombstone_queue.append(tombstone)
+            self._tombstone_dict[tombstone.path] = tombstone_queue
+            while len(self._tombstone_dict) > self.max_path_num:
+                self._tombstone_dict.popitem(last=False)
+
+    def get_list(self, path: str) -> list[dict[str, any]]:
+        """Tombstones of path, the latest last"""
+        with self._lock:
+            return [
+                tombstone.to_dict() for tombstone in self._tombstone_dict.get(path, ())
+            ]
@@ -1,16 +1,79 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import os
+import signal
 import subprocess
+from collections import deque
+from concurrent.futures import Executor
 from pathlib import Path
-from time import time
+from threading import Lock
+from time import monotonic, sleep, time
 from typing import Callable
 
+from .admission import NORMAL, AdmissionController
+from .config import spawn_backend, status_history_size
+from .env import intern_env
 from .errors import RunnerError
 from .runner_status import *
+from .spawn import (
+    POPEN,
+    POSIX_SPAWN,
+    get_known_returncode,
+    is_posix_spawn_supported,
+    spawn,
+)
+from .stdin_pipe import open_stdin_pipe, write_stdin_pipe
+from .status_histogram import StatusDurationHistogram
+
+_spawn_backend = (
+    POSIX_SPAWN
+    if spawn_backend == POSIX_SPAWN and is_posix_spawn_supported()
+    else POPEN
+)
 
 
 class Runner:
+    __slots__ = (
+        "path",
+        "template_path",
+        "_args",
+        "env",
+        "auto_restart",
+        "max_rss",
+        "max_cpu_time",
+        "schedule",
+        "jitter",
+        "skip_if_running",
+        "stdin_pipe",
+        "down_timeout",
+        "priority_class",
+        "admission",
+        "executor",
+        "_stdin",
+        "_stdout",
+        "_stderr",
+        "_status",
+        "_status_changed_hook",
+        "_status_updated_hook",
+        "status_record",
+        "status_history",
+        "status_histogram",
+        "booted_num",
+        "blocked_num",
+        "blocked_program",
+        "blocked_time",
+        "process",
+        "returncode",
+        "monitor_future",
+        "stdin_io",
+        "stdin_write_fd",
+        "_stdin_lock",
+        "stdout_io",
+        "stderr_io",
+    )
+
     def __init__(
         self,
         path: str,
@@ -21,27 +84,71 @@ class Runner:
         stdout: str,
         stderr: str,
         status_changed_hook: Callable[[Runner, RunnerStatus], None],
+        max_rss: int = None,
+        max_cpu_time: float = None,
+        status_histogram: StatusDurationHistogram = None,
+        schedule: str = None,
+        jitter: float = None,
+        skip_if_running: bool = True,
+        template_path: str = None,
+        stdin_pipe: bool = False,
+        down_timeout: float = 5,
+        priority_class: str = NORMAL,
+        admission: AdmissionController = None,
+        executor: Executor = None,
+        status_updated_hook: Callable[[Runner, RunnerStatus], None] = None,
     ):
         self.path = path
+        # the script run by the instances of a template, the path otherwise
+        self.template_path = template_path or path
         self._args = args
-        self.env = env
+        self.env = intern_env(env)
 
         self.auto_restart = auto_restart
+        self.max_rss = max_rss
+        self.max_cpu_time = max_cpu_time
+        # timer runners run once per firing of the schedule
+        self.schedule = schedule
+        self.jitter = jitter
+        self.skip_if_running = skip_if_running
+        # stdin is a named pipe written by send_input_runner
+        self.stdin_pipe = stdin_pipe
+        # seconds the down script may run before the runner is stopped
+        self.down_timeout = down_timeout
+        # every start waits for admission by host pressure, if given
+        self.priority_class = priority_class
+        self.admission = admission
+        # the process is spawned in it, the default executor of the loop if None
+        self.executor = executor
 
         self._stdin = stdin
         self._stdout = stdout
         self._stderr = stderr
 
         self._status = None
+        # called when the status key changes
         self._status_changed_hook = status_changed_hook
+        # called when only the data of the current status changes
+        self._status_updated_hook = status_updated_hook
+        # kept in status data across status changes
+        self.status_record = {}
+        # (changed_time, status key, reason) of the latest transitions
+        self.status_history = deque(maxlen=status_history_size)
+        self.status_histogram = status_histogram
 
         self.booted_num = 0
         self.blocked_num = 0
+        self.blocked_program = None
+        self.blocked_time = None
 
         self.process = None
         self.returncode = None
+        self.monitor_future = None
 
         self.stdin_io = None
+        self.stdin_write_fd = None
+        # a write must not use the fd once a stop closed it, or reused it
+        self._stdin_lock = Lock()
         self.stdout_io = None
         self.stderr_io = None
 
@@ -53,42 +160,102 @@ class Runner:
     def status(self, status: RunnerStatus):
         if self._status and self._status.key == status.key:
             raise RunnerError(f"Status is already {status.key}")
+        old_status = self._status
         self._status = status
+        if old_status and self.status_histogram:
+            self.status_histogram.observe(
+                old_status.key,
+                status.data["changed_time"] - old_status.data["changed_time"],
+            )
         self._status_changed_hook(self, status)
 
     @property
     def pid(self) -> int:
         return self.process.pid if self.process else None
 
-    def _set_status(self, status_key: str, data: dict[str, any] = {}):
-        self.status = RunnerStatus(status_key, data | {"changed_time": time()})
-
-    def _update_status(self, data: dict[str, any], deleted_keys: list[str] = []):
+    def _set_status(
+        self, status_key: StatusKey, data: dict[str, any] = {}, reason: str = None
+    ):
+        if self._status and self._status.key == status_key:
+            raise RunnerError(f"Status is already {status_key}")
+        changed_time = time()
+        # before the setter, status changed hooks read the latest transition
+        self.status_history.append((changed_time, status_key, reason))
         self.status = RunnerStatus(
-            self.status.key,
-            {
-                key: value
-                for key, value in (self.status.data | data).items()
-                if key not in deleted_keys
-            },
+            status_key, self.status_record | data | {"changed_time": changed_time}
         )
 
+    def get_status_history(self) -> list[dict[str, any]]:
+        history_list = []
+        next_time = time()
+        for changed_time, status_key, reason in reversed(self.status_history):
+            history_list.append(
+                {
+                    "key": str(status_key),
+                    "changed_time": changed_time,
+                    "duration": next_time - changed_time,
+                    "reason": reason,
+                }
+            )
+            next_time = changed_time
+        history_list.reverse()
+        return history_list
+
+    def record_status(self, data: dict[str, any]):
+        self.status_record = self.status_record | data
+        if self.status:
+            self._update_status(data)
+
+    def _update_status(self, data: dict[str, any], deleted_keys: list[str] = []):
+        # apply the delta in place, the status object stays the same
+        status_data = self._status.data
+        status_data.update(data)
+        for key in deleted_keys:
+            status_data.pop(key, None)
+        if self._status_updated_hook:
+            self._status_updated_hook(self, self._status)
+
     def start(self, loop: asyncio.AbstractEventLoop):
-        self._set_status(BOOTING)
+        self._set_status(BOOTING, reason="start")
         self.start_monitoring(loop)
 
     def start_monitoring(self, loop: asyncio.AbstractEventLoop):
         async def monitor():
-            self.auto_restart += 1
+            # the first start is not a restart, -1 restarts forever
+            if self.auto_restart != -1:
+                self.auto_restart += 1
             while self.auto_restart > 0 or self.auto_restart == -1:
-                await self._check_blocker_list()
                 if not self.is_running():
-                    await asyncio.to_thread(self._start)
-                    self.auto_restart -= 1
+                    await self._check_blocker_list()
+                    await self._wait_admission()
+                    await loop.run_in_executor(self.executor, self._start)
+                    if self.auto_restart > 0:
+                        self.auto_restart -= 1
+                    if self.auto_restart == 0:
+                        break
                 await asyncio.sleep(0.1 if self.auto_restart > 0 else 1)
+            # the last process is not restarted, report its exit once reaped
+            while self.is_running():
+                await asyncio.sleep(1)
+            self.returncode = self.get_returncode()
+            self._update_status({"returncode": self.returncode})
+
+        self.monitor_future = asyncio.run_coroutine_threadsafe(monitor(), loop)
+        return self.monitor_future
 
-        future = asyncio.run_coroutine_threadsafe(monitor(), loop)
-        return future
+    def run_once(self, loop: asyncio.AbstractEventLoop):
+        if self.monitor_future:
+            self.monitor_future.cancel()
+        self.auto_restart = 0
+        self.start(loop)
+
+    def schedule_next_run(self, next_run_time: float):
+        self.record_status({"next_run_time": next_run_time})
+        if self.status is None:
+            self._set_status(SCHEDULED, reason=self.schedule)
+
+    def is_monitoring(self) -> bool:
+        return self.monitor_future is not None and not self.monitor_future.done()
 
     async def _check_blocker(self, path: str):
         self.blocked_program = path
@@ -121,9 +288,11 @@ class Runner:
             if self.status.data["blocked_program"] == path:
                 self._update_status(
                     {
-                        "blocked_run_num": self.status.data["blocked_run_num"] + 1
-                        if "blocked_run_num" in self.status.data
-                        else 1,
+                        "blocked_run_num": (
+                            self.status.data["blocked_run_num"] + 1
+                            if "blocked_run_num" in self.status.data
+                            else 1
+                        ),
                     },
                 )
             await self._check_blocker(path)
@@ -133,75 +302,169 @@ class Runner:
         if path.exists():
             block_list = [path]
             if path.is_dir():
-                block_list = path.iterdir()
+                block_list = sorted(path.iterdir())
             self._set_status(
                 BLOCKING,
-                {"block_list": block_list},
+                {"block_list": [str(blocker) for blocker in block_list]},
+                reason=str(path),
             )
             for blocker in block_list:
                 await self._check_blocker(blocker)
 
+    async def _wait_admission(self):
+        if self.admission is None:
+            return
+
+        def on_wait(reason: str):
+            self._set_status(
+                ADMITTING, {"priority_class": self.priority_class}, reason=reason
+            )
+
+        await self.admission.admit(self.priority_class, on_wait)
+
     def _start(self):
         if self.is_running():
             raise RunnerError(f"Process is already running")
-        self._set_status(RUNNING_READY)
-        self.stdin_io = open(self.stdin, "a+")
-        self.stdin_io.seek(0)
+        self._set_status(RUNNING_READY, reason="restart" if self.booted_num else "boot")
+        if self.stdin_pipe:
+            self._close_stdin_pipe()
+            stdin_io, stdin_write_fd = open_stdin_pipe(self.stdin)
+            with self._stdin_lock:
+                self.stdin_io, self.stdin_write_fd = stdin_io, stdin_write_fd
+        else:
+            self.stdin_io = open(self.stdin, "a+")
+            self.stdin_io.seek(0)
         self.stdout_io = open(self.stdout, "a")
         self.stderr_io = open(self.stderr, "a")
-        self.process = subprocess.Popen(
-            [self.path] + self.args,
+        self.process = spawn(
+            [self.template_path] + self.args,
             cwd=str(Path(self.path).parent),
             stdin=self.stdin_io,
             stdout=self.stdout_io,
             stderr=self.stderr_io,
             env=self.env,
+            backend=_spawn_backend,
         )
-        self._set_status(RUNNING)
+        self._set_status(RUNNING, reason=f"pid {self.process.pid}")
         self.booted_num += 1
 
     def _shutdown(self):
+        # the whole process group, so the children of the process stop too
         self._update_status({"shutdown_command": "SIGTERM"})
-        self.process.terminate()
-        try:
-            self.process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            self._update_status({"shutdown_command": "SIGKILL"})
-            self.process.kill()
+        self._kill_group(signal.SIGTERM)
+        if self._wait_group(5):
+            return
+        self._update_status({"shutdown_command": "SIGKILL"})
+        self._kill_group(signal.SIGKILL)
+        if not self._wait_group(5):
+            self._update_status({"error": "kill_fail"})
+            logging.error(f"Failed to kill process group {self.pid}")
+
+    def _kill_group(self, sig: int):
         try:
-            self.process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            import os
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            pass
 
-            self._update_status({"shutdown_command": "SIGKILL_OS"})
-            os.kill(self.process.pid, signal.SIGKILL)
+    def _wait_group(self, timeout: float) -> bool:
+        """Wait for the process and the rest of its group to exit"""
+        end_time = monotonic() + timeout
         try:
-            self.process.wait(timeout=5)
+            self.process.wait(timeout=timeout)
         except subprocess.TimeoutExpired:
-            self._update_status({"error": "kill_fail"})
-            logger.error(f"Failed to kill process {self.pid}")
+            return False
+        while True:
+            try:
+                os.killpg(self.process.pid, 0)
+            except (ProcessLookupError, PermissionError):
+                return True
+            if monotonic() >= end_time:
+                return False
+            sleep(0.05)
 
     def stop(self):
         if not self.is_running():
             raise RunnerError(f"{self.path} is not running")
-        self._set_status(STOPPING)
+        if self.monitor_future:
+            self.monitor_future.cancel()
+        if self.is_frozen():
+            # a stopped process would only handle SIGTERM once continued
+            self._signal_group(signal.SIGCONT)
+        self._set_status(STOPPING, reason="stop")
         self._shutdown()
-        self._set_status(STOPPED)
-        self.returncode = self.process.returncode
+        self.returncode = self.get_returncode()
+        self._set_status(STOPPED, reason=f"returncode {self.returncode}")
         if self.stdin_io and not self.stdin_io.closed:
             self.stdin_io.close()
+        self._close_stdin_pipe()
         if self.stdout_io and not self.stdout_io.closed:
             self.stdout_io.close()
         if self.stderr_io and not self.stderr_io.closed:
             self.stderr_io.close()
-        self._set_status(DISTROYED)
+        self._set_status(DESTROYED)
+
+    def _close_stdin_pipe(self):
+        with self._stdin_lock:
+            if self.stdin_write_fd is not None:
+                os.close(self.stdin_write_fd)
+                self.stdin_write_fd = None
+
+    def write_stdin(self, data: bytes) -> int:
+        """Write all of data to the stdin pipe without blocking, or raise"""
+        if not self.stdin_pipe:
+            raise RunnerError(f"stdin of {self.path} is not a pipe, see stdin_pipe")
+        with self._stdin_lock:
+            if self.stdin_write_fd is None or not self.is_running():
+                raise RunnerError(f"{self.path} is not running")
+            try:
+                return write_stdin_pipe(self.stdin_write_fd, data)
+            except BlockingIOError:
+                raise RunnerError(f"stdin pipe of {self.path} is full")
+            except ValueError as e:
+                raise RunnerError(f"Cannot send to {self.path}: {e}")
+            except OSError as e:
+                raise RunnerError(f"Failed to write stdin of {self.path}: {e}")
 
     def send_signal(self, signal):
-        if self.is_running():
-            raise RunnerError("Process is not running")
-        self._set_status(SIGNAL_READY, {"signal": signal})
+        if not self.is_running():
+            raise RunnerError(f"{self.path} is not running")
+        self._set_status(SIGNAL_READY, {"signal": signal}, reason=f"signal {signal}")
         self.process.send_signal(signal)
-        self._set_status(SIGNAL_SENT, {"signal": signal})
+        self._set_status(SIGNAL_SENT, {"signal": signal}, reason=f"signal {signal}")
+
+    def _signal_group(self, sig: int):
+        # the process leads its own group, see spawn
+        try:
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            raise RunnerError(f"{self.path} is not running")
+
+    def freeze(self, reason: str = "freeze"):
+        """Stop the process group with SIGSTOP, keeping its state"""
+        if not self.is_running():
+            raise RunnerError(f"{self.path} is not running")
+        if self.is_frozen():
+            return
+        self._signal_group(signal.SIGSTOP)
+        self._set_status(FROZEN, reason=reason)
+
+    def thaw(self, reason: str = "thaw"):
+        """Continue a frozen process group with SIGCONT"""
+        if not self.is_frozen():
+            raise RunnerError(f"{self.path} is not frozen")
+        self._signal_group(signal.SIGCONT)
+        self._set_status(RUNNING, reason=reason)
+
+    def is_frozen(self):
+        return (
+            self.status is not None and self.status.key == FROZEN and self.is_running()
+        )
+
+    def get_returncode(self) -> int or None:
+        """Exit code of the process, None while it runs or if it is unknown"""
+        if self.process is None:
+            return None
+        return get_known_returncode(self.process.poll())
 
     def is_running(self):
         if self.process:
@@ -210,7 +473,12 @@ class Runner:
             return False
 
     def is_blocking(self):
-        return self.boot_lock.locked() and not self.is_running()
+        # waiting on its blocker scripts before the next start
+        return (
+            self.status is not None
+            and self.status.key == BLOCKING
+            and not self.is_running()
+        )
 
     @property
     def args(self):
@@ -222,6 +490,10 @@ class Runner:
                 args.append(arg)
         return self._args
 
+    @args.setter
+    def args(self, args: list[str]):
+        self._args = args
+
     @property
     def stdin(self):
         return self._stdin
@@ -236,6 +508,10 @@ class Runner:
 
     @stdin.setter
     def stdin(self, path):
+        self._stdin = path
+        # a new pipe is only opened by the next start
+        if self.stdin_pipe:
+            return
         old_stdin_io = self.stdin_io
         if self.process and path:
             self.stdin_io = open(path, "r")
@@ -245,6 +521,7 @@ class Runner:
 
     @stdout.setter
     def stdout(self, path):
+        self._stdout = path
         old_stdout_io = self.stdout_io
         if self.process and path:
             self.stdout_io = open(path, "a")
@@ -254,6 +531,7 @@ class Runner:
 
     @stderr.setter
     def stderr(self, path):
+        self._stderr = path
         old_stderr_io = self.stderr_io
         if self.process and path:
             self.stderr_io = open(path, "a")
@@ -267,8 +545,16 @@ class Runner:
             "status": self.status.to_dict(),
             "path": self.path,
             "args": self.args,
-            "env": self.env,
+            "env": dict(self.env),
             "auto_restart": self.auto_restart,
+            "max_rss": self.max_rss,
+            "max_cpu_time": self.max_cpu_time,
+            "schedule": self.schedule,
+            "jitter": self.jitter,
+            "skip_if_running": self.skip_if_running,
+            "stdin_pipe": self.stdin_pipe,
+            "down_timeout": self.down_timeout,
+            "priority_class": self.priority_class,
             "booted_num": self.booted_num,
             "stdin": self.stdin,
             "stdout": self.stdout,
@@ -1,11 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import MISSING, asdict, dataclass
 from pathlib import Path
+from time import perf_counter
 
+from .admission import NORMAL, PRIORITY_CLASS_LIST
 from .env import get_env
 from .errors import RunnerConfigError
 from .path_utils import search_file_by_keywords
+from .probe import check_probe
+from .timer import check_schedule
+from .utils import parse_bool, parse_duration, parse_size
+
+# restart strategies: stop the old process first, or start the new one first
+STOP_START = "stop_start"
+START_STOP = "start_stop"
+RESTART_STRATEGY_LIST = [STOP_START, START_STOP]
 
 
 @dataclass
@@ -14,17 +25,26 @@ class ConfigFrag:
     stdin: str
     stdout: str
     stderr: str
+    max_rss: int = None
+    max_cpu_time: float = None
+    schedule: str = None
+    jitter: float = None
+    skip_if_running: bool = True
+    restart_strategy: str = STOP_START
+    ready_timeout: float = 30
+    probe: str = None
+    probe_interval: float = 10
+    probe_timeout: float = 5
+    probe_failure_threshold: int = 3
+    stdin_pipe: bool = False
+    down_timeout: float = 5
+    priority_class: str = NORMAL
 
-    def update(
-        self, auto_restart: int, stdin: str, stdout: str, stderr: str
-    ) -> ConfigFrag:
-        self.auto_restart = auto_restart
-        if stdin:
-            self.stdin = stdin
-        if stdout:
-            self.stdout = stdout
-        if stderr:
-            self.stderr = stderr
+    def update(self, **config) -> ConfigFrag:
+        for key, value in config.items():
+            if key in ["stdin", "stdout", "stderr"] and not value:
+                continue
+            setattr(self, key, value)
         return self
 
 
@@ -36,6 +56,20 @@ class RunnerConfig:
     stdin: str
     stdout: str
     stderr: str
+    max_rss: int = None
+    max_cpu_time: float = None
+    schedule: str = None
+    jitter: float = None
+    skip_if_running: bool = True
+    restart_strategy: str = STOP_START
+    ready_timeout: float = 30
+    probe: str = None
+    probe_interval: float = 10
+    probe_timeout: float = 5
+    probe_failure_threshold: int = 3
+    stdin_pipe: bool = False
+    down_timeout: float = 5
+    priority_class: str = NORMAL
 
     def update(
         self,
@@ -45,6 +79,7 @@ class RunnerConfig:
         stdin: str,
         stdout: str,
         stderr: str,
+        **settings,
     ) -> RunnerConfig:
         for arg in args:
             if arg[:1] == "-" and arg[1:]:
@@ -60,9 +95,59 @@ class RunnerConfig:
         self.stdin = stdin if stdin else self.stdin
         self.stdout = stdout if stdout else self.stdout
         self.stderr = stderr if stderr else self.stderr
+        for key, value in settings.items():
+            setattr(self, key, value)
         return self
 
 
+class ConfigTrace:
+    """Record the fragments applied while resolving a runner config"""
+
+    def __init__(self):
+        self.fragment_list: list[dict[str, any]] = []
+        self.timing_dict: dict[str, float] = {}
+
+    @contextmanager
+    def timing(self, phase: str):
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            self.timing_dict[phase] = (
+                self.timing_dict.get(phase, 0.0) + perf_counter() - start_time
+            )
+
+    def add_fragment(self, layer: str, kind: str, path: str, value: any):
+        self.fragment_list.append(
+            {
+                "order": len(self.fragment_list),
+                "layer": layer,
+                "kind": kind,
+                "path": str(path),
+                "value": value,
+            }
+        )
+
+    def to_dict(self, runner_config: RunnerConfig) -> dict[str, any]:
+        return {
+            "fragments": self.fragment_list,
+            "timings": self.timing_dict | {"total": sum(self.timing_dict.values())},
+            "config": {
+                key: str(value) if isinstance(value, Path) else value
+                for key, value in asdict(runner_config).items()
+            },
+        }
+
+
+@contextmanager
+def _timing(trace: ConfigTrace or None, phase: str):
+    if trace is None:
+        yield
+    else:
+        with trace.timing(phase):
+            yield
+
+
 def get_default_config(work_path: Path, std_path: Path):
     path = Path(work_path)
     return RunnerConfig(
@@ -81,84 +166,132 @@ def _parse_env(env_file: list[str], env: dict[str, str]) -> dict:
     return env
 
 
-def _parse_args(args_file: list[str], args: list[str]) -> list[str]:
-    for path in args_file:
-        with open(path) as f:
-            for arg in f.readlines():
-                arg = arg.strip()
-                if arg[:1] == "-" and arg[1:]:
-                    arg_key = arg[1:].strip()
-                    if arg_key in args:
-                        args.remove(arg[1:])
-                    elif arg_key == "*":
-                        args = []
-                args.append(arg)
-    return args
+def _parse_args(args_file: str) -> list[str]:
+    """Return the lines of an args file, RunnerConfig.update applies them"""
+    with open(args_file) as f:
+        return [arg.strip() for arg in f.readlines() if arg.strip()]
+
+
+def _parse_restart_strategy(value: str) -> str:
+    value = value.strip().lower().replace("-", "_")
+    if value not in RESTART_STRATEGY_LIST:
+        raise ValueError(f"Unknown restart strategy {value}")
+    return value
+
+
+def _parse_priority_class(value: str) -> str:
+    value = value.strip().lower()
+    if value not in PRIORITY_CLASS_LIST:
+        raise ValueError(f"Unknown priority class {value}")
+    return value
 
 
 def __get_single_config(key: str, config: str):
-    if config.startswith(f"-{key}"):
+    if config == f"-{key}":
         return False
     elif config.startswith(key + "="):
         return config[len(key) + 1 :].strip()
     return None
 
 
-def _parse_config_frag(config_file: str):
+_config_frag_parser_dict = {
+    "auto_restart": int,
+    "stdin": str,
+    "stdout": str,
+    "stderr": str,
+    "max_rss": parse_size,
+    "max_cpu_time": float,
+    "schedule": check_schedule,
+    "jitter": parse_duration,
+    "skip_if_running": parse_bool,
+    "restart_strategy": _parse_restart_strategy,
+    "ready_timeout": parse_duration,
+    "probe": check_probe,
+    "probe_interval": parse_duration,
+    "probe_timeout": parse_duration,
+    "probe_failure_threshold": int,
+    "stdin_pipe": parse_bool,
+    "down_timeout": parse_duration,
+    "priority_class": _parse_priority_class,
+}
+
+
+def _get_reset_value(key: str):
+    # -key turns auto restart off, keeps the std path of the layer below and
+    # resets any other setting to its default
+    if key == "auto_restart":
+        return 0
+    default = ConfigFrag.__dataclass_fields__[key].default
+    return None if default is MISSING else default
+
+
+def _parse_config_frag(config_file: str) -> dict[str, any]:
+    config = {}
     with open(config_file) as f:
-        for line in r.readlines():
-            auto_restart_value = __get_single_config("auto_restart", line)
-            if auto_restart_value is not None:
-                if auto_restart_value == False:
-                    auto_restart = 0
+        for line in f.readlines():
+            line = line.strip()
+            for key, parser in _config_frag_parser_dict.items():
+                value = __get_single_config(key, line)
+                if value is None:
+                    continue
+                if value is False:
+                    config[key] = _get_reset_value(key)
                 else:
-                    auto_restart = int(auto_restart_value)
-            stdin_value = __get_single_config("stdin", line)
-            if stdin_value is not None:
-                stdin = stdin_value if stdin_value != False else None
-            stdout_value = __get_single_config("stdout", line)
-            if stdout_value is not None:
-                stdout = stdout_value if stdout_value != False else None
-            stderr_value = __get_single_config("stderr", line)
-            if stderr_value is not None:
-                stderr = stderr_value if stderr_value != False else None
-        return auto_restart, stdin, stdout, stderr
+                    try:
+                        config[key] = parser(value)
+                    except ValueError:
+                        raise RunnerConfigError(
+                            f"Invalid value for {key} in {config_file}: {value}"
+                        )
+    return config
 
 
 def _get_runner_config_by_path(
-    compound_word: str, config_path: str, runner_config: RunnerConfig
+    compound_word: str,
+    config_path: str,
+    runner_config: RunnerConfig,
+    trace: ConfigTrace = None,
+    layer: str = None,
 ) -> RunnerConfig:
     config_frag = ConfigFrag(
-        auto_restart=runner_config.auto_restart,
-        stdin=runner_config.stdin,
-        stdout=runner_config.stdout,
-        stderr=runner_config.stderr,
+        **{key: getattr(runner_config, key) for key in _config_frag_parser_dict}
     )
 
-    keyword_dict = search_file_by_keywords(
-        ["args", "env", "config"], config_path, compound_word, search_parent=True
-    )
+    with _timing(trace, "search"):
+        keyword_dict = search_file_by_keywords(
+            ["args", "env", "config"], config_path, compound_word, search_parent=True
+        )
 
-    config_path_list = keyword_dict["config"]
-    for config_path in config_path_list:
-        config_frag = config_frag.update(_parse_config_frag(config_path))
-    args_path_list = keyword_dict["args"]
-    args = _parse_args(args_path_list, runner_config.args)
-    env_path_list = keyword_dict["env"]
-    env = _parse_env(env_path_list, runner_config.env)
-
-    return runner_config.update(
-        args=args,
-        env=env,
-        auto_restart=config_frag.auto_restart,
-        stdin=config_frag.stdin,
-        stdout=config_frag.stdout,
-        stderr=config_frag.stderr,
-    )
+    with _timing(trace, "config"):
+        for config_path in keyword_dict["config"]:
+            config = _parse_config_frag(config_path)
+            config_frag = config_frag.update(**config)
+            if trace:
+                trace.add_fragment(layer, "config", config_path, config)
+    args = []
+    with _timing(trace, "args"):
+        for args_path in keyword_dict["args"]:
+            args_frag = _parse_args(args_path)
+            args.extend(args_frag)
+            if trace:
+                trace.add_fragment(layer, "args", args_path, args_frag)
+    with _timing(trace, "env"):
+        env = runner_config.env
+        for env_path in keyword_dict["env"]:
+            env = _parse_env([env_path], env)
+            if trace:
+                trace.add_fragment(layer, "env", env_path, env)
+
+    with _timing(trace, "merge"):
+        return runner_config.update(args=args, env=env, **asdict(config_frag))
 
 
 def get_runner_config(
-    runner_path: str, work_path: str, default_config_path: str, tmp_dir_path: str
+    runner_path: str,
+    work_path: str,
+    default_config_path: str,
+    tmp_dir_path: str,
+    trace: ConfigTrace = None,
 ) -> RunnerConfig:
     work_path = Path(work_path)
     compound_word = Path(runner_path).name
@@ -169,11 +302,11 @@ def get_runner_config(
     )
 
     setting_default_config = _get_runner_config_by_path(
-        compound_word, default_config_path, buildin_default_config
+        compound_word, default_config_path, buildin_default_config, trace, "default"
     )
 
     runner_config = _get_runner_config_by_path(
-        compound_word, work_path, setting_default_config
+        compound_word, work_path, setting_default_config, trace, "work"
     )
 
     return runner_config
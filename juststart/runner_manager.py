@@ -1,31 +1,17 @@
-import logging
+import asyncio
 from asyncio import new_event_loop
-from concurrent.futures import ThreadPoolExecutor
-from pathlib import Path
+from concurrent.futures import Future
 from threading import Thread
-from typing import Callable
+from typing import Callable, Coroutine
 
-from .config import enable_compatible_runit
-from .errors import ManagerConfigError, RunnerError
-from .path_utils import search_file_by_keywords
+from .async_runner_manager import AsyncRunnerManager, RunnerManagerStatus
+from .instrumentation import InstrumentedThreadPoolExecutor
+from .retention import TombstoneStore
 from .runner import Runner
-from .runner_config import RunnerConfig, get_runner_config
+from .runner_config import RunnerConfig
 from .runner_manager_config import RunnerManagerConfig
-from .runner_status import RUNNING, RunnerStatus
-from .utils import delete_directory_and_empty_parents
-
-
-class RunnerManagerStatus:
-    INITED = "INITED"
-    NOT_INITED = "NOT_INITED"
-
-    ENABLED_BOOT = "ENABLED_BOOT"
-    DISABLED_BOOT = "DISABLED_BOOT"
-
-    INITED_BUT_NOT_SAVED = "INITED_BUT_NOT_SAVED"
-
-    RUNNING = "RUNNING"
-    NOT_RUNNING = "NOT_RUNNING"
+from .runner_status import RunnerStatus
+from .utils import cancel_all_tasks
 
 
 class RunnerManager:
@@ -34,150 +20,96 @@ class RunnerManager:
         runner_list_file_path: str,
         default_runner_config_path: str,
         tmp_dir_path: str,
+        manifest_path: str = None,
+        shard: tuple[int, int] = None,
+        history_path: str = None,
+        monitor_executor: InstrumentedThreadPoolExecutor = None,
     ):
-        monitor_executor = ThreadPoolExecutor()
+        """Thread facade of AsyncRunnerManager, see it for the arguments
+
+        The manager runs on an event loop of its own, in a thread started
+        here. Methods that wait run a coroutine of the manager on that loop
+        and block until it is done, so they must not be called from the
+        thread of the loop; submit_* methods return a future at once.
+        Lookups such as get_runner do not go through the loop.
+        """
+        self.core = AsyncRunnerManager(
+            runner_list_file_path,
+            default_runner_config_path,
+            tmp_dir_path,
+            manifest_path,
+            shard,
+            history_path,
+            monitor_executor,
+        )
         self.loop = new_event_loop()
-        self.loop.set_default_executor(monitor_executor)
+        self.loop.set_default_executor(self.core.monitor_executor)
         self.start_manager()
+        try:
+            self._call(self.core.open())
+        except BaseException:
+            # a constructor that raises leaves no thread behind
+            self._stop_loop()
+            raise
 
-        self.default_runner_config_path = default_runner_config_path
-        self.tmp_dir_path = tmp_dir_path
-        self.manager_config = RunnerManagerConfig(runner_list_file_path)
-        self.runner_dict = dict()
-        self._load_runners()
-
-    def _load_runners(self):
-        runners_dict = self.runner_dict
-        for path, enabled in self.manager_config.runner_info_dict.items():
-            if enabled:
-                self.start_runner(path)
-                logging.info(f"Runner {path} booted")
-            else:
-                logging.info(f"Runner {path} checked")
-
-    def _unload_runners(self):
-        for path in list(self.runner_dict.keys()):
-            try:
-                self.stop_runner(path)
-                logging.info(f"Runner {path} stopped")
-            except RunnerError:
-                logging.info(f"Runner {path} had stopped")
-        self.clean_runner()
+    @property
+    def manager_config(self) -> RunnerManagerConfig:
+        return self.core.manager_config
 
-    def start_manager(self):
-        def run_event_loop(loop):
-            loop.run_forever()
+    @property
+    def runner_dict(self) -> dict[str, Runner]:
+        return self.core.runner_dict
+
+    @property
+    def tombstone_store(self) -> TombstoneStore:
+        return self.core.tombstone_store
 
-        self.event_loop_thread = Thread(target=run_event_loop, args=(self.loop,))
+    def start_manager(self):
+        self.event_loop_thread = Thread(
+            target=self.loop.run_forever, name="juststart-loop"
+        )
         self.event_loop_thread.start()
 
     def stop_manager(self):
-        self._unload_runners()
+        try:
+            self._call(self.core.close())
+        finally:
+            self._stop_loop()
+
+    def _stop_loop(self):
+        asyncio.run_coroutine_threadsafe(cancel_all_tasks(), self.loop).result()
         self.loop.call_soon_threadsafe(self.loop.stop)
         self.event_loop_thread.join()
         self.loop.close()
 
+    def _call(self, coroutine: Coroutine) -> any:
+        return self._submit(coroutine).result()
+
+    def _submit(self, coroutine: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
     def get_runner_status_dict(self) -> dict[str, list[RunnerManagerStatus]]:
-        runner_status_dict = {}
-        for path, enable in self.manager_config.runner_info_dict.items():
-            status_list = set()
-            if enable:
-                status_list.add(RunnerManagerStatus.ENABLED_BOOT)
-            else:
-                status_list.add(RunnerManagerStatus.DISABLED_BOOT)
-            try:
-                runner = self.get_runner(path)
-                status_list.add(RunnerManagerStatus.INITED)
-                if runner.is_running():
-                    status_list.add(RunnerManagerStatus.RUNNING)
-                else:
-                    status_list.add(RunnerManagerStatus.NOT_RUNNING)
-            except RunnerError:
-                status_list.add(RunnerManagerStatus.NOT_INITED)
-            runner_status_dict[path] = status_list
-        for runner in self.runner_dict.values():
-            try:
-                status_list = runner_status_dict[runner.path]
-            except KeyError:
-                status_list = set([RunnerManagerStatus.INITED_BUT_NOT_SAVED])
-                runner_status_dict[runner.path] = status_list
-            if runner.is_running():
-                status_list.add(RunnerManagerStatus.RUNNING)
-            else:
-                status_list.add(RunnerManagerStatus.NOT_RUNNING)
-            runner_status_dict[runner.path] = status_list
-        sorted_status_dict = {}
-        for path, status_list in sorted(runner_status_dict.items()):
-            sorted_status_dict[path] = sorted(status_list)
-        return sorted_status_dict
-
-    def _get_runner_config(self, path: str, config_path: str) -> RunnerConfig:
-        return get_runner_config(
-            path,
-            config_path,
-            self.default_runner_config_path,
-            Path(self.tmp_dir_path) / "runner",
-        )
+        return self.core.get_runner_status_dict()
 
-    def _get_config_from_runner(self, runner: Runner) -> RunnerConfig:
-        return RunnerConfig(
-            args=runner.args,
-            env=runner.env,
-            auto_restart=runner.auto_restart,
-            stdin=runner.stdin,
-            stdout=runner.stdout,
-            stderr=runner.stderr,
-        )
+    def select_runner_path_list(
+        self, selector_list: list[str], kind: str = None
+    ) -> list[str]:
+        return self.core.select_runner_path_list(selector_list, kind)
 
-    def reload_runner(self, path: str):
-        runner = self.get_runner(path)
-        config_path = str(Path(path).parent)
-        config = self._get_runner_config(path, config_path)
-        need_stop = False
-        need_start = False
-
-        if runner.args != config.args:
-            runner.args = config.args
-            need_stop = True
-        if runner.env != config.env:
-            runner.env = config.env
-            need_stop = True
-        if need_stop and runner.is_running():
-            runner.stop()
-            need_start = True
-
-        if runner.stdin != config.stdin:
-            runner.stdin = config.stdin
-        if runner.stdout != config.stdout:
-            runner.stdout = config.stdout
-        if runner.stderr != config.stderr:
-            runner.stderr = config.stderr
-
-        if need_start:
-            runner.start(self.loop)
+    def explain_runner_config(self, path: str) -> dict[str, any]:
+        return self.core.explain_runner_config(path)
 
     def get_runner(self, path) -> Runner:
-        try:
-            return self.runner_dict[path]
-        except KeyError:
-            raise RunnerError(
-                f"Runner at {path} is not in memory, which means it is never started or been gc"
-            )
-
-    def clean_runner(self):
-        deleted_runner_list = []
-        for path, runner in list(self.runner_dict.items()):
-            if not runner.is_running():
-                self._pop_runner(runner)
-                deleted_runner_list.append(path)
-        return deleted_runner_list
-
-    def restart_runner(self, path):
-        try:
-            self.stop_runner(path)
-        except RunnerError as e:
-            logging.info(e.message)
-        self.start_runner(path)
+        return self.core.get_runner(path)
+
+    def get_instance_path_list(self, template_path: str) -> list[str]:
+        return self.core.get_instance_path_list(template_path)
+
+    def get_status_histogram(self) -> dict[str, dict[str, any]]:
+        return self.core.get_status_histogram()
+
+    def get_instrumentation_stats(self) -> dict[str, dict[str, any]]:
+        return self.core.get_instrumentation_stats()
 
     def start_runner(
         self,
@@ -185,106 +117,86 @@ class RunnerManager:
         config: RunnerConfig = None,
         status_changed_hook: Callable[[Runner, RunnerStatus], None] = None,
     ) -> Runner:
-        config_path = str(Path(path).parent)
-        if config is None:
-            try:
-                config = self._get_runner_config(path, config_path)
-            except Exception as e:
-                logging.exception(e)
-        if status_changed_hook:
-
-            def status_changed_hook(runner, status):
-                self._run_runner_status_hook(runner, status)
-                status_changed_hook(runner, status)
-
-        else:
-            status_changed_hook = lambda runner, status: self._run_runner_status_hook(
-                runner, status
-            )
-        runner = Runner(
-            path=path,
-            args=config.args,
-            env=config.env,
-            auto_restart=config.auto_restart,
-            stdin=config.stdin,
-            stdout=config.stdout,
-            stderr=config.stderr,
-            status_changed_hook=status_changed_hook,
-        )
-        self._init_runner_runtime(self._get_config_from_runner(runner))
-        runner.start(self.loop)
-        self.runner_dict[path] = runner
-        return runner
+        return self.submit_start_runner(path, config, status_changed_hook).result()
+
+    def submit_start_runner(
+        self,
+        path,
+        config: RunnerConfig = None,
+        status_changed_hook: Callable[[Runner, RunnerStatus], None] = None,
+    ) -> Future:
+        """Queue a start without waiting for it, see start_runner"""
+        return self._submit(self.core.start(path, config, status_changed_hook))
+
+    def restart_runner(self, path, strategy: str = None):
+        """See AsyncRunnerManager.restart"""
+        self.submit_restart_runner(path, strategy).result()
+
+    def submit_restart_runner(self, path, strategy: str = None) -> Future:
+        """Queue a restart without waiting for it, see restart_runner"""
+        return self._submit(self.core.restart(path, strategy))
+
+    def reload_runner(self, path: str):
+        self.submit_reload_runner(path).result()
+
+    def submit_reload_runner(self, path: str) -> Future:
+        """Queue a reload without waiting for it, see reload_runner"""
+        return self._submit(self.core.reload(path))
 
     def stop_runner(self, path, check_running: bool = False):
-        runner = self.get_runner(path)
-        try:
-            down_runner_path = f"{path}.down"
-            if "down" in enable_compatible_runit and Path(path).name != "down":
-                down_runner_path = f"{Path(path).parent / 'down'}"
-            RunnerManagerConfig._check_runner(down_runner_path)
-            config = self._get_config_from_runner(runner)
-            logging.info(f"Pre-run {down_runner_path}")
-            down_runner = self.start_runner(down_runner_path, config=config)
-            wait_count = 5
-            while down_runner.is_running() and wait_count > 0:
-                time.sleep(1)
-                wait_count -= 1
-            self.stop_runner(down_runner.path, check_running=True)
-        except ManagerConfigError or RunnerError:
-            pass
-        # Stop the runner if check_running is False or the runner is running
-        if not check_running or (check_running and runner.is_running()):
-            runner.stop()
-        self._pop_runner(runner)
+        self.submit_stop_runner(path, check_running).result()
+
+    def submit_stop_runner(self, path, check_running: bool = False) -> Future:
+        """Queue a stop without waiting for it, see stop_runner"""
+        return self._submit(self.core.stop(path, check_running))
+
+    def stop_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        """Stop runners, return "ok" or the error by path"""
+        return self._call(self.core.stop_runner_list(path_list))
+
+    def wait_runner_ready(self, path: str, timeout: float = None) -> bool:
+        """See AsyncRunnerManager.wait_ready"""
+        return self._call(self.core.wait_ready(path, timeout))
+
+    def clean_runner(self) -> list[str]:
+        return self._call(self.core.clean_runner())
+
+    def scale_runner(self, template_path: str, instance_num: int) -> dict[str, list]:
+        """See AsyncRunnerManager.scale_runner"""
+        return self._call(self.core.scale_runner(template_path, instance_num))
+
+    def restart_instances(
+        self, template_path: str, batch_size: int = 1, strategy: str = None
+    ) -> dict[str, list[str]]:
+        return self._call(
+            self.core.restart_instances(template_path, batch_size, strategy)
+        )
+
+    def rolling_restart(
+        self,
+        path_list: list[str],
+        batch_size: int = 1,
+        pause: float = 0,
+        strategy: str = None,
+    ) -> dict[str, list[str]]:
+        """See AsyncRunnerManager.rolling_restart"""
+        return self._call(
+            self.core.rolling_restart(path_list, batch_size, pause, strategy)
+        )
+
+    def send_input_runner(self, path: str, data: bytes) -> int:
+        return self.core.send_input_runner(path, data)
+
+    def send_input_runner_list(
+        self, path_list: list[str], data: bytes
+    ) -> dict[str, int or str]:
+        return self.core.send_input_runner_list(path_list, data)
+
+    def freeze_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        return self._call(self.core.freeze_runner_list(path_list))
+
+    def thaw_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        return self._call(self.core.thaw_runner_list(path_list))
 
     def send_signal_runner(self, path, signal):
-        runner = self.get_runner(path)
-        runner.send_signal(signal)
-
-    def _pop_runner(self, runner):
-        config = self._get_config_from_runner(runner)
-        self._destroy_runner_runtime(config)
-        del self.runner_dict[runner.path]
-
-    @staticmethod
-    def _init_runner_runtime(config: RunnerConfig):
-        Path(config.stdin).parent.mkdir(parents=True, exist_ok=True)
-        Path(config.stdin).touch()
-        Path(config.stdout).parent.mkdir(parents=True, exist_ok=True)
-        Path(config.stdout).touch()
-        Path(config.stderr).parent.mkdir(parents=True, exist_ok=True)
-        Path(config.stderr).touch()
-
-    def _destroy_runner_runtime(self, config: RunnerConfig):
-        tmp_path = Path(self.tmp_dir_path) / "runner"
-        delete_directory_and_empty_parents(Path(config.stdin).parent, tmp_path)
-        delete_directory_and_empty_parents(Path(config.stdout).parent, tmp_path)
-        delete_directory_and_empty_parents(Path(config.stderr).parent, tmp_path)
-
-    def _run_runner_status_hook(self, runner: Runner, status: RunnerStatus):
-        path = Path(runner.path)
-        work_path = path.parent
-
-        def check_script_available(script_path):
-            try:
-                RunnerManagerConfig._check_runner(script_path)
-                return True
-            except ManagerConfigError:
-                return False
-
-        runner_config = self._get_config_from_runner(runner)
-
-        for script_path in search_file_by_keywords(
-            [status.key], work_path, compound_word=path.name, search_parent=True
-        ):
-            if check_script_available(script_path):
-
-                def script_runner_hook(runner, status):
-                    if status.key == RUNNING:
-                        try:
-                            runner.wait()
-                        finally:
-                            self.stop_runner(script_path)
-
-                self.start_runner(script_path, runner_config)
+        self._call(self.core.send_signal_runner(path, signal))
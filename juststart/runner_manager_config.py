@@ -1,11 +1,23 @@
+import logging
 import os
+from typing import Callable
 
 from .errors import ManagerConfigError
+from .instance import split_instance_path
 
 
 class RunnerManagerConfig:
-    def __init__(self, runner_list_file_path):
+    def __init__(
+        self,
+        runner_list_file_path,
+        on_change: Callable[[list[str], list[str]], None] = None,
+        path_filter: Callable[[str], bool] = None,
+    ):
         self.runner_list_file_path = runner_list_file_path
+        # called with the old and the new runner paths after every write
+        self.on_change = on_change
+        # a shard only sees its own runners, and never writes the list
+        self.path_filter = path_filter
 
     def __get_all_runners_info(self):
         with open(self.runner_list_file_path, "a+") as f:
@@ -17,14 +29,25 @@ class RunnerManagerConfig:
 
     @property
     def runner_info_dict(self) -> dict:
+        if self.path_filter:
+            return {
+                path: enabled
+                for path, enabled in self.__get_all_runners_info()
+                if self.path_filter(path)
+            }
         return dict(self.__get_all_runners_info())
 
     @runner_info_dict.setter
     def runner_info_dict(self, runners_info: dict):
+        if self.path_filter:
+            raise ManagerConfigError("The runner list of a shard is read-only")
+        old_runners_info = self.runner_info_dict if self.on_change else {}
         with open(self.runner_list_file_path, "w") as f:
             for path in sorted(runners_info):
                 is_enabled = runners_info[path]
                 f.write(f"{path}\n" if is_enabled else f"- {path}\n")
+        if self.on_change:
+            self.on_change(list(old_runners_info), list(runners_info))
 
     @staticmethod
     def _check_runner(path):
@@ -45,7 +68,7 @@ class RunnerManagerConfig:
             raise ManagerConfigError(
                 f"{path} is already added { 'enabled' if runners_info[path] else 'disabled' }"
             )
-        self._check_runner(path)
+        self._check_runner(split_instance_path(path)[0])
         runners_info[path] = False
         self.runner_info_dict = runners_info
 
@@ -1,21 +1,54 @@
-from enum import Enum
+from enum import IntEnum
 
-BOOTING = "booting"
-BLOCKING = "blocking"
-RUNNING_READY = "running_ready"
-RUNNING = "running"
-STOPPING = "stopping"
-STOPPED = "stopped"
-DESTROYED = "destroyed"
 
-SIGNAL_READY = "signal_ready"
-SIGNAL_SENT = "signal_sent"
+class StatusKey(IntEnum):
+    BOOTING = 0
+    BLOCKING = 1
+    RUNNING_READY = 2
+    RUNNING = 3
+    STOPPING = 4
+    STOPPED = 5
+    DESTROYED = 6
+
+    SIGNAL_READY = 7
+    SIGNAL_SENT = 8
+
+    SCHEDULED = 9
+
+    ADMITTING = 10
+    FROZEN = 11
+
+    def __str__(self):
+        return self.name.lower()
+
+    __format__ = object.__format__
+
+
+BOOTING = StatusKey.BOOTING
+BLOCKING = StatusKey.BLOCKING
+RUNNING_READY = StatusKey.RUNNING_READY
+RUNNING = StatusKey.RUNNING
+STOPPING = StatusKey.STOPPING
+STOPPED = StatusKey.STOPPED
+DESTROYED = StatusKey.DESTROYED
+
+SIGNAL_READY = StatusKey.SIGNAL_READY
+SIGNAL_SENT = StatusKey.SIGNAL_SENT
+
+SCHEDULED = StatusKey.SCHEDULED
+
+ADMITTING = StatusKey.ADMITTING
+FROZEN = StatusKey.FROZEN
+
+STATUS_KEY_LIST = [str(key) for key in StatusKey]
 
 
 class RunnerStatus:
-    def __init__(self, key: str, data: dict[str, any] = {}):
+    __slots__ = ("key", "data")
+
+    def __init__(self, key: StatusKey, data: dict[str, any] = None):
         self.key = key
-        self.data = data
+        self.data = {} if data is None else data
 
     def to_dict(self):
-        return {"key": self.key, "data": self.data}
+        return {"key": str(self.key), "data": self.data}
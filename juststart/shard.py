@@ -0,0 +1,282 @@
+"""Sharded supervision: runners are split across supervisor processes
+
+The daemon started with SHARDS=N spawns N shard processes, each running a
+RunnerManager for the runners hashed to it, and serves the CLI from a front
+that routes path operations to the owning shard and aggregates the others.
+A shard process that dies is started again by the daemon, the calls routed
+to it meanwhile fail with RunnerManagerError.
+"""
+
+from __future__ import annotations
+
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import sleep
+from typing import Callable
+
+from .errors import RunnerManagerError
+from .instance import INSTANCE_SEPARATOR
+
+
+def get_shard_index(path: str, shard_num: int) -> int:
+    """Owning shard of a runner, stable across processes and restarts
+
+    Instances hash by their template, so scale_runner and the template
+    config cache stay within one shard. The split is done on the name only,
+    without checking the file system like split_instance_path.
+    """
+    name = Path(path).name
+    if INSTANCE_SEPARATOR in name:
+        path = path[: len(path) - len(name)] + name.rpartition(INSTANCE_SEPARATOR)[0]
+    return zlib.crc32(path.encode()) % shard_num
+
+
+def get_shard_filter(shard_index: int, shard_num: int) -> Callable[[str], bool]:
+    return lambda path: get_shard_index(path, shard_num) == shard_index
+
+
+class _ShardProxy:
+    """Forward calls to a proxy of a shard process, report a lost connection
+    as a RunnerManagerError instead of an error of the transport"""
+
+    def __init__(self, shard_index: int, proxy):
+        self._shard_index = shard_index
+        self._proxy = proxy
+
+    def __getattr__(self, name: str):
+        method = getattr(self._proxy, name)
+
+        def call(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            except (ConnectionError, EOFError, FileNotFoundError) as e:
+                raise RunnerManagerError(
+                    f"Shard {self._shard_index} is not reachable, it is started "
+                    f"again if it died: {e!r}"
+                )
+
+        return call
+
+
+class ShardedRunnerManager:
+    """Route the RunnerManager API of the CLI to the shard processes
+
+    shard_list holds the runner manager and utils proxies of every shard,
+    replaced in place when a shard is started again; stop_shards is called by
+    stop_manager to shut the processes down.
+    """
+
+    def __init__(self, manager_config, shard_list: list[tuple], stop_shards=None):
+        self.manager_config = manager_config
+        self.shard_list = shard_list
+        self._stop_shards = stop_shards
+        self.executor = ThreadPoolExecutor(max_workers=len(shard_list))
+
+    def _get_shard_index(self, path: str) -> int:
+        return get_shard_index(path, len(self.shard_list))
+
+    def _get_shard_by_index(self, shard_index: int) -> tuple[_ShardProxy, _ShardProxy]:
+        return tuple(
+            _ShardProxy(shard_index, proxy) for proxy in self.shard_list[shard_index]
+        )
+
+    def _get_shard(self, path: str) -> _ShardProxy:
+        return self._get_shard_by_index(self._get_shard_index(path))[0]
+
+    def get_shard_utils(self, path: str) -> _ShardProxy:
+        return self._get_shard_by_index(self._get_shard_index(path))[1]
+
+    def _map_shards(self, func: Callable) -> list:
+        """Call func(runner_manager, utils) on all shards concurrently"""
+        return list(
+            self.executor.map(
+                lambda shard_index: func(*self._get_shard_by_index(shard_index)),
+                range(len(self.shard_list)),
+            )
+        )
+
+    def stop_manager(self):
+        self.executor.shutdown()
+        if self._stop_shards:
+            self._stop_shards()
+
+    def start_runner(self, path):
+        return self._get_shard(path).start_runner(path)
+
+    def restart_runner(self, path, strategy: str = None):
+        self._get_shard(path).restart_runner(path, strategy)
+
+    def stop_runner(self, path, check_running: bool = False):
+        self._get_shard(path).stop_runner(path, check_running)
+
+    def reload_runner(self, path: str):
+        self._get_shard(path).reload_runner(path)
+
+    def get_runner(self, path):
+        return self._get_shard(path).get_runner(path)
+
+    def send_signal_runner(self, path, signal):
+        self._get_shard(path).send_signal_runner(path, signal)
+
+    def send_input_runner(self, path: str, data: bytes) -> int:
+        return self._get_shard(path).send_input_runner(path, data)
+
+    def _map_path_list(self, path_list: list[str], func: Callable) -> dict:
+        """Call func(runner_manager, shard_path_list) on the shards of path_list
+        concurrently, and merge the results by path"""
+        shard_path_dict = {}
+        for path in path_list:
+            shard_path_dict.setdefault(self._get_shard_index(path), []).append(path)
+        result = {}
+        for shard_result in self.executor.map(
+            lambda item: func(self._get_shard_by_index(item[0])[0], item[1]),
+            shard_path_dict.items(),
+        ):
+            result |= shard_result
+        return {path: result[path] for path in path_list}
+
+    def send_input_runner_list(
+        self, path_list: list[str], data: bytes
+    ) -> dict[str, int or str]:
+        return self._map_path_list(
+            path_list,
+            lambda runner_manager, shard_path_list: (
+                runner_manager.send_input_runner_list(shard_path_list, data)
+            ),
+        )
+
+    def stop_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        return self._map_path_list(
+            path_list,
+            lambda runner_manager, shard_path_list: runner_manager.stop_runner_list(
+                shard_path_list
+            ),
+        )
+
+    def freeze_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        return self._map_path_list(
+            path_list,
+            lambda runner_manager, shard_path_list: runner_manager.freeze_runner_list(
+                shard_path_list
+            ),
+        )
+
+    def thaw_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        return self._map_path_list(
+            path_list,
+            lambda runner_manager, shard_path_list: runner_manager.thaw_runner_list(
+                shard_path_list
+            ),
+        )
+
+    def explain_runner_config(self, path: str) -> dict[str, any]:
+        return self._get_shard(path).explain_runner_config(path)
+
+    def get_instance_path_list(self, template_path: str) -> list[str]:
+        return self._get_shard(template_path).get_instance_path_list(template_path)
+
+    def scale_runner(self, template_path: str, instance_num: int) -> dict[str, list]:
+        return self._get_shard(template_path).scale_runner(template_path, instance_num)
+
+    def restart_instances(
+        self, template_path: str, batch_size: int = 1, strategy: str = None
+    ) -> dict[str, list[str]]:
+        return self._get_shard(template_path).restart_instances(
+            template_path, batch_size, strategy
+        )
+
+    def get_runner_status_dict(self) -> dict[str, list[str]]:
+        status_dict = {}
+        for shard_status_dict in self._map_shards(
+            lambda runner_manager, utils: runner_manager.get_runner_status_dict()
+        ):
+            status_dict |= shard_status_dict
+        return dict(sorted(status_dict.items()))
+
+    def _select(self, selector: str, kind: str) -> list[str]:
+        path_set = set()
+        for path_list in self._map_shards(
+            lambda runner_manager, utils: runner_manager.select_runner_path_list(
+                [selector], kind
+            )
+        ):
+            path_set.update(path_list)
+        return sorted(path_set)
+
+    def select_runner_path_list(
+        self, selector_list: list[str], kind: str = None
+    ) -> list[str]:
+        # fall back across all shards, not within each of them
+        if kind:
+            return self._select(selector_list[0], kind)
+        if len(selector_list) > 1:
+            return [
+                path
+                for selector in selector_list
+                for path in self._select(selector, "children")
+            ]
+        for kind in ("name", "glob", "substring"):
+            path_list = self._select(selector_list[0], kind)
+            if path_list:
+                return path_list
+        return []
+
+    def clean_runner(self) -> list[str]:
+        return sorted(
+            path
+            for path_list in self._map_shards(
+                lambda runner_manager, utils: runner_manager.clean_runner()
+            )
+            for path in path_list
+        )
+
+    def rolling_restart(
+        self,
+        path_list: list[str],
+        batch_size: int = 1,
+        pause: float = 0,
+        strategy: str = None,
+    ) -> dict[str, list[str]]:
+        """Batches span shards, each shard restarts its part of a batch"""
+        if batch_size < 1:
+            raise RunnerManagerError(f"Invalid batch size {batch_size}")
+        result = {"restarted": [], "failed": [], "skipped": []}
+        for i in range(0, len(path_list), batch_size):
+            if result["failed"]:
+                result["skipped"].extend(path_list[i:])
+                break
+            if i and pause > 0:
+                sleep(pause)
+            batch_dict = {}
+            for path in path_list[i : i + batch_size]:
+                batch_dict.setdefault(self._get_shard_index(path), []).append(path)
+            for batch_result in self.executor.map(
+                lambda item: self._get_shard_by_index(item[0])[0].rolling_restart(
+                    item[1], len(item[1]), 0, strategy
+                ),
+                batch_dict.items(),
+            ):
+                for key in result:
+                    result[key].extend(batch_result[key])
+        return result
+
+    def get_status_histogram(self) -> dict[str, dict[str, any]]:
+        return {
+            f"shard{i}": histogram
+            for i, histogram in enumerate(
+                self._map_shards(
+                    lambda runner_manager, utils: utils.get_status_histogram()
+                )
+            )
+        }
+
+    def get_instrumentation_stats(self) -> dict[str, dict[str, any]]:
+        return {
+            f"shard{i}": stats
+            for i, stats in enumerate(
+                self._map_shards(
+                    lambda runner_manager, utils: utils.get_instrumentation_stats()
+                )
+            )
+        }
@@ -0,0 +1,139 @@
+import logging
+import os
+import signal
+import subprocess
+from time import monotonic, sleep
+
+POPEN = "popen"
+POSIX_SPAWN = "posix_spawn"
+
+# posix_spawn has no chdir file action, so change directory in a tiny shell
+# and exec the real program, the pid stays the same. The extra exec halves
+# the spawn rate, and CPython's Popen uses vfork already, so popen remains
+# the default backend.
+_chdir_trampoline = ["/bin/sh", "-c", 'cd -- "$0" || exit 127; exec "$@"']
+
+# return code of a child reaped by another waiter, its exit status is lost;
+# below every -signal, see get_known_returncode
+LOST_RETURNCODE = -256
+
+
+# same as the restore_signals of subprocess.Popen
+_default_signals = [
+    getattr(signal, name)
+    for name in ["SIGPIPE", "SIGXFZ", "SIGXFSZ"]
+    if hasattr(signal, name)
+]
+
+
+def get_known_returncode(returncode: int or None) -> int or None:
+    """None for LOST_RETURNCODE, so an unknown exit is not taken as a success"""
+    return None if returncode == LOST_RETURNCODE else returncode
+
+
+def is_posix_spawn_supported() -> bool:
+    return hasattr(os, "posix_spawn") and os.path.exists(_chdir_trampoline[0])
+
+
+class SpawnedProcess:
+    """Minimal subprocess.Popen compatible handle of a posix_spawn'ed child"""
+
+    def __init__(self, args: list[str], pid: int):
+        self.args = args
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self) -> int or None:
+        if self.returncode is None:
+            try:
+                pid, wait_status = os.waitpid(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                self._lose_returncode()
+                return self.returncode
+            if pid == self.pid:
+                self.returncode = os.waitstatus_to_exitcode(wait_status)
+        return self.returncode
+
+    def wait(self, timeout: float = None) -> int:
+        if timeout is None:
+            if self.returncode is None:
+                try:
+                    _, wait_status = os.waitpid(self.pid, 0)
+                    self.returncode = os.waitstatus_to_exitcode(wait_status)
+                except ChildProcessError:
+                    self._lose_returncode()
+            return self.returncode
+        end_time = monotonic() + timeout
+        delay = 0.0005
+        while self.poll() is None:
+            remaining = end_time - monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            delay = min(delay * 2, remaining, 0.05)
+            sleep(delay)
+        return self.returncode
+
+    def _lose_returncode(self):
+        logging.warning(
+            f"Process {self.pid} was reaped by another waiter, its exit status is lost"
+        )
+        self.returncode = LOST_RETURNCODE
+
+    def send_signal(self, sig: int):
+        if self.poll() is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+def posix_spawn(
+    args: list[str], cwd: str, stdin, stdout, stderr, env: dict[str, str]
+) -> SpawnedProcess:
+    file_actions = [
+        (os.POSIX_SPAWN_DUP2, stdin.fileno(), 0),
+        (os.POSIX_SPAWN_DUP2, stdout.fileno(), 1),
+        (os.POSIX_SPAWN_DUP2, stderr.fileno(), 2),
+    ]
+    spawn_args = args
+    if os.path.realpath(cwd) != os.getcwd():
+        spawn_args = [*_chdir_trampoline, cwd, *args]
+    pid = os.posix_spawn(
+        spawn_args[0],
+        spawn_args,
+        env,
+        file_actions=file_actions,
+        setsigdef=_default_signals,
+        setsid=True,
+    )
+    return SpawnedProcess(args, pid)
+
+
+def spawn(
+    args: list[str],
+    cwd: str,
+    stdin,
+    stdout,
+    stderr,
+    env: dict[str, str],
+    backend: str = POPEN,
+):
+    """Start a child process with the given backend, return a Popen like object
+
+    The child leads a new session, so its process group can be signaled as a
+    whole.
+    """
+    if backend == POSIX_SPAWN:
+        return posix_spawn(args, cwd, stdin, stdout, stderr, env)
+    return subprocess.Popen(
+        args,
+        cwd=cwd,
+        stdin=stdin,
+        stdout=stdout,
+        stderr=stderr,
+        env=env,
+        start_new_session=True,
+    )
@@ -0,0 +1,68 @@
+from threading import Lock
+
+
+class DurationHistogram:
+    """Log2 bucketed histograms of durations, one per key"""
+
+    def __init__(self, min_bound: float = 0.001, bucket_num: int = 24):
+        # upper bounds in seconds, by default from 1ms doubling up to 2.3 hours
+        self.bucket_bound_list = [min_bound * 2**i for i in range(bucket_num)]
+        self._lock = Lock()
+        self.bucket_dict: dict[any, list[int]] = {}
+        self.sum_dict: dict[any, float] = {}
+
+    def _find_bucket(self, duration: float) -> int:
+        for i, bound in enumerate(self.bucket_bound_list):
+            if duration <= bound:
+                return i
+        return len(self.bucket_bound_list)
+
+    def observe(self, key: any, duration: float):
+        with self._lock:
+            bucket_list = self.bucket_dict.get(key)
+            if bucket_list is None:
+                bucket_list = [0] * (len(self.bucket_bound_list) + 1)
+                self.bucket_dict[key] = bucket_list
+                self.sum_dict[key] = 0.0
+            bucket_list[self._find_bucket(duration)] += 1
+            self.sum_dict[key] += duration
+
+    def _get_quantile(
+        self, bucket_list: list[int], count: int, quantile: float
+    ) -> float or None:
+        """Upper bound of the bucket of the quantile, None above the last bound"""
+        rank = count * quantile
+        seen = 0
+        for i, bucket_count in enumerate(bucket_list):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                if i < len(self.bucket_bound_list):
+                    return self.bucket_bound_list[i]
+                # JSON has no infinity
+                return None
+        return 0.0
+
+    def to_dict(self) -> dict[str, dict[str, any]]:
+        result = {}
+        with self._lock:
+            for key, bucket_list in sorted(self.bucket_dict.items()):
+                count = sum(bucket_list)
+                result[str(key)] = {
+                    "count": count,
+                    "sum": self.sum_dict[key],
+                    "p50": self._get_quantile(bucket_list, count, 0.5),
+                    "p90": self._get_quantile(bucket_list, count, 0.9),
+                    "p99": self._get_quantile(bucket_list, count, 0.99),
+                    "buckets": {
+                        f"{bound:g}": bucket_count
+                        for bound, bucket_count in zip(
+                            self.bucket_bound_list + [float("inf")], bucket_list
+                        )
+                        if bucket_count
+                    },
+                }
+        return result
+
+
+class StatusDurationHistogram(DurationHistogram):
+    """Manager-wide histograms of the time runners spend in each status"""
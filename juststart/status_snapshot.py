@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import mmap
+import os
+import struct
+import threading
+from concurrent.futures import Executor
+from pathlib import Path
+from time import sleep, time
+from typing import Callable
+
+SNAPSHOT_FILE_NAME = "status.snapshot"
+# the snapshot of an unsharded daemon and those of shards, status.<index>.snapshot
+_SNAPSHOT_GLOB = "status*.snapshot"
+_MAGIC = b"JSTS"
+_FORMAT_VERSION = 1
+# magic, format version, sequence, daemon pid, data length, publish time
+_header = struct.Struct("<4sIQQQd")
+_sequence = struct.Struct("<Q")
+_SEQUENCE_OFFSET = 8
+_MIN_FILE_SIZE = 64 * 1024
+
+
+class StatusSnapshotWriter:
+    """Publish the status table of the daemon in a memory mapped file
+
+    Rows are kept serialized; a change only serializes the changed rows
+    again and the table is written at most once per delay. Writes follow a
+    seqlock: the sequence is odd while the data changes, so a reader that
+    saw the same even sequence before and after copying has a consistent
+    snapshot.
+
+    Flushes are timed by loop and run in executor if given, as get_row_dict
+    may block.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        loop: asyncio.AbstractEventLoop,
+        get_row_dict: Callable[[list[str]], dict[str, dict or None]],
+        delay: float = 0.05,
+        executor: Executor = None,
+    ):
+        self.path = path
+        self.loop = loop
+        self.get_row_dict = get_row_dict
+        self.delay = delay
+        self.executor = executor
+        self.row_dict: dict[str, dict] = {}
+        self._row_json_dict: dict[str, str] = {}
+        self._dirty_path_set: set[str] = set()
+        self._lock = threading.Lock()
+        # one flush at a time, and none once closed
+        self._flush_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._seq = 0
+        # rows hold args and status data, readable by the daemon user only
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        # a snapshot left by an older daemon keeps its mode otherwise
+        os.fchmod(self._fd, 0o600)
+        self._size = _MIN_FILE_SIZE
+        os.ftruncate(self._fd, self._size)
+        self._mmap = mmap.mmap(self._fd, self._size)
+        self._write(b"{}")
+
+    def mark_dirty(self, path_list: list[str]):
+        """Queue rows to be refreshed, may be called from any thread"""
+        with self._lock:
+            self._dirty_path_set.update(path_list)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.loop.call_soon_threadsafe(
+            self.loop.call_later, self.delay, self._start_flush
+        )
+
+    def _start_flush(self):
+        if self.executor is None:
+            self.flush()
+        elif self._mmap is not None:
+            self.loop.run_in_executor(self.executor, self.flush)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                path_list = list(self._dirty_path_set)
+                self._dirty_path_set.clear()
+                self._flush_scheduled = False
+            if self._mmap is None:
+                return
+            for path, row in self.get_row_dict(path_list).items():
+                if row is None:
+                    self.row_dict.pop(path, None)
+                    self._row_json_dict.pop(path, None)
+                else:
+                    self.row_dict[path] = row
+                    self._row_json_dict[path] = json.dumps(row, default=str)
+            data = ",".join(
+                f"{json.dumps(path)}:{row_json}"
+                for path, row_json in self._row_json_dict.items()
+            )
+            self._write(f"{{{data}}}".encode())
+
+    def _write(self, data: bytes):
+        _sequence.pack_into(self._mmap, _SEQUENCE_OFFSET, self._seq + 1)
+        size = _header.size + len(data)
+        if size > self._size:
+            self._size = max(size * 2, _MIN_FILE_SIZE)
+            os.ftruncate(self._fd, self._size)
+            self._mmap.resize(self._size)
+        self._mmap[_header.size : size] = data
+        self._seq += 2
+        _header.pack_into(
+            self._mmap,
+            0,
+            _MAGIC,
+            _FORMAT_VERSION,
+            self._seq - 1,
+            os.getpid(),
+            len(data),
+            time(),
+        )
+        _sequence.pack_into(self._mmap, _SEQUENCE_OFFSET, self._seq)
+
+    def close(self):
+        with self._flush_lock:
+            if self._mmap is None:
+                return
+            self._mmap.close()
+            self._mmap = None
+            os.close(self._fd)
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_status_snapshot(path: str, retry_num: int = 100) -> dict[str, any] or None:
+    """Return {"pid", "time", "runners"} or None if there is no live snapshot"""
+    try:
+        with open(path, "rb") as f:
+            snapshot_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+    with snapshot_mmap:
+        for _ in range(retry_num):
+            magic, version, seq, pid, length, publish_time = _header.unpack_from(
+                snapshot_mmap, 0
+            )
+            if magic != _MAGIC or version != _FORMAT_VERSION:
+                return None
+            if _header.size + length > len(snapshot_mmap):
+                # grown since it was mapped
+                return read_status_snapshot(path, retry_num - 1)
+            if seq % 2:
+                sleep(0.001)
+                continue
+            data = snapshot_mmap[_header.size : _header.size + length]
+            if _sequence.unpack_from(snapshot_mmap, _SEQUENCE_OFFSET)[0] != seq:
+                continue
+            if not _is_process_alive(pid):
+                return None
+            return {"pid": pid, "time": publish_time, "runners": json.loads(data)}
+    return None
+
+
+def get_status_snapshot_path(tmp_dir_path: str, shard_index: int = None) -> str:
+    if shard_index is None:
+        return str(Path(tmp_dir_path) / SNAPSHOT_FILE_NAME)
+    return str(Path(tmp_dir_path) / f"status.{shard_index}.snapshot")
+
+
+def remove_status_snapshots(tmp_dir_path: str):
+    """Remove the snapshots left by a daemon that did not exit cleanly"""
+    for path in Path(tmp_dir_path).glob(_SNAPSHOT_GLOB):
+        path.unlink(missing_ok=True)
+
+
+def read_status_snapshot_dir(tmp_dir_path: str) -> dict[str, any] or None:
+    """Merge the snapshots of a daemon and of its shards
+
+    None if there is none, or if any of them is not live, since the runners
+    of that shard would be missing.
+    """
+    runner_dict = {}
+    path_list = sorted(Path(tmp_dir_path).glob(_SNAPSHOT_GLOB))
+    if not path_list:
+        return None
+    for path in path_list:
+        snapshot = read_status_snapshot(str(path))
+        if snapshot is None:
+            return None
+        runner_dict |= snapshot["runners"]
+    return {"runners": runner_dict}
@@ -0,0 +1,58 @@
+"""Named pipes as stdin of runners, written by the daemon without blocking
+
+The daemon keeps the pipe open for reading and writing, so the process
+never reads end of file while the daemon runs, and writes fail with
+BlockingIOError instead of blocking when the process does not read. Writes
+of at most PIPE_BUF bytes are atomic, the process never reads a part of one.
+"""
+
+from __future__ import annotations
+
+import os
+import select
+import stat
+from pathlib import Path
+from typing import BinaryIO
+
+
+def make_stdin_pipe(path: str):
+    """Create the named pipe at path, replacing a regular stdin file"""
+    try:
+        if stat.S_ISFIFO(os.stat(path).st_mode):
+            return
+        os.unlink(path)
+    except FileNotFoundError:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+    os.mkfifo(path, 0o600)
+
+
+def open_stdin_pipe(path: str) -> tuple[BinaryIO, int]:
+    """Return the blocking read end given to the process, and the write fd"""
+    make_stdin_pipe(path)
+    # a FIFO opened for reading and writing does not wait for a peer
+    write_fd = os.open(path, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+    read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+    os.set_blocking(read_fd, True)
+    return os.fdopen(read_fd, "rb", buffering=0), write_fd
+
+
+# bytes a write to a pipe is atomic up to, 4096 on Linux
+MAX_STDIN_WRITE_SIZE = select.PIPE_BUF
+
+
+def write_stdin_pipe(write_fd: int, data: bytes) -> int:
+    """Write all of data or nothing without blocking, return len(data)
+
+    Raise ValueError if data is larger than MAX_STDIN_WRITE_SIZE, and
+    BlockingIOError if the pipe has no room for it.
+    """
+    if len(data) > MAX_STDIN_WRITE_SIZE:
+        raise ValueError(
+            f"{len(data)} bytes is more than the {MAX_STDIN_WRITE_SIZE} bytes"
+            " written at once to a pipe"
+        )
+    written = os.write(write_fd, data)
+    if written != len(data):
+        # not for a pipe, but a short write would truncate the line
+        raise BlockingIOError(f"Wrote {written} of {len(data)} bytes")
+    return written
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import random
+import threading
+from datetime import datetime, timedelta
+from itertools import count
+from time import time
+from typing import Callable
+
+from .utils import parse_duration
+
+_cron_alias_dict = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+}
+
+# (min, max) of minute, hour, day of month, month, day of week
+_cron_range_list = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+class IntervalSchedule:
+    def __init__(self, interval: float):
+        if interval <= 0:
+            raise ValueError(f"Interval must be positive: {interval}")
+        self.interval = interval
+
+    def next_time(self, after: float) -> float:
+        return after + self.interval
+
+
+class CronSchedule:
+    """Five field cron expression, in local time
+
+    Fields support *, a-b, a,b and /step. Like cron, when both day of month
+    and day of week are restricted, a day matching either of them fires.
+    """
+
+    def __init__(self, expression: str):
+        field_list = expression.split()
+        if len(field_list) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        self.minute_set, self.hour_set, self.day_set, self.month_set, weekday_set = [
+            self._parse_field(field, *value_range)
+            for field, value_range in zip(field_list, _cron_range_list)
+        ]
+        # cron weekday: 0 and 7 are Sunday, datetime.weekday(): 6 is Sunday
+        self.weekday_set = {(weekday - 1) % 7 for weekday in weekday_set}
+        self.day_restricted = field_list[2] != "*"
+        self.weekday_restricted = field_list[4] != "*"
+
+    @staticmethod
+    def _parse_field(field: str, min_value: int, max_value: int) -> set[int]:
+        value_set = set()
+        for part in field.split(","):
+            value_range, _, step = part.partition("/")
+            step = int(step) if step else 1
+            if value_range == "*":
+                start, end = min_value, max_value
+            elif "-" in value_range:
+                start, end = map(int, value_range.split("-", 1))
+            else:
+                start = end = int(value_range)
+            if step < 1 or start < min_value or end > max_value or start > end:
+                raise ValueError(f"Invalid cron field: {field}")
+            value_set.update(range(start, end + 1, step))
+        return value_set
+
+    def _match_day(self, date: datetime) -> bool:
+        day_match = date.day in self.day_set
+        weekday_match = date.weekday() in self.weekday_set
+        if self.day_restricted and self.weekday_restricted:
+            return day_match or weekday_match
+        return day_match and weekday_match
+
+    def next_time(self, after: float) -> float:
+        date = datetime.fromtimestamp(after).replace(second=0, microsecond=0)
+        date += timedelta(minutes=1)
+        # skip whole days and hours first, at most a few years are walked
+        end_date = date + timedelta(days=366 * 5)
+        while date < end_date:
+            if date.month not in self.month_set or not self._match_day(date):
+                date = date.replace(hour=0, minute=0) + timedelta(days=1)
+            elif date.hour not in self.hour_set:
+                date = date.replace(minute=0) + timedelta(hours=1)
+            elif date.minute not in self.minute_set:
+                date += timedelta(minutes=1)
+            else:
+                return date.timestamp()
+        raise ValueError("Cron expression never fires")
+
+
+def parse_schedule(value: str) -> IntervalSchedule or CronSchedule:
+    """Parse an interval (30s, 5m, every 2h) or a cron expression (@daily)"""
+    value = value.strip()
+    value = _cron_alias_dict.get(value, value)
+    if value.startswith("every "):
+        value = value[len("every ") :]
+    if len(value.split()) == 5:
+        schedule = CronSchedule(value)
+        # fail now for expressions like "0 0 31 2 *"
+        schedule.next_time(time())
+        return schedule
+    return IntervalSchedule(parse_duration(value))
+
+
+def check_schedule(value: str) -> str:
+    parse_schedule(value)
+    return value.strip()
+
+
+class TimerHeap:
+    """Fire the timers of all scheduled runners from one heap
+
+    Only the earliest firing time is armed on the event loop, so idle timers
+    cost a heap entry each. Cancelled entries are dropped lazily when they
+    reach the top. schedule and cancel may be called from any thread.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, fire: Callable[[str], None]):
+        self.loop = loop
+        self.fire = fire
+        self._lock = threading.Lock()
+        self._heap: list[list] = []
+        # path -> [fire_time, seq, path, schedule, jitter, planned_time],
+        # path is None if cancelled
+        self._entry_dict: dict[str, list] = {}
+        self._seq = count()
+        self._handle: asyncio.TimerHandle = None
+        self._handle_time: float = None
+
+    def _push(self, path: str, schedule, jitter: float, after: float) -> float:
+        planned_time = schedule.next_time(after)
+        now = time()
+        if planned_time <= now:
+            # firings missed while the daemon was busy or suspended are skipped
+            planned_time = schedule.next_time(now)
+        fire_time = planned_time + random.uniform(0, jitter) if jitter else planned_time
+        entry = [fire_time, next(self._seq), path, schedule, jitter, planned_time]
+        self._entry_dict[path] = entry
+        heapq.heappush(self._heap, entry)
+        return fire_time
+
+    def _pop_entry(self, path: str) -> bool:
+        entry = self._entry_dict.pop(path, None)
+        if entry is None:
+            return False
+        entry[2] = None
+        return True
+
+    def schedule(self, path: str, schedule, jitter: float = None) -> float:
+        """(Re)schedule a runner, return its next firing time"""
+        with self._lock:
+            self._pop_entry(path)
+            fire_time = self._push(path, schedule, jitter, time())
+        self.loop.call_soon_threadsafe(self._arm)
+        return fire_time
+
+    def cancel(self, path: str) -> bool:
+        with self._lock:
+            return self._pop_entry(path)
+
+    def get_next_time(self, path: str) -> float or None:
+        entry = self._entry_dict.get(path)
+        return entry[0] if entry else None
+
+    def __len__(self) -> int:
+        return len(self._entry_dict)
+
+    def _arm(self):
+        with self._lock:
+            while self._heap and self._heap[0][2] is None:
+                heapq.heappop(self._heap)
+            fire_time = self._heap[0][0] if self._heap else None
+        if fire_time == self._handle_time:
+            return
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        self._handle_time = fire_time
+        if fire_time is not None:
+            self._handle = self.loop.call_at(
+                self.loop.time() + max(fire_time - time(), 0), self._on_timer
+            )
+
+    def _on_timer(self):
+        self._handle = None
+        self._handle_time = None
+        path_list = []
+        now = time()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, path, schedule, jitter, planned_time = heapq.heappop(self._heap)
+                if path is None:
+                    continue
+                # count from the planned time, so neither jitter nor lag drifts
+                self._push(path, schedule, jitter, planned_time)
+                path_list.append(path)
+        for path in path_list:
+            self.fire(path)
+        self._arm()
@@ -1,15 +1,57 @@
+import asyncio
+import shutil
 from pathlib import Path
 
 from .path_utils import is_parent_dir
 
 
 def delete_directory_and_empty_parents(directory: Path, stop_directory: Path):
-    if (
-        not is_parent_dir(directory, stop_directory)
-        or directory == stop_directory
-    ):
+    """Delete directory with its content, then its parents left empty
+
+    Only directories below stop_directory are deleted, never itself.
+    """
+    if directory == stop_directory or not is_parent_dir(stop_directory, directory):
         return
-    directory.unlink()
+    shutil.rmtree(directory, ignore_errors=True)
     parent_dir = directory.parent
-    if not any(parent_dir.iterdir()):
+    if parent_dir.is_dir() and not any(parent_dir.iterdir()):
         delete_directory_and_empty_parents(parent_dir, stop_directory)
+
+
+_size_unit_dict = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def parse_size(size: str) -> int:
+    """Parse a human readable size (e.g. 512M, 2G, 4096) to bytes"""
+    size = size.strip().lower().removesuffix("b")
+    unit = size[-1:] if size[-1:].isalpha() else ""
+    if unit not in _size_unit_dict:
+        raise ValueError(f"Unknown size unit {unit}")
+    return int(float(size[: len(size) - len(unit)]) * _size_unit_dict[unit])
+
+
+_duration_unit_dict = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(duration: str) -> float:
+    """Parse a duration (e.g. 90, 90s, 5m, 2h, 1d) to seconds"""
+    duration = duration.strip().lower()
+    unit = _duration_unit_dict.get(duration[-1:])
+    if unit is not None:
+        duration = duration[:-1]
+    return float(duration) * (unit or 1)
+
+
+def parse_bool(value: str) -> bool:
+    value = value.strip().lower()
+    if value in ["1", "true", "yes", "on"]:
+        return True
+    if value in ["0", "false", "no", "off"]:
+        return False
+    raise ValueError(f"Invalid boolean {value}")
+
+
+async def cancel_all_tasks():
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    [task.cancel() for task in tasks]
+    await asyncio.gather(*tasks, return_exceptions=True)
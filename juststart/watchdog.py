@@ -0,0 +1,80 @@
+import os
+from dataclasses import dataclass
+
+_proc_path = "/proc"
+
+
+@dataclass
+class ProcessUsage:
+    rss: int
+    cpu_time: float
+
+
+def is_supported() -> bool:
+    return os.path.isdir(_proc_path) and hasattr(os, "sysconf")
+
+
+def _read_proc_stat(pid: str) -> tuple[int, int, float] or None:
+    """Return (ppid, rss in pages, cpu ticks) of a /proc/<pid>/stat file"""
+    try:
+        with open(f"{_proc_path}/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # the command name may contain spaces or brackets, skip it by last ")"
+    fields = stat[stat.rindex(b")") + 2 :].split()
+    # fields[0] is the 3rd field (state) of proc(5)
+    ppid = int(fields[1])
+    cpu_ticks = int(fields[11]) + int(fields[12])
+    rss = int(fields[21])
+    return ppid, rss, cpu_ticks
+
+
+def sweep_process_usage(pid_list: list[int]) -> dict[int, ProcessUsage]:
+    """Read /proc once and sum the usage of every pid with all its descendants"""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    stat_dict = {}
+    children_dict = {}
+    for name in os.listdir(_proc_path):
+        if not name.isdigit():
+            continue
+        stat = _read_proc_stat(name)
+        if stat is None:
+            continue
+        pid = int(name)
+        stat_dict[pid] = stat
+        children_dict.setdefault(stat[0], []).append(pid)
+
+    usage_dict = {}
+    for pid in pid_list:
+        if pid not in stat_dict:
+            continue
+        rss = 0
+        cpu_ticks = 0
+        pending = [pid]
+        while pending:
+            child_pid = pending.pop()
+            _, child_rss, child_cpu_ticks = stat_dict[child_pid]
+            rss += child_rss
+            cpu_ticks += child_cpu_ticks
+            pending.extend(children_dict.get(child_pid, []))
+        usage_dict[pid] = ProcessUsage(
+            rss=rss * page_size, cpu_time=cpu_ticks / clock_ticks
+        )
+    return usage_dict
+
+
+def check_usage_limit(
+    usage: ProcessUsage, max_rss: int = None, max_cpu_time: float = None
+) -> dict[str, any] or None:
+    """Return the exceeded budget as status data, None if the usage is fine"""
+    if max_rss and usage.rss > max_rss:
+        return {"reason": "max_rss", "rss": usage.rss, "max_rss": max_rss}
+    if max_cpu_time and usage.cpu_time > max_cpu_time:
+        return {
+            "reason": "max_cpu_time",
+            "cpu_time": usage.cpu_time,
+            "max_cpu_time": max_cpu_time,
+        }
+    return None
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+
+from juststart.admission import (
+    BATCH,
+    CRITICAL,
+    NORMAL,
+    AdmissionController,
+    HostPressure,
+)
+
+
+class AdmissionControllerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.pressure = HostPressure(cpu=0, memory=0, load=0, mem_available=50)
+        self.admission = AdmissionController(
+            cpu_pressure=50,
+            min_mem_available=10,
+            interval=0.01,
+            max_wait=5,
+            read_pressure=lambda: self.pressure,
+        )
+        self.order = []
+
+    async def _admit(self, name: str, priority_class: str):
+        await self.admission.admit(priority_class)
+        self.order.append(name)
+
+    def test_get_overload(self):
+        self.assertIsNone(self.admission.get_overload())
+        self.pressure = HostPressure(cpu=60, memory=0, load=0, mem_available=50)
+        self.admission._pressure = None
+        self.assertIn("cpu pressure", self.admission.get_overload())
+        self.pressure = HostPressure(cpu=0, memory=0, load=0, mem_available=5)
+        self.admission._pressure = None
+        self.assertIn("memory available", self.admission.get_overload())
+
+    def test_disabled_without_thresholds(self):
+        self.assertFalse(AdmissionController().enabled)
+        self.assertIsNone(AdmissionController().get_overload())
+
+    async def test_admits_at_once_without_pressure(self):
+        self.assertEqual(await self.admission.admit(NORMAL), 0)
+        self.assertEqual(self.admission.get_stats()["delayed"], 0)
+
+    async def test_admits_critical_under_pressure(self):
+        self.pressure = HostPressure(cpu=90, memory=0, load=0, mem_available=50)
+        self.assertEqual(await self.admission.admit(CRITICAL), 0)
+
+    async def test_admits_normal_before_batch(self):
+        self.pressure = HostPressure(cpu=90, memory=0, load=0, mem_available=50)
+        task_list = [
+            asyncio.create_task(self._admit("batch", BATCH)),
+            asyncio.create_task(self._admit("normal1", NORMAL)),
+            asyncio.create_task(self._admit("normal2", NORMAL)),
+        ]
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.order, [])
+        self.assertEqual(self.admission.get_stats()["waiting"], 3)
+        self.pressure = HostPressure(cpu=0, memory=0, load=0, mem_available=50)
+        await asyncio.wait_for(asyncio.gather(*task_list), 5)
+        self.assertEqual(self.order, ["normal1", "normal2", "batch"])
+        self.assertEqual(self.admission.get_stats()["delayed"], 3)
+
+    async def test_queues_behind_waiting_starts(self):
+        self.pressure = HostPressure(cpu=90, memory=0, load=0, mem_available=50)
+        first = asyncio.create_task(self._admit("first", NORMAL))
+        await asyncio.sleep(0.02)
+        self.pressure = HostPressure(cpu=0, memory=0, load=0, mem_available=50)
+        # no pressure, but a start is still waiting
+        second = asyncio.create_task(self._admit("second", NORMAL))
+        await asyncio.wait_for(asyncio.gather(first, second), 5)
+        self.assertEqual(self.order, ["first", "second"])
+
+    async def test_forces_admission_after_max_wait(self):
+        self.admission.max_wait = 0.05
+        self.pressure = HostPressure(cpu=90, memory=0, load=0, mem_available=50)
+        waited = await asyncio.wait_for(self.admission.admit(NORMAL), 5)
+        self.assertGreaterEqual(waited, 0.05)
+        self.assertEqual(self.admission.get_stats()["forced"], 1)
+
+    async def test_cancelled_waiter_wakes_the_next(self):
+        self.pressure = HostPressure(cpu=90, memory=0, load=0, mem_available=50)
+        first = asyncio.create_task(self._admit("first", NORMAL))
+        second = asyncio.create_task(self._admit("second", NORMAL))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        self.pressure = HostPressure(cpu=0, memory=0, load=0, mem_available=50)
+        await asyncio.wait_for(second, 5)
+        self.assertEqual(self.order, ["second"])
+        self.assertEqual(self.admission.get_stats()["waiting"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
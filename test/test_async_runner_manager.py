@@ -0,0 +1,98 @@
+import asyncio
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from juststart.async_runner_manager import AsyncRunnerManager
+from juststart.errors import RunnerError
+from juststart.runner_status import DESTROYED, RUNNING
+
+
+class AsyncRunnerManagerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        (self.tmp_dir / "default").mkdir()
+        (self.tmp_dir / "tmp").mkdir()
+        service_dir = self.tmp_dir / "service" / "web"
+        service_dir.mkdir(parents=True)
+        self.path = str(service_dir / "run")
+        Path(self.path).write_text("#!/bin/sh\nexec sleep 30\n")
+        Path(self.path).chmod(0o755)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _create_manager(self) -> AsyncRunnerManager:
+        return AsyncRunnerManager(
+            str(self.tmp_dir / "runner.list"),
+            str(self.tmp_dir / "default"),
+            str(self.tmp_dir / "tmp"),
+        )
+
+    async def _next_event(self, event_iter, key: str):
+        async for event in event_iter:
+            if event.path == self.path and event.key == str(key):
+                return event
+
+    async def test_supervises_on_the_running_loop(self):
+        thread_set = set(threading.enumerate())
+        async with self._create_manager() as manager:
+            self.assertIs(manager.loop, asyncio.get_running_loop())
+            event_iter = manager.events()
+            runner = await manager.start(self.path)
+            self.assertIs(manager.get_runner(self.path), runner)
+            self.assertTrue(await manager.wait_ready(self.path, timeout=10))
+            self.assertTrue(runner.is_running())
+            await asyncio.wait_for(self._next_event(event_iter, RUNNING), 5)
+            # no loop thread, only the executor of blocking steps
+            self.assertFalse(
+                [
+                    thread
+                    for thread in set(threading.enumerate()) - thread_set
+                    if not thread.name.startswith("ThreadPoolExecutor")
+                ]
+            )
+            await manager.stop(self.path)
+            self.assertFalse(runner.is_running())
+            await asyncio.wait_for(self._next_event(event_iter, DESTROYED), 5)
+            with self.assertRaises(RunnerError):
+                manager.get_runner(self.path)
+
+    async def test_restart_and_reload(self):
+        async with self._create_manager() as manager:
+            runner = await manager.start(self.path)
+            self.assertTrue(await manager.wait_ready(self.path, timeout=10))
+            pid = runner.pid
+            await manager.restart(self.path)
+            self.assertTrue(await manager.wait_ready(self.path, timeout=10))
+            self.assertNotEqual(manager.get_runner(self.path).pid, pid)
+            await manager.reload(self.path)
+            self.assertTrue(manager.get_runner(self.path).is_running())
+
+    async def test_close_stops_the_runners_and_ends_the_events(self):
+        manager = self._create_manager()
+        await manager.open()
+        event_iter = manager.events()
+        runner = await manager.start(self.path)
+        self.assertTrue(await manager.wait_ready(self.path, timeout=10))
+        await manager.close()
+        self.assertFalse(runner.is_running())
+        key_list = [event.key async for event in event_iter]
+        self.assertEqual(key_list[-1], str(DESTROYED))
+
+    async def test_drops_the_oldest_events_of_a_slow_consumer(self):
+        manager = self._create_manager()
+        manager.event_queue_size = 1
+        async with manager:
+            event_iter = manager.events()
+            await manager.start(self.path)
+            self.assertTrue(await manager.wait_ready(self.path, timeout=10))
+            await asyncio.sleep(0)
+            self.assertGreater(manager.dropped_event_num, 0)
+            self.assertEqual((await anext(event_iter)).key, str(RUNNING))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from time import monotonic, sleep
+
+from juststart.daemon import connect_manager
+from juststart.fanout import DEFAULT_PORT, Target, load_inventory, parse_target
+
+PASSWORD = "password"
+
+
+def _get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+class ParseTargetTest(unittest.TestCase):
+    def test_parses_addresses(self):
+        for value, target in (
+            ("web1", Target("web1", DEFAULT_PORT, b"pw")),
+            ("web1:50001", Target("web1", 50001, b"pw")),
+            ("[::1]:50001", Target("::1", 50001, b"pw")),
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(parse_target(value, b"pw"), target)
+
+    def test_inventory_passwords(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            password_path = Path(tmp_dir) / "password"
+            password_path.write_bytes(b"secret")
+            inventory_path = Path(tmp_dir) / "inventory"
+            inventory_path.write_text(
+                f"# daemons\nweb1:50001\n\nweb2:50002 {password_path}\n"
+            )
+            self.assertEqual(
+                load_inventory(str(inventory_path), b"pw"),
+                [Target("web1", 50001, b"pw"), Target("web2", 50002, b"secret")],
+            )
+
+
+class FanoutDaemonTest(unittest.TestCase):
+    """Run the command line against several daemons on different ports"""
+
+    daemon_num = 3
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.port_list = [_get_free_port() for _ in range(self.daemon_num)]
+        self.process_list = []
+        for port in self.port_list:
+            config_dir = self.tmp_dir / str(port)
+            config_dir.mkdir()
+            self.process_list.append(
+                subprocess.Popen(
+                    self._get_command("--port", port, "-c", config_dir, "serve"),
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            )
+        for port in self.port_list:
+            self._wait_daemon(port)
+        self.inventory_path = self.tmp_dir / "inventory"
+        self.inventory_path.write_text(
+            "".join(f"localhost:{port}\n" for port in self.port_list)
+        )
+        service_dir = self.tmp_dir / "service"
+        service_dir.mkdir()
+        self.path = str(service_dir / "run")
+        Path(self.path).write_text("#!/bin/sh\nexec sleep 30\n")
+        Path(self.path).chmod(0o755)
+
+    def tearDown(self):
+        for process in self.process_list:
+            if process.poll() is None:
+                process.terminate()
+            process.wait(timeout=30)
+        self._tmp_dir.cleanup()
+
+    def _get_command(self, *arg_list) -> list[str]:
+        return [sys.executable, "-m", "juststart", "--password", PASSWORD] + [
+            str(arg) for arg in arg_list
+        ]
+
+    def _wait_daemon(self, port: int, timeout: float = 30):
+        end_time = monotonic() + timeout
+        while True:
+            try:
+                connect_manager("localhost", port, PASSWORD.encode())
+                return
+            except ConnectionError:
+                if monotonic() > end_time:
+                    raise
+                sleep(0.1)
+
+    def _run_fanout(self, *arg_list) -> tuple[int, dict]:
+        process = subprocess.run(
+            self._get_command("--json", "--inventory", self.inventory_path, *arg_list),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=60,
+        )
+        return process.returncode, json.loads(process.stdout)
+
+    def test_runs_the_command_on_every_daemon(self):
+        name_list = [f"localhost:{port}" for port in self.port_list]
+        self.assertEqual(
+            self._run_fanout("add", self.path),
+            (0, {name: {"result": {self.path: "ok"}} for name in name_list}),
+        )
+        self.assertEqual(
+            self._run_fanout("start", self.path),
+            (0, {name: {"result": {self.path: "ok"}} for name in name_list}),
+        )
+        returncode, result_dict = self._run_fanout("list")
+        self.assertEqual(returncode, 0)
+        self.assertEqual(list(result_dict), name_list)
+        for target_result in result_dict.values():
+            self.assertIn(self.path, target_result["result"])
+        returncode, result_dict = self._run_fanout("shutdown")
+        self.assertEqual(returncode, 0)
+        for process in self.process_list:
+            self.assertEqual(process.wait(timeout=30), 0)
+
+    def test_reports_an_unreachable_daemon(self):
+        dead_port = self.port_list[0]
+        self.process_list[0].terminate()
+        self.process_list[0].wait(timeout=30)
+        returncode, result_dict = self._run_fanout("list")
+        self.assertEqual(returncode, 1)
+        self.assertIn("error", result_dict[f"localhost:{dead_port}"])
+        for port in self.port_list[1:]:
+            self.assertEqual(result_dict[f"localhost:{port}"], {"result": {}})
+
+
+if __name__ == "__main__":
+    unittest.main()
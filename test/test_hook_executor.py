@@ -0,0 +1,117 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from juststart.hook_executor import HookExecutor, search_hook_table
+from juststart.runner_status import RUNNING, STOPPED
+
+
+class HookExecutorTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.service_dir = self.tmp_dir / "service" / "web"
+        self.service_dir.mkdir(parents=True)
+        self.path = self._create_script("run", "exec sleep 30\n")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _create_script(self, name: str, script: str, executable: bool = True) -> str:
+        script_path = self.service_dir / name
+        script_path.write_text(f"#!/bin/sh\n{script}")
+        script_path.chmod(0o755 if executable else 0o644)
+        return str(script_path)
+
+
+class SearchHookTableTest(HookExecutorTestCase):
+    def test_finds_the_executable_scripts_of_each_status(self):
+        running_hook = self._create_script("run.running", "exit 0\n")
+        self._create_script("run.stopped", "exit 0\n", executable=False)
+        self.assertEqual(search_hook_table(self.path), {"running": [running_hook]})
+
+    def test_instances_use_the_scripts_of_their_template(self):
+        running_hook = self._create_script("run.running", "exit 0\n")
+        self.assertEqual(
+            search_hook_table(f"{self.path}@1"), {"running": [running_hook]}
+        )
+
+
+class HookExecutorTest(HookExecutorTestCase):
+    async def asyncSetUp(self):
+        self.done_list = []
+        self.done_event = asyncio.Event()
+        self.executor = HookExecutor(
+            asyncio.get_running_loop(), 1, 0.5, on_done=self._on_done
+        )
+        self.worker_future = self.executor.start()
+        (self.tmp_dir / "stdout").touch()
+        self.runner = SimpleNamespace(
+            path=self.path,
+            args=["arg"],
+            env={"PATH": "/usr/bin:/bin"},
+            stdout=str(self.tmp_dir / "stdout"),
+            stderr=str(self.tmp_dir / "stdout"),
+        )
+
+    async def asyncTearDown(self):
+        self.worker_future.cancel()
+
+    def _on_done(self, job, returncode):
+        self.done_list.append((job.script_path, job.status_key, returncode))
+        self.done_event.set()
+
+    async def _wait_done(self, num: int):
+        while len(self.done_list) < num:
+            self.done_event.clear()
+            await asyncio.wait_for(self.done_event.wait(), 5)
+
+    async def test_runs_hooks_with_the_runner_in_the_environment(self):
+        hook_path = self._create_script(
+            "run.running",
+            'echo "$JUSTSTART_RUNNER_PATH $JUSTSTART_RUNNER_STATUS $1 $(pwd)"\n'
+            "exit 3\n",
+        )
+        self.executor.load_hook_table(self.path)
+        self.executor.submit(self.runner, SimpleNamespace(key=RUNNING))
+        # no hook for this status
+        self.executor.submit(self.runner, SimpleNamespace(key=STOPPED))
+        await self._wait_done(1)
+        self.assertEqual(self.done_list, [(hook_path, "running", 3)])
+        self.assertEqual(
+            (self.tmp_dir / "stdout").read_text(),
+            f"{self.path} running arg {self.service_dir}\n",
+        )
+
+    async def test_kills_hooks_that_time_out(self):
+        hook_path = self._create_script("run.running", "exec sleep 30\n")
+        self.executor.load_hook_table(self.path)
+        self.executor.submit(self.runner, SimpleNamespace(key=RUNNING))
+        await self._wait_done(1)
+        self.assertEqual(self.done_list, [(hook_path, "running", -9)])
+
+    async def test_coalesces_queued_runs_of_a_script(self):
+        hook_path = self._create_script("run.hook", 'echo "$JUSTSTART_RUNNER_STATUS"\n')
+        self.executor.load_hook_table(
+            self.path, {"running": [hook_path], "stopped": [hook_path]}
+        )
+        for key in (RUNNING, STOPPED, RUNNING, STOPPED):
+            self.executor.submit(self.runner, SimpleNamespace(key=key))
+        await self._wait_done(1)
+        await asyncio.sleep(0.2)
+        self.assertEqual(self.done_list, [(hook_path, "stopped", 0)])
+
+    async def test_skips_runners_without_hooks(self):
+        self.executor.load_hook_table(self.path)
+        self.executor.submit(self.runner, SimpleNamespace(key=RUNNING))
+        self.executor.drop_hook_table(self.path)
+        self._create_script("run.running", "exit 0\n")
+        self.executor.submit(self.runner, SimpleNamespace(key=RUNNING))
+        await asyncio.sleep(0.2)
+        self.assertEqual(self.done_list, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
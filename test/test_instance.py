@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from juststart.instance import (
+    apply_instance_overlay,
+    get_instance_path,
+    is_instance_of,
+    sort_instance_path_list,
+    split_instance_path,
+)
+from juststart.runner_config import RunnerConfig
+
+
+class InstancePathTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_split_instance_path(self):
+        path = str(self.tmp_dir / "run")
+        self.assertEqual(split_instance_path(f"{path}@3"), (path, "3"))
+        self.assertEqual(split_instance_path(f"{path}@a@b"), (f"{path}@a", "b"))
+        self.assertEqual(split_instance_path(path), (path, None))
+        for name in ("run@", "@3", "run@*"):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    split_instance_path(str(self.tmp_dir / name)),
+                    (str(self.tmp_dir / name), None),
+                )
+
+    def test_existing_script_is_not_an_instance(self):
+        path = self.tmp_dir / "run@3"
+        path.touch()
+        self.assertEqual(split_instance_path(str(path)), (str(path), None))
+
+    def test_instance_paths(self):
+        self.assertEqual(get_instance_path("/srv/run", "3"), "/srv/run@3")
+        self.assertTrue(is_instance_of("/srv/run@3", "/srv/run"))
+        self.assertFalse(is_instance_of("/srv/run2@3", "/srv/run"))
+        self.assertEqual(
+            sort_instance_path_list(["/r@b", "/r@10", "/r@a", "/r@2"]),
+            ["/r@2", "/r@10", "/r@a", "/r@b"],
+        )
+
+
+class ApplyInstanceOverlayTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.template_path = str(self.tmp_dir / "run")
+        self.std_dir = self.tmp_dir / "std"
+        self.base_config = RunnerConfig(
+            args=["--port", "80%i"],
+            env={"PATH": "/usr/bin:/bin", "NAME": "worker-%i"},
+            auto_restart=-1,
+            stdin=self.std_dir / "stdin",
+            stdout=self.std_dir / "stdout",
+            stderr="/var/log/shared",
+        )
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _apply(self, instance: str) -> RunnerConfig:
+        return apply_instance_overlay(
+            self.base_config, self.template_path, instance, self.std_dir
+        )
+
+    def test_replaces_the_placeholder_and_keeps_the_base_config(self):
+        config = self._apply("2")
+        self.assertEqual(config.args, ["--port", "802"])
+        self.assertEqual(
+            config.env,
+            {"PATH": "/usr/bin:/bin", "NAME": "worker-2", "JUSTSTART_INSTANCE": "2"},
+        )
+        self.assertEqual(config.stdin, self.tmp_dir / "std@2" / "stdin")
+        self.assertEqual(config.stdout, self.tmp_dir / "std@2" / "stdout")
+        # only the std files of the template are moved
+        self.assertEqual(config.stderr, "/var/log/shared")
+        self.assertEqual(self.base_config.args, ["--port", "80%i"])
+        self.assertEqual(self.base_config.env["NAME"], "worker-%i")
+
+    def test_applies_the_overlay_files_of_the_instance(self):
+        Path(f"{self.template_path}@2.args").write_text("debug\n-802\n")
+        Path(f"{self.template_path}@2.env").write_text("LEVEL=2\n")
+        config = self._apply("2")
+        self.assertEqual(config.args, ["--port", "debug"])
+        self.assertEqual(config.env["LEVEL"], "2")
+        self.assertEqual(config.env["JUSTSTART_INSTANCE"], "2")
+        # other instances are not affected
+        self.assertEqual(self._apply("3").args, ["--port", "803"])
+
+
+if __name__ == "__main__":
+    unittest.main()
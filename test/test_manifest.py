@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from juststart.errors import RunnerConfigError
+from juststart.manifest import MANIFEST_FILE_NAME, Manifest, ManifestStore
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.manifest_path = self.tmp_dir / MANIFEST_FILE_NAME
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _load(self, data) -> Manifest:
+        self.manifest_path.write_text(json.dumps(data))
+        return Manifest.load(str(self.manifest_path))
+
+    def test_resolves_relative_paths_and_units(self):
+        manifest = self._load(
+            {
+                "default": {"env": {"LANG": "C.UTF-8"}},
+                "runners": {
+                    "web/run": {
+                        "max_rss": "512M",
+                        "jitter": "1m",
+                        "hooks": {"stopped": ["notify"]},
+                    }
+                },
+            }
+        )
+        runner_path = str(self.tmp_dir / "web/run")
+        block = manifest.runner_dict[runner_path]
+        self.assertEqual(block["max_rss"], 512 * 1024 * 1024)
+        self.assertEqual(block["jitter"], 60)
+        self.assertEqual(block["hooks"], {"stopped": [str(self.tmp_dir / "notify")]})
+
+    def test_rejects_invalid_manifests(self):
+        for data in (
+            [],
+            {"runner": {}},
+            {"runners": []},
+            {"runners": {"run": {"unknown": 1}}},
+            {"runners": {"run": {"args": "--port"}}},
+            {"runners": {"run": {"auto_restart": "yes"}}},
+            {"runners": {"run": {"max_rss": "lots"}}},
+            {"runners": {"run": {"schedule": "0 0 31 2 *"}}},
+            {"runners": {"run": {"priority_class": "urgent"}}},
+            {"runners": {"run": {"hooks": {"unknown": ["notify"]}}}},
+            {"default": {"down_timeout": 0}},
+        ):
+            with self.subTest(data=data):
+                with self.assertRaises(RunnerConfigError):
+                    self._load(data)
+
+    def test_rejects_invalid_json(self):
+        self.manifest_path.write_text("{")
+        with self.assertRaises(RunnerConfigError):
+            Manifest.load(str(self.manifest_path))
+
+
+class ManifestStoreTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.runner_dir = self.tmp_dir / "web"
+        self.runner_dir.mkdir()
+        self.runner_path = str(self.runner_dir / "run")
+        self.host_manifest_path = self.tmp_dir / "host.json"
+        self.store = ManifestStore(str(self.host_manifest_path))
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _get_config(self):
+        return self.store.get_runner_config(
+            self.runner_path, str(self.runner_dir), str(self.tmp_dir / "tmp")
+        )
+
+    def test_undeclared_runner(self):
+        self.assertIsNone(self._get_config())
+        self.assertIsNone(self.store.get_hook_table(self.runner_path))
+
+    def test_runner_directory_wins_over_host(self):
+        self.host_manifest_path.write_text(
+            json.dumps({"runners": {self.runner_path: {"args": ["host"]}}})
+        )
+        self.assertEqual(self._get_config().args, ["host"])
+        (self.runner_dir / MANIFEST_FILE_NAME).write_text(
+            json.dumps({"runners": {"run": {"args": ["local"]}}})
+        )
+        self.assertEqual(self._get_config().args, ["local"])
+
+    def test_reads_again_on_change(self):
+        manifest_path = self.runner_dir / MANIFEST_FILE_NAME
+        manifest_path.write_text(json.dumps({"runners": {"run": {"args": ["1"]}}}))
+        self.assertEqual(self._get_config().args, ["1"])
+        manifest_path.write_text(json.dumps({"runners": {"run": {"args": ["2"]}}}))
+        stat = manifest_path.stat()
+        os.utime(manifest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(self._get_config().args, ["2"])
+
+    def test_runner_hooks_win_per_status(self):
+        (self.runner_dir / MANIFEST_FILE_NAME).write_text(
+            json.dumps(
+                {
+                    "default": {"hooks": {"stopped": ["a"], "running": ["b"]}},
+                    "runners": {"run": {"hooks": {"stopped": ["c"]}}},
+                }
+            )
+        )
+        self.assertEqual(
+            self.store.get_hook_table(self.runner_path),
+            {
+                "stopped": [str(self.runner_dir / "c")],
+                "running": [str(self.runner_dir / "b")],
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import asyncio
+import unittest
+
+from juststart.errors import RunnerManagerError
+from juststart.operation_queue import (
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    OperationQueue,
+)
+
+
+class OperationQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.queue = OperationQueue(asyncio.get_running_loop(), 1)
+        self.queue.start()
+        self.order = []
+
+    async def asyncTearDown(self):
+        await self.queue.shutdown()
+
+    async def _block(self, path: str = "/blocker/run") -> asyncio.Event:
+        """Hold the only worker until the returned event is set"""
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def wait():
+            started.set()
+            await asyncio.wait_for(release.wait(), 5)
+
+        self.queue.submit(path, wait)
+        await asyncio.wait_for(started.wait(), 5)
+        return release
+
+    def _record(self, name: str):
+        async def record():
+            self.order.append(name)
+            return name
+
+        return record
+
+    async def _result(self, future: asyncio.Future) -> any:
+        return await asyncio.wait_for(future, 5)
+
+    async def test_runs_operations_of_a_runner_in_order(self):
+        future_list = [
+            self.queue.submit("/a/run", self._record(str(i))) for i in range(5)
+        ]
+        self.assertEqual(
+            [await self._result(future) for future in future_list], list("01234")
+        )
+        self.assertEqual(self.order, list("01234"))
+
+    async def test_coalesces_the_same_key(self):
+        release = await self._block("/a/run")
+        first = self.queue.submit("/a/run", self._record("first"), ("restart",))
+        second = self.queue.submit("/a/run", self._record("second"), ("restart",))
+        release.set()
+        self.assertIs(first, second)
+        self.assertEqual(await self._result(first), "first")
+        self.assertEqual(self.order, ["first"])
+        self.assertEqual(self.queue.get_stats()["coalesced"], 1)
+
+    async def test_does_not_coalesce_without_key_or_across_keys(self):
+        release = await self._block("/a/run")
+        future_list = [
+            self.queue.submit("/a/run", self._record("start"), ("start",)),
+            self.queue.submit("/a/run", self._record("stop"), ("stop",)),
+            self.queue.submit("/a/run", self._record("none")),
+            self.queue.submit("/a/run", self._record("none")),
+        ]
+        release.set()
+        for future in future_list:
+            await self._result(future)
+        self.assertEqual(self.order, ["start", "stop", "none", "none"])
+
+    async def test_runs_higher_priority_first(self):
+        release = await self._block()
+        bulk = self.queue.submit("/a/run", self._record("bulk"), None, PRIORITY_BULK)
+        interactive = self.queue.submit(
+            "/b/run", self._record("interactive"), None, PRIORITY_INTERACTIVE
+        )
+        release.set()
+        await self._result(bulk)
+        await self._result(interactive)
+        self.assertEqual(self.order, ["interactive", "bulk"])
+
+    async def test_inherits_priority_of_a_waiting_operation(self):
+        release = await self._block()
+        first = self.queue.submit("/a/run", self._record("a1"), None, PRIORITY_BULK)
+        other = self.queue.submit("/c/run", self._record("c"), None, PRIORITY_BULK)
+        # waits behind a1, which now runs before c
+        second = self.queue.submit(
+            "/a/run", self._record("a2"), None, PRIORITY_INTERACTIVE
+        )
+        release.set()
+        for future in (first, other, second):
+            await self._result(future)
+        self.assertEqual(self.order, ["a1", "a2", "c"])
+
+    async def test_runs_nested_operations_of_the_runner_inline(self):
+        async def outer():
+            # the only worker is held by this operation
+            return await self.queue.submit("/a/run", self._record("inner"))
+
+        self.assertEqual(
+            await self._result(self.queue.submit("/a/run", outer)), "inner"
+        )
+
+    async def test_queues_nested_operations_of_other_runners(self):
+        await self.queue.shutdown()
+        self.queue = OperationQueue(asyncio.get_running_loop(), 2)
+        self.queue.start()
+        release = await self._block("/b/run")
+
+        async def outer():
+            inner = self.queue.submit("/b/run", self._record("b"))
+            await asyncio.sleep(0.1)
+            # /b/run is held by another operation
+            self.assertFalse(inner.done())
+            self.order.append("a")
+            return inner
+
+        inner = await self._result(self.queue.submit("/a/run", outer))
+        release.set()
+        self.assertEqual(await self._result(inner), "b")
+        self.assertEqual(self.order, ["a", "b"])
+
+    async def test_reports_exceptions_in_the_future(self):
+        async def fail():
+            raise ValueError("boom")
+
+        future = self.queue.submit("/a/run", fail)
+        with self.assertRaises(ValueError):
+            await self._result(future)
+        # the runner is not left busy
+        self.assertEqual(
+            await self._result(self.queue.submit("/a/run", self._record("a"))), "a"
+        )
+
+    async def test_runs_waiting_operations_before_shutdown(self):
+        release = await self._block()
+        future = self.queue.submit("/a/run", self._record("a"))
+        shutdown_task = asyncio.create_task(self.queue.shutdown())
+        release.set()
+        await asyncio.wait_for(shutdown_task, 5)
+        self.assertEqual(future.result(), "a")
+
+    async def test_rejects_operations_after_shutdown(self):
+        await self.queue.shutdown()
+        future = self.queue.submit("/a/run", self._record("a"))
+        with self.assertRaises(RunnerManagerError):
+            await self._result(future)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from juststart.path_index import PathIndex
+
+_path_list = [
+    "/srv/web/run",
+    "/srv/web/worker/run",
+    "/srv/db/run",
+    "/home/user/sv/web/run",
+]
+
+
+class PathIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = PathIndex(_path_list)
+
+    def test_contains(self):
+        self.assertEqual(len(self.index), 4)
+        self.assertIn("/srv/db/run", self.index)
+        self.assertNotIn("/srv/db", self.index)
+
+    def test_select_children(self):
+        self.assertEqual(
+            self.index.select_children("/srv/web"),
+            ["/srv/web/run", "/srv/web/worker/run"],
+        )
+        self.assertEqual(self.index.select_children("/srv/db/run"), ["/srv/db/run"])
+        self.assertEqual(self.index.select_children("/opt"), [])
+
+    def test_select_name(self):
+        self.assertEqual(
+            self.index.select_name("web"),
+            ["/home/user/sv/web/run", "/srv/web/run", "/srv/web/worker/run"],
+        )
+        self.assertEqual(self.index.select_name("worker"), ["/srv/web/worker/run"])
+        # a name is a whole component
+        self.assertEqual(self.index.select_name("wor"), [])
+
+    def test_select_glob(self):
+        self.assertEqual(
+            self.index.select_glob("/srv/*/run"),
+            ["/srv/db/run", "/srv/web/run", "/srv/web/worker/run"],
+        )
+        self.assertEqual(self.index.select_glob("*/sv/*"), ["/home/user/sv/web/run"])
+
+    def test_select_substring(self):
+        self.assertEqual(self.index.select_substring("/wor"), ["/srv/web/worker/run"])
+
+    def test_select_falls_back_from_name_to_glob_to_substring(self):
+        self.assertEqual(self.index.select("db"), ["/srv/db/run"])
+        self.assertEqual(self.index.select("/home/*"), ["/home/user/sv/web/run"])
+        self.assertEqual(self.index.select("ork"), ["/srv/web/worker/run"])
+        self.assertEqual(self.index.select("missing"), [])
+
+    def test_remove_prunes_the_branch(self):
+        self.index.remove("/srv/web/worker/run")
+        self.assertNotIn("/srv/web/worker/run", self.index)
+        self.assertEqual(self.index.select_name("worker"), [])
+        self.assertEqual(self.index.select_children("/srv/web"), ["/srv/web/run"])
+        # removing a path twice, or one never added, is a no-op
+        self.index.remove("/srv/web/worker/run")
+        self.index.remove("/opt/run")
+        self.assertEqual(len(self.index), 3)
+
+    def test_remove_keeps_paths_below(self):
+        self.index.add("/srv/web")
+        self.index.remove("/srv/web")
+        self.assertEqual(
+            self.index.select_children("/srv/web"),
+            ["/srv/web/run", "/srv/web/worker/run"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
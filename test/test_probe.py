@@ -0,0 +1,139 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from juststart.probe import (
+    EXEC,
+    HTTP,
+    TCP,
+    Probe,
+    ProbeScheduler,
+    parse_probe,
+    run_probe,
+)
+
+
+class ParseProbeTest(unittest.TestCase):
+    def test_parses_every_kind(self):
+        for value, probe in [
+            ("exec:check", Probe(EXEC, "check")),
+            ("tcp:8080", Probe(TCP, "127.0.0.1", 8080)),
+            ("tcp:db:5432", Probe(TCP, "db", 5432)),
+            ("http://web:8080/health", Probe(HTTP, "web", 8080, "/health")),
+            ("http://web", Probe(HTTP, "web", 80, "/")),
+        ]:
+            with self.subTest(value=value):
+                self.assertEqual(parse_probe(value), probe)
+
+    def test_rejects_unknown_probes(self):
+        for value in ("exec:", "udp:53", "tcp:web"):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_probe(value)
+
+
+class ProbeTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.status_list = []
+        self.runner = SimpleNamespace(
+            path=str(self.tmp_dir / "run"),
+            template_path=str(self.tmp_dir / "run"),
+            args=[],
+            env={"PATH": "/usr/bin:/bin"},
+            is_running=lambda: True,
+            is_frozen=lambda: False,
+            record_status=self.status_list.append,
+        )
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _create_script(self, name: str, script: str):
+        script_path = self.tmp_dir / name
+        script_path.write_text(f"#!/bin/sh\n{script}")
+        script_path.chmod(0o755)
+
+
+class RunProbeTest(ProbeTestCase):
+    async def test_exec_probe(self):
+        self._create_script("healthy", "exit 0\n")
+        self._create_script("unhealthy", "exit 2\n")
+        self._create_script("slow", "exec sleep 30\n")
+        self.assertIsNone(await run_probe(parse_probe("exec:healthy"), self.runner, 5))
+        self.assertEqual(
+            await run_probe(parse_probe("exec:unhealthy"), self.runner, 5),
+            "exit code 2",
+        )
+        self.assertEqual(
+            await run_probe(parse_probe("exec:slow"), self.runner, 0.2),
+            "timed out after 0.2s",
+        )
+
+    async def test_tcp_probe(self):
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        probe = parse_probe(f"tcp:127.0.0.1:{port}")
+        self.assertIsNone(await run_probe(probe, self.runner, 5))
+        server.close()
+        await server.wait_closed()
+        self.assertIsNotNone(await run_probe(probe, self.runner, 5))
+
+    async def test_http_probe(self):
+        status = b"200 OK"
+
+        async def respond(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.0 " + status + b"\r\n\r\n")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(respond, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        probe = parse_probe(f"http://127.0.0.1:{port}/health")
+        async with server:
+            self.assertIsNone(await run_probe(probe, self.runner, 5))
+            status = b"503 Service Unavailable"
+            self.assertEqual(await run_probe(probe, self.runner, 5), "HTTP status 503")
+
+
+class ProbeSchedulerTest(ProbeTestCase):
+    async def test_reports_a_runner_failing_the_threshold(self):
+        self._create_script("check", '[ ! -e "fail" ]\n')
+        failure_list = []
+        failed = asyncio.Event()
+
+        def on_failure(runner, reason):
+            failure_list.append((runner, reason))
+            failed.set()
+
+        scheduler = ProbeScheduler(asyncio.get_running_loop(), 2, on_failure)
+        worker_future = scheduler.start()
+        try:
+            scheduler.add(self.runner, parse_probe("exec:check"), 0.05, 5, 2)
+            # a healthy probe is recorded once
+            await asyncio.sleep(0.3)
+            self.assertEqual(len(self.status_list), 1)
+            self.assertTrue(self.status_list[0]["probe"]["healthy"])
+            (self.tmp_dir / "fail").touch()
+            await asyncio.wait_for(failed.wait(), 5)
+            self.assertEqual(failure_list, [(self.runner, "exit code 1")])
+            self.assertEqual(
+                [
+                    status["probe"]["failure_num"]
+                    for status in self.status_list
+                    if not status["probe"]["healthy"]
+                ][:2],
+                [1, 2],
+            )
+            scheduler.remove(self.runner.path)
+            self.assertEqual(scheduler.probe_state_dict, {})
+        finally:
+            worker_future.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from juststart.retention import Tombstone, TombstoneStore, read_log_tail
+from juststart.utils import delete_directory_and_empty_parents
+
+
+def _tombstone(path: str, returncode: int) -> Tombstone:
+    return Tombstone(
+        path=path,
+        reason="gc",
+        status="running",
+        pid=1,
+        returncode=returncode,
+        booted_num=1,
+        stopped_time=0,
+    )
+
+
+class TombstoneStoreTest(unittest.TestCase):
+    def test_keeps_the_last_tombstones_of_a_path(self):
+        store = TombstoneStore(2)
+        for returncode in range(3):
+            store.add(_tombstone("/a/run", returncode))
+        self.assertEqual(
+            [tombstone["returncode"] for tombstone in store.get_list("/a/run")],
+            [1, 2],
+        )
+        self.assertEqual(store.get_list("/b/run"), [])
+
+    def test_forgets_the_least_recently_stopped_path(self):
+        store = TombstoneStore(1, max_path_num=2)
+        for path in ("/a/run", "/b/run", "/a/run", "/c/run"):
+            store.add(_tombstone(path, 0))
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.get_list("/b/run"), [])
+        self.assertEqual(len(store.get_list("/a/run")), 1)
+
+    def test_keeps_nothing_with_keep_num_0(self):
+        store = TombstoneStore(0)
+        store.add(_tombstone("/a/run", 0))
+        self.assertEqual(len(store), 0)
+
+
+class ReadLogTailTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.log_path = Path(self._tmp_dir.name) / "log"
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_last_lines(self):
+        self.log_path.write_text("".join(f"line {i}\n" for i in range(10)))
+        self.assertEqual(read_log_tail(str(self.log_path), 2), ["line 8", "line 9"])
+        self.assertEqual(read_log_tail(str(self.log_path), 0), [])
+
+    def test_drops_the_cut_first_line_of_a_large_log(self):
+        self.log_path.write_text("x" * 20000 + "\nlast\n")
+        self.assertEqual(read_log_tail(str(self.log_path), 5), ["last"])
+
+    def test_missing_log(self):
+        self.assertEqual(read_log_tail(str(self.log_path), 5), [])
+
+
+class DeleteDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp_dir.name) / "runner"
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_deletes_the_directory_and_its_empty_parents(self):
+        std_dir = self.root / "srv" / "web" / "std"
+        std_dir.mkdir(parents=True)
+        (std_dir / "log").write_text("log\n")
+        (self.root / "srv" / "db").mkdir()
+        delete_directory_and_empty_parents(std_dir, self.root)
+        self.assertFalse((self.root / "srv" / "web").exists())
+        # not empty
+        self.assertTrue((self.root / "srv" / "db").exists())
+        delete_directory_and_empty_parents(self.root / "srv" / "db", self.root)
+        self.assertEqual(list(self.root.iterdir()), [])
+
+    def test_keeps_directories_outside_the_root(self):
+        outside_dir = Path(self._tmp_dir.name) / "logs"
+        outside_dir.mkdir()
+        self.root.mkdir()
+        delete_directory_and_empty_parents(outside_dir, self.root)
+        delete_directory_and_empty_parents(self.root, self.root)
+        self.assertTrue(outside_dir.exists())
+        self.assertTrue(self.root.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import signal
+import tempfile
+import unittest
+from pathlib import Path
+from threading import Thread
+from time import monotonic, sleep
+
+from juststart.errors import RunnerError
+from juststart.runner import Runner
+from juststart.runner_status import (
+    BOOTING,
+    DESTROYED,
+    RUNNING,
+    RUNNING_READY,
+    STOPPED,
+    STOPPING,
+)
+from juststart.spawn import LOST_RETURNCODE, SpawnedProcess
+
+
+class RunnerTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.changed_list = []
+        self.updated_list = []
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _create_runner(
+        self, script: str = "exec sleep 30\n", auto_restart: int = 0, **kwargs
+    ) -> Runner:
+        runner_dir = self.tmp_dir / "service"
+        runner_dir.mkdir(exist_ok=True)
+        run_path = runner_dir / "run"
+        run_path.write_text(f"#!/bin/sh\n{script}")
+        run_path.chmod(0o755)
+        std_dir = self.tmp_dir / "std"
+        std_dir.mkdir(exist_ok=True)
+        for name in ("stdin", "stdout", "stderr"):
+            (std_dir / name).touch()
+        return Runner(
+            str(run_path),
+            [],
+            {"PATH": "/usr/bin:/bin"},
+            auto_restart,
+            str(std_dir / "stdin"),
+            str(std_dir / "stdout"),
+            str(std_dir / "stderr"),
+            lambda runner, status: self.changed_list.append(status.key),
+            status_updated_hook=lambda runner, status: self.updated_list.append(
+                dict(status.data)
+            ),
+            **kwargs,
+        )
+
+
+class RunnerStatusHookTest(RunnerTestCase):
+    def test_data_updates_do_not_run_the_status_changed_hook(self):
+        runner = self._create_runner()
+        runner._set_status(RUNNING_READY)
+        runner._set_status(RUNNING)
+        runner.record_status({"watchdog": {"reason": "max_rss"}})
+        runner.record_status({"skipped_run_num": 1})
+        self.assertEqual(self.changed_list, [RUNNING_READY, RUNNING])
+        self.assertEqual(len(self.updated_list), 2)
+        self.assertEqual(self.updated_list[-1]["skipped_run_num"], 1)
+        self.assertEqual(runner.status.data["watchdog"], {"reason": "max_rss"})
+
+    def test_recorded_data_is_kept_across_status_changes(self):
+        runner = self._create_runner()
+        runner.record_status({"probe_restart_num": 2})
+        # nothing to update before the first status
+        self.assertEqual(self.updated_list, [])
+        runner._set_status(RUNNING_READY)
+        self.assertEqual(runner.status.data["probe_restart_num"], 2)
+
+
+class RunnerLifecycleTest(RunnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = Thread(target=self.loop.run_forever)
+        self.loop_thread.start()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+        self.loop.close()
+        super().tearDown()
+
+    def _wait(self, predicate, timeout: float = 10) -> bool:
+        end_time = monotonic() + timeout
+        while monotonic() < end_time:
+            if predicate():
+                return True
+            sleep(0.05)
+        return predicate()
+
+    def test_start_and_stop(self):
+        runner = self._create_runner(auto_restart=-1)
+        runner.start(self.loop)
+        self.assertTrue(self._wait(runner.is_running))
+        self.assertEqual(os.getsid(runner.pid), runner.pid)
+        self.assertIsNone(runner.get_returncode())
+        runner.stop()
+        self.assertFalse(runner.is_running())
+        self.assertEqual(runner.returncode, -signal.SIGTERM)
+        self.assertEqual(
+            self.changed_list,
+            [BOOTING, RUNNING_READY, RUNNING, STOPPING, STOPPED, DESTROYED],
+        )
+        # the monitor is cancelled, it does not restart the process
+        sleep(0.3)
+        self.assertFalse(runner.is_running())
+        with self.assertRaises(RunnerError):
+            runner.stop()
+
+    def test_lost_returncode_is_unknown(self):
+        runner = self._create_runner()
+        runner.process = SpawnedProcess([runner.path], 0)
+        runner.process.returncode = LOST_RETURNCODE
+        self.assertIsNone(runner.get_returncode())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from juststart.admission import BATCH, NORMAL
+from juststart.errors import RunnerConfigError
+from juststart.runner_config import _parse_config_frag, get_runner_config
+
+
+class ParseConfigFragTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _parse(self, text: str) -> dict:
+        path = self.tmp_dir / "config"
+        path.write_text(text)
+        return _parse_config_frag(str(path))
+
+    def test_parses_typed_values(self):
+        self.assertEqual(
+            self._parse(
+                "auto_restart=3\nmax_rss=1K\nprobe_interval=1m\n"
+                "stdin_pipe=yes\npriority_class=Batch\n"
+            ),
+            {
+                "auto_restart": 3,
+                "max_rss": 1024,
+                "probe_interval": 60,
+                "stdin_pipe": True,
+                "priority_class": BATCH,
+            },
+        )
+
+    def test_minus_key_resets_to_the_default(self):
+        self.assertEqual(
+            self._parse(
+                "-auto_restart\n-stdout\n-priority_class\n-probe_interval\n"
+                "-ready_timeout\n-down_timeout\n-stdin_pipe\n-max_rss\n"
+            ),
+            {
+                "auto_restart": 0,
+                "stdout": None,
+                "priority_class": NORMAL,
+                "probe_interval": 10,
+                "ready_timeout": 30,
+                "down_timeout": 5,
+                "stdin_pipe": False,
+                "max_rss": None,
+            },
+        )
+
+    def test_minus_key_matches_the_whole_key(self):
+        # neither probe nor stdin are reset
+        self.assertEqual(
+            self._parse("-probe_interval\n-stdin_pipe\n"),
+            {"probe_interval": 10, "stdin_pipe": False},
+        )
+
+    def test_rejects_invalid_values(self):
+        for text in ("auto_restart=yes\n", "priority_class=urgent\n"):
+            with self.subTest(text=text):
+                with self.assertRaises(RunnerConfigError):
+                    self._parse(text)
+
+
+class GetRunnerConfigTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.default_dir = self.tmp_dir / "default"
+        self.work_dir = self.tmp_dir / "web"
+        self.default_dir.mkdir()
+        self.work_dir.mkdir()
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _get_config(self):
+        return get_runner_config(
+            str(self.work_dir / "run"),
+            str(self.work_dir),
+            str(self.default_dir),
+            str(self.tmp_dir / "tmp"),
+        )
+
+    def test_work_directory_resets_a_default_setting(self):
+        (self.default_dir / "config").write_text(
+            "priority_class=batch\nprobe=tcp:8080\nprobe_interval=2\n"
+        )
+        config = self._get_config()
+        self.assertEqual(config.priority_class, BATCH)
+        self.assertEqual(config.probe_interval, 2)
+        (self.work_dir / "config").write_text("-priority_class\n-probe_interval\n")
+        config = self._get_config()
+        self.assertEqual(config.priority_class, NORMAL)
+        self.assertEqual(config.probe_interval, 10)
+        self.assertEqual(config.probe, "tcp:8080")
+
+    def test_std_paths_default_to_the_runtime_directory(self):
+        (self.work_dir / "config").write_text("-stdout\n")
+        config = self._get_config()
+        std_dir = Path(f"{self.tmp_dir / 'tmp'}/{self.work_dir}") / "std"
+        self.assertEqual(Path(config.stdout), std_dir / "log")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,419 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from time import monotonic, sleep
+
+from juststart.errors import RunnerError, RunnerManagerError
+from juststart.history_db import EXIT, START, query_history
+from juststart.runner_manager import RunnerManager
+from juststart.runner_status import FROZEN, RUNNING
+from juststart.status_snapshot import read_status_snapshot_dir
+
+
+class RunnerManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.default_dir = self.tmp_dir / "default"
+        self.default_dir.mkdir()
+        self.runtime_dir = self.tmp_dir / "tmp"
+        self.runtime_dir.mkdir()
+        self.runner_list_path = self.tmp_dir / "runner.list"
+        self.manager = None
+
+    def tearDown(self):
+        if self.manager:
+            self.manager.stop_manager()
+        self._tmp_dir.cleanup()
+
+    def _create_service(
+        self, name: str, script: str = "exec sleep 30\n", config: str = None
+    ) -> str:
+        """Write a service directory, return the path of its run script"""
+        service_dir = self.tmp_dir / "service" / name
+        service_dir.mkdir(parents=True)
+        run_path = service_dir / "run"
+        run_path.write_text(f"#!/bin/sh\n{script}")
+        run_path.chmod(0o755)
+        if config is not None:
+            (service_dir / "config").write_text(config)
+        return str(run_path)
+
+    def _create_manager(self, **kwargs) -> RunnerManager:
+        self.manager = RunnerManager(
+            str(self.runner_list_path),
+            str(self.default_dir),
+            str(self.runtime_dir),
+            **kwargs,
+        )
+        return self.manager
+
+    def _wait(self, predicate, timeout: float = 10) -> bool:
+        end_time = monotonic() + timeout
+        while monotonic() < end_time:
+            if predicate():
+                return True
+            sleep(0.05)
+        return predicate()
+
+
+class ConstructorTest(RunnerManagerTestCase):
+    def test_failure_leaves_no_thread_behind(self):
+        def get_thread_set() -> set[threading.Thread]:
+            return {thread for thread in threading.enumerate() if not thread.daemon}
+
+        thread_set = get_thread_set()
+        with self.assertRaises(FileNotFoundError):
+            # the status snapshot cannot be created in a missing directory
+            RunnerManager(
+                str(self.runner_list_path),
+                str(self.default_dir),
+                str(self.tmp_dir / "missing"),
+            )
+        self.assertEqual(get_thread_set(), thread_set)
+
+
+class HistoryTest(RunnerManagerTestCase):
+    def _query(self, kind: str) -> list[dict]:
+        return query_history(str(self.tmp_dir), kind=kind)
+
+    def test_records_the_exit_of_a_process_that_is_not_restarted(self):
+        path = self._create_service("once", "exit 3\n", "-auto_restart\n")
+        manager = self._create_manager(history_path=str(self.tmp_dir / "history.db"))
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(lambda: not runner.is_monitoring()))
+        self.assertEqual(runner.status.data["returncode"], 3)
+        # written by the monitor, the runner is still in memory
+        self.assertTrue(self._wait(lambda: self._query(EXIT)))
+        exit_row = self._query(EXIT)[0]
+        self.assertEqual((exit_row["path"], exit_row["returncode"]), (path, 3))
+        self.assertEqual(exit_row["pid"], runner.pid)
+        self.assertLess(exit_row["time"] - self._query(START)[0]["time"], 2)
+        self.assertIn(path, manager.runner_dict)
+        manager.clean_runner()
+        manager.core.history.close()
+        manager.core.history = None
+        # forget does not record it again
+        self.assertEqual(len(self._query(EXIT)), 1)
+
+
+class StatusSnapshotTest(RunnerManagerTestCase):
+    def _get_row(self, path: str) -> dict or None:
+        snapshot = read_status_snapshot_dir(str(self.runtime_dir))
+        return snapshot and snapshot["runners"].get(path)
+
+    def test_refreshes_rows_on_status_changes(self):
+        path = self._create_service("once", "sleep 0.5; exit 3\n", "-auto_restart\n")
+        manager = self._create_manager()
+        manager.start_runner(path)
+        self.assertTrue(
+            self._wait(lambda: (self._get_row(path) or {}).get("running"), 5)
+        )
+        # the exit is reported by the monitor, before the next liveness sweep
+        self.assertTrue(
+            self._wait(
+                lambda: self._get_row(path)["runner"]["status"]["data"].get(
+                    "returncode"
+                )
+                == 3,
+                5,
+            )
+        )
+        self.assertFalse(self._get_row(path)["running"])
+
+
+class RestartTest(RunnerManagerTestCase):
+    def _start(self, path: str):
+        runner = self.manager.start_runner(path)
+        self.assertTrue(self._wait(runner.is_running))
+        return runner
+
+    def test_start_stop_keeps_the_old_process_until_the_new_one_is_ready(self):
+        path = self._create_service("web")
+        manager = self._create_manager()
+        old_runner = self._start(path)
+        manager.restart_runner(path, "start_stop")
+        new_runner = manager.get_runner(path)
+        self.assertIsNot(new_runner, old_runner)
+        self.assertTrue(new_runner.is_running())
+        self.assertFalse(old_runner.is_running())
+        self.assertNotEqual(new_runner.pid, old_runner.pid)
+
+    def test_start_stop_keeps_the_old_process_if_the_new_one_fails(self):
+        path = self._create_service(
+            "web", "[ -e started ] && exit 1\ntouch started\nexec sleep 30\n"
+        )
+        manager = self._create_manager()
+        old_runner = self._start(path)
+        with self.assertRaises(RunnerError):
+            manager.restart_runner(path, "start_stop")
+        self.assertIs(manager.get_runner(path), old_runner)
+        self.assertTrue(old_runner.is_running())
+
+    def test_rolling_restart_restarts_batch_by_batch(self):
+        path_list = [self._create_service(f"web{i}") for i in range(3)]
+        manager = self._create_manager()
+        pid_list = [self._start(path).pid for path in path_list]
+        result = manager.rolling_restart(path_list, batch_size=2)
+        self.assertEqual(result, {"restarted": path_list, "failed": [], "skipped": []})
+        for path, pid in zip(path_list, pid_list):
+            runner = manager.get_runner(path)
+            self.assertTrue(runner.is_running())
+            self.assertNotEqual(runner.pid, pid)
+        self.assertEqual(manager.core.operation_queue.get_stats()["running"], 0)
+
+    def test_rolling_restart_stops_at_the_first_failed_batch(self):
+        path_list = [
+            self._create_service("broken", "exit 1\n", "-auto_restart\n"),
+            self._create_service("web"),
+        ]
+        manager = self._create_manager()
+        manager.start_runner(path_list[0])
+        self._start(path_list[1])
+        result = manager.rolling_restart(path_list, batch_size=1)
+        self.assertEqual(
+            result, {"restarted": [], "failed": path_list[:1], "skipped": path_list[1:]}
+        )
+
+
+class ProbeTest(RunnerManagerTestCase):
+    def test_restarts_a_runner_failing_its_probe(self):
+        path = self._create_service(
+            "web",
+            config="probe=exec:check\nprobe_interval=0.1\nprobe_failure_threshold=2\n",
+        )
+        check_path = Path(path).parent / "check"
+        check_path.write_text('#!/bin/sh\n[ ! -e "fail" ]\n')
+        check_path.chmod(0o755)
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(runner.is_running))
+        self.assertTrue(self._wait(lambda: "probe" in runner.status.data))
+        self.assertTrue(runner.status.data["probe"]["healthy"])
+        (check_path.parent / "fail").touch()
+        self.assertTrue(
+            self._wait(
+                lambda: manager.get_runner(path).status.data.get("probe_restart_num")
+            )
+        )
+        (check_path.parent / "fail").unlink()
+        new_runner = manager.get_runner(path)
+        self.assertIsNot(new_runner, runner)
+        self.assertFalse(runner.is_running())
+        self.assertTrue(self._wait(new_runner.is_running))
+        self.assertEqual(new_runner.status.data["probe_restart_reason"], "exit code 1")
+
+
+class InstanceTest(RunnerManagerTestCase):
+    def test_scale_runner_up_and_down(self):
+        path = self._create_service("worker", 'exec sleep 30 "$JUSTSTART_INSTANCE"\n')
+        manager = self._create_manager()
+        instance_path_list = [f"{path}@{i}" for i in range(1, 4)]
+        self.assertEqual(
+            manager.scale_runner(path, 3),
+            {"started": instance_path_list, "stopped": []},
+        )
+        self.assertEqual(manager.get_instance_path_list(path), instance_path_list)
+        for i, instance_path in enumerate(instance_path_list, 1):
+            runner = manager.get_runner(instance_path)
+            self.assertTrue(self._wait(runner.is_running))
+            self.assertEqual(runner.env["JUSTSTART_INSTANCE"], str(i))
+            self.assertEqual(Path(runner.stdout).parent.name, f"std@{i}")
+        # named instances are left alone
+        manager.start_runner(f"{path}@blue")
+        self.assertEqual(
+            manager.scale_runner(path, 1),
+            {"started": [], "stopped": instance_path_list[1:]},
+        )
+        self.assertEqual(
+            manager.get_instance_path_list(path), [f"{path}@1", f"{path}@blue"]
+        )
+        self.assertEqual(manager.scale_runner(path, 1), {"started": [], "stopped": []})
+
+    def test_scale_runner_rejects_invalid_numbers(self):
+        path = self._create_service("worker")
+        manager = self._create_manager()
+        with self.assertRaises(RunnerManagerError):
+            manager.scale_runner(path, -1)
+
+
+class DownScriptTest(RunnerManagerTestCase):
+    def _create_down_script(self, path: str, script: str):
+        down_path = Path(f"{path}.down")
+        down_path.write_text(f"#!/bin/sh\n{script}")
+        down_path.chmod(0o755)
+
+    def test_runs_the_down_script_before_stopping(self):
+        path = self._create_service("web", "echo $$ > pid\nexec sleep 30\n")
+        self._create_down_script(
+            path, 'kill -0 "$(cat pid)" && echo "alive $1" > marker\n'
+        )
+        (Path(path).parent / "args").write_text("arg\n")
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(lambda: (Path(path).parent / "pid").exists()))
+        manager.stop_runner(path)
+        self.assertFalse(runner.is_running())
+        self.assertEqual((Path(path).parent / "marker").read_text(), "alive arg\n")
+
+    def test_kills_a_down_script_running_too_long(self):
+        path = self._create_service("web", config="down_timeout=0.3\n")
+        self._create_down_script(path, "exec sleep 30\n")
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(runner.is_running))
+        start_time = monotonic()
+        manager.stop_runner(path)
+        self.assertLess(monotonic() - start_time, 5)
+        self.assertFalse(runner.is_running())
+
+    def test_runs_the_down_scripts_of_a_list_at_once(self):
+        path_list = [self._create_service(f"web{i}") for i in range(4)]
+        for path in path_list:
+            self._create_down_script(path, "sleep 1\ntouch done\n")
+        manager = self._create_manager()
+        for path in path_list:
+            self.assertTrue(self._wait(manager.start_runner(path).is_running))
+        start_time = monotonic()
+        self.assertEqual(
+            manager.stop_runner_list(path_list), {path: "ok" for path in path_list}
+        )
+        self.assertLess(monotonic() - start_time, 3)
+        for path in path_list:
+            self.assertTrue((Path(path).parent / "done").exists())
+            self.assertNotIn(path, manager.runner_dict)
+
+
+class StdinPipeTest(RunnerManagerTestCase):
+    def test_sends_input_to_the_stdin_pipe(self):
+        path = self._create_service(
+            "repl",
+            'while read -r line; do echo "got $line" >> received; done\n',
+            "stdin_pipe=yes\n",
+        )
+        received_path = Path(path).parent / "received"
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(runner.is_running))
+        self.assertEqual(manager.send_input_runner(path, b"hello\n"), 6)
+        self.assertTrue(self._wait(received_path.exists))
+        self.assertTrue(self._wait(lambda: received_path.read_text() == "got hello\n"))
+        # the pipe of the new process is written after a restart
+        manager.restart_runner(path)
+        self.assertTrue(self._wait(manager.get_runner(path).is_running))
+        manager.send_input_runner(path, b"again\n")
+        self.assertTrue(
+            self._wait(lambda: received_path.read_text() == "got hello\ngot again\n")
+        )
+
+    def test_reports_runners_without_a_pipe(self):
+        pipe_path = self._create_service(
+            "repl", "while read -r line; do :; done\n", "stdin_pipe=yes\n"
+        )
+        path = self._create_service("web")
+        manager = self._create_manager()
+        for runner_path in (pipe_path, path):
+            self.assertTrue(self._wait(manager.start_runner(runner_path).is_running))
+        with self.assertRaises(RunnerError):
+            manager.send_input_runner(path, b"hello\n")
+        result = manager.send_input_runner_list([pipe_path, path], b"hello\n")
+        self.assertEqual(result[pipe_path], 6)
+        self.assertIn("not a pipe", result[path])
+        manager.stop_runner(pipe_path)
+        with self.assertRaises(RunnerError):
+            manager.send_input_runner(pipe_path, b"hello\n")
+
+
+class FreezeTest(RunnerManagerTestCase):
+    def _get_process_state(self, pid: int) -> str:
+        # the field after the parenthesized command name of /proc/<pid>/stat
+        return Path(f"/proc/{pid}/stat").read_text().rpartition(")")[2].split()[0]
+
+    @unittest.skipUnless(Path("/proc/self/stat").exists(), "needs /proc")
+    def test_freeze_and_thaw(self):
+        path = self._create_service("web")
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(runner.is_running))
+        self.assertEqual(manager.freeze_runner_list([path]), {path: "ok"})
+        self.assertEqual(runner.status.key, FROZEN)
+        self.assertTrue(self._wait(lambda: self._get_process_state(runner.pid) == "T"))
+        # freezing again is a no-op
+        self.assertEqual(manager.freeze_runner_list([path]), {path: "ok"})
+        self.assertEqual(manager.thaw_runner_list([path]), {path: "ok"})
+        self.assertEqual(runner.status.key, RUNNING)
+        self.assertTrue(self._wait(lambda: self._get_process_state(runner.pid) != "T"))
+        self.assertIn("not frozen", manager.thaw_runner_list([path])[path])
+
+    def test_stops_a_frozen_runner(self):
+        path = self._create_service("web")
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(runner.is_running))
+        manager.freeze_runner_list([path])
+        start_time = monotonic()
+        manager.stop_runner(path)
+        # stopped by SIGTERM, not killed after the timeout
+        self.assertLess(monotonic() - start_time, 4)
+        self.assertFalse(runner.is_running())
+
+    def test_reports_runners_that_are_not_running(self):
+        path = self._create_service("once", "exit 0\n", "-auto_restart\n")
+        missing_path = str(self.tmp_dir / "missing" / "run")
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(lambda: not runner.is_monitoring()))
+        result = manager.freeze_runner_list([path, missing_path])
+        self.assertIn("not running", result[path])
+        self.assertNotEqual(result[missing_path], "ok")
+        self.assertIn("not frozen", manager.thaw_runner_list([path])[path])
+
+
+class GarbageCollectionTest(RunnerManagerTestCase):
+    def test_collects_stopped_runners_and_keeps_a_tombstone(self):
+        path = self._create_service("once", "echo bye\nexit 3\n", "-auto_restart\n")
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(lambda: not runner.is_monitoring()))
+        std_dir = Path(runner.stdout).parent
+        self.assertTrue(std_dir.is_dir())
+        self.assertEqual(manager.clean_runner(), [path])
+        self.assertNotIn(path, manager.runner_dict)
+        self.assertFalse(std_dir.exists())
+        # the runtime root itself is kept
+        self.assertTrue((self.runtime_dir / "runner").is_dir())
+        (tombstone,) = manager.tombstone_store.get_list(path)
+        self.assertEqual(
+            (tombstone["reason"], tombstone["returncode"], tombstone["log_tail"]),
+            ("gc", 3, ["bye"]),
+        )
+        self.assertEqual(manager.get_instrumentation_stats()["gc"]["collected"], 1)
+
+    def test_keeps_running_runners(self):
+        path = self._create_service("web")
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        self.assertTrue(self._wait(runner.is_running))
+        self.assertEqual(manager.clean_runner(), [])
+        self.assertIs(manager.get_runner(path), runner)
+
+    def test_keeps_the_std_directory_shared_with_another_runner(self):
+        path = self._create_service("web")
+        worker_path = str(Path(path).parent / "worker")
+        Path(worker_path).write_text("#!/bin/sh\nexec sleep 30\n")
+        Path(worker_path).chmod(0o755)
+        manager = self._create_manager()
+        runner = manager.start_runner(path)
+        worker_runner = manager.start_runner(worker_path)
+        self.assertTrue(self._wait(runner.is_running))
+        self.assertTrue(self._wait(worker_runner.is_running))
+        self.assertEqual(runner.stdout, worker_runner.stdout)
+        manager.stop_runner(path)
+        self.assertTrue(Path(worker_runner.stdout).exists())
+        manager.stop_runner(worker_path)
+        self.assertFalse(Path(worker_runner.stdout).parent.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import multiprocessing
+import tempfile
+import unittest
+from pathlib import Path
+from time import monotonic, sleep
+
+from juststart.daemon import _start_shards
+from juststart.errors import RunnerManagerError
+from juststart.shard import (
+    ShardedRunnerManager,
+    _ShardProxy,
+    get_shard_filter,
+    get_shard_index,
+)
+
+
+class ShardIndexTest(unittest.TestCase):
+    def test_is_stable_and_in_range(self):
+        for path in ("/srv/web/run", "/srv/db/run", "/home/user/sv/web/run"):
+            with self.subTest(path=path):
+                shard_index = get_shard_index(path, 4)
+                self.assertIn(shard_index, range(4))
+                self.assertEqual(get_shard_index(path, 4), shard_index)
+
+    def test_instances_follow_their_template(self):
+        for instance in ("1", "2", "blue"):
+            with self.subTest(instance=instance):
+                self.assertEqual(
+                    get_shard_index(f"/srv/web/run@{instance}", 8),
+                    get_shard_index("/srv/web/run", 8),
+                )
+
+    def test_filter(self):
+        path_list = [f"/srv/{i}/run" for i in range(20)]
+        shard_path_list_list = [
+            list(filter(get_shard_filter(shard_index, 3), path_list))
+            for shard_index in range(3)
+        ]
+        self.assertEqual(sorted(sum(shard_path_list_list, [])), sorted(path_list))
+
+
+class _FakeRunnerManager:
+    def __init__(self, path_list: list[str]):
+        self.path_list = path_list
+
+    def select_runner_path_list(self, selector_list: list[str], kind: str = None):
+        if kind == "name":
+            return [path for path in self.path_list if selector_list[0] in path]
+        return []
+
+    def stop_runner_list(self, path_list: list[str]) -> dict[str, str]:
+        return {path: "ok" for path in path_list}
+
+    def rolling_restart(self, path_list, batch_size=1, pause=0, strategy=None):
+        return {"restarted": path_list, "failed": [], "skipped": []}
+
+
+class _BrokenRunnerManager:
+    def get_runner(self, path):
+        raise ConnectionRefusedError(path)
+
+
+class ShardedRunnerManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.path_list = [f"/srv/{i}/run" for i in range(12)]
+        shard_list = []
+        for shard_index in range(3):
+            shard_path_list = list(
+                filter(get_shard_filter(shard_index, 3), self.path_list)
+            )
+            shard_list.append((_FakeRunnerManager(shard_path_list), None))
+        self.manager = ShardedRunnerManager(None, shard_list)
+
+    def tearDown(self):
+        self.manager.stop_manager()
+
+    def test_merges_results_in_the_order_of_the_paths(self):
+        result = self.manager.stop_runner_list(list(reversed(self.path_list)))
+        self.assertEqual(list(result), list(reversed(self.path_list)))
+
+    def test_selects_across_shards(self):
+        self.assertEqual(
+            self.manager.select_runner_path_list(["/srv/1"]),
+            ["/srv/1/run", "/srv/10/run", "/srv/11/run"],
+        )
+
+    def test_rolling_restart_batches_span_shards(self):
+        result = self.manager.rolling_restart(self.path_list, batch_size=5)
+        self.assertEqual(sorted(result["restarted"]), sorted(self.path_list))
+        self.assertEqual(result["failed"], [])
+
+    def test_reports_a_lost_shard_as_a_manager_error(self):
+        proxy = _ShardProxy(1, _BrokenRunnerManager())
+        with self.assertRaises(RunnerManagerError):
+            proxy.get_runner("/srv/1/run")
+
+
+class ShardProcessTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.config_dir = Path(self._tmp_dir.name)
+        self.shard_list, self.stop_shards = _start_shards(
+            self.config_dir, b"password", 2
+        )
+
+    def tearDown(self):
+        self.stop_shards()
+        self._tmp_dir.cleanup()
+
+    def _get_shard_process(self, shard_index: int) -> multiprocessing.Process:
+        for process in multiprocessing.active_children():
+            if process.name == f"juststart-shard{shard_index}":
+                return process
+
+    def test_serves_every_shard(self):
+        manager = ShardedRunnerManager(None, self.shard_list)
+        try:
+            self.assertEqual(manager.get_runner_status_dict(), {})
+            self.assertEqual(
+                list(manager.get_instrumentation_stats()), ["shard0", "shard1"]
+            )
+        finally:
+            manager.executor.shutdown()
+
+    def test_starts_a_dead_shard_again(self):
+        old_shard = self.shard_list[0]
+        process = self._get_shard_process(0)
+        process.kill()
+        process.join()
+        end_time = monotonic() + 60
+        while self.shard_list[0] is old_shard and monotonic() < end_time:
+            sleep(0.1)
+        self.assertIsNot(self.shard_list[0], old_shard)
+        new_process = self._get_shard_process(0)
+        self.assertTrue(new_process.is_alive())
+        self.assertNotEqual(new_process.pid, process.pid)
+        self.assertEqual(self.shard_list[0][0].get_runner_status_dict(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
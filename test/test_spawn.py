@@ -0,0 +1,93 @@
+import os
+import signal
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from time import monotonic, sleep
+
+from juststart.spawn import (
+    LOST_RETURNCODE,
+    POPEN,
+    POSIX_SPAWN,
+    SpawnedProcess,
+    get_known_returncode,
+    is_posix_spawn_supported,
+    spawn,
+)
+
+
+class GetKnownReturncodeTest(unittest.TestCase):
+    def test_lost_returncode_is_unknown(self):
+        self.assertIsNone(get_known_returncode(LOST_RETURNCODE))
+        self.assertIsNone(get_known_returncode(None))
+        self.assertEqual(get_known_returncode(0), 0)
+        self.assertEqual(get_known_returncode(-signal.SIGKILL), -signal.SIGKILL)
+
+
+@unittest.skipUnless(is_posix_spawn_supported(), "posix_spawn is not supported")
+class SpawnTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.process_list = []
+
+    def tearDown(self):
+        for process in self.process_list:
+            process.kill()
+            process.wait()
+        self._tmp_dir.cleanup()
+
+    def _spawn(self, script: str, backend: str, cwd: str = None):
+        stdout_path = self.tmp_dir / f"{backend}.stdout"
+        with open(os.devnull) as stdin, open(stdout_path, "w") as stdout:
+            process = spawn(
+                ["/bin/sh", "-c", script],
+                cwd or str(self.tmp_dir),
+                stdin,
+                stdout,
+                stdout,
+                {"PATH": "/usr/bin:/bin"},
+                backend=backend,
+            )
+        self.process_list.append(process)
+        return process, stdout_path
+
+    def test_backends_run_in_cwd_in_a_new_session(self):
+        work_dir = self.tmp_dir / "work"
+        work_dir.mkdir()
+        for backend in (POPEN, POSIX_SPAWN):
+            with self.subTest(backend=backend):
+                process, stdout_path = self._spawn(
+                    "pwd; exec sleep 30", backend, str(work_dir)
+                )
+                self.assertEqual(os.getsid(process.pid), process.pid)
+                end_time = monotonic() + 5
+                while not stdout_path.read_text() and monotonic() < end_time:
+                    sleep(0.05)
+                self.assertEqual(
+                    stdout_path.read_text().strip(), str(work_dir.resolve())
+                )
+                process.terminate()
+                self.assertEqual(process.wait(timeout=5), -signal.SIGTERM)
+
+    def test_wait_with_timeout(self):
+        process, _ = self._spawn("exec sleep 30", POSIX_SPAWN)
+        self.assertIsInstance(process, SpawnedProcess)
+        with self.assertRaises(subprocess.TimeoutExpired):
+            process.wait(timeout=0.1)
+        self.assertIsNone(process.poll())
+        process, _ = self._spawn("exit 3", POSIX_SPAWN)
+        self.assertEqual(process.wait(timeout=5), 3)
+
+    def test_child_reaped_by_another_waiter_loses_its_returncode(self):
+        process, _ = self._spawn("exit 3", POSIX_SPAWN)
+        os.waitpid(process.pid, 0)
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(process.poll(), LOST_RETURNCODE)
+        self.assertEqual(process.wait(), LOST_RETURNCODE)
+        self.assertIsNone(get_known_returncode(process.returncode))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import stat
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from juststart.status_snapshot import (
+    _SEQUENCE_OFFSET,
+    StatusSnapshotWriter,
+    _sequence,
+    get_status_snapshot_path,
+    read_status_snapshot,
+    read_status_snapshot_dir,
+)
+
+
+class StatusSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = self._tmp_dir.name
+        self.path = get_status_snapshot_path(self.tmp_dir)
+        self.loop = asyncio.new_event_loop()
+        self.row_dict = {}
+        self.writer = StatusSnapshotWriter(
+            self.path,
+            self.loop,
+            lambda path_list: {path: self.row_dict.get(path) for path in path_list},
+        )
+
+    def tearDown(self):
+        self.writer.close()
+        self.loop.close()
+        self._tmp_dir.cleanup()
+
+    def _publish(self, row_dict: dict):
+        self.row_dict = row_dict
+        self.writer.mark_dirty(list(row_dict))
+        self.writer.flush()
+
+    def test_reads_published_rows(self):
+        snapshot = read_status_snapshot(self.path)
+        self.assertEqual(snapshot["runners"], {})
+        self.assertEqual(snapshot["pid"], os.getpid())
+        self._publish({"/a/run": {"status": "running"}, "/b/run": {"n": 1}})
+        self.assertEqual(
+            read_status_snapshot(self.path)["runners"],
+            {"/a/run": {"status": "running"}, "/b/run": {"n": 1}},
+        )
+        self._publish({"/a/run": None})
+        self.assertEqual(
+            read_status_snapshot(self.path)["runners"], {"/b/run": {"n": 1}}
+        )
+
+    def test_reads_a_snapshot_grown_past_the_first_mapping(self):
+        row_dict = {f"/srv/{i}/run": {"data": "x" * 100} for i in range(2000)}
+        self._publish(row_dict)
+        self.assertEqual(read_status_snapshot(self.path)["runners"], row_dict)
+
+    def test_does_not_return_a_write_in_progress(self):
+        self._publish({"/a/run": {"n": 1}})
+        # an odd sequence marks a write in progress
+        _sequence.pack_into(self.writer._mmap, _SEQUENCE_OFFSET, self.writer._seq + 1)
+        self.assertIsNone(read_status_snapshot(self.path, retry_num=3))
+        _sequence.pack_into(self.writer._mmap, _SEQUENCE_OFFSET, self.writer._seq)
+        self.assertEqual(
+            read_status_snapshot(self.path)["runners"], {"/a/run": {"n": 1}}
+        )
+
+    def test_is_readable_by_its_owner_only(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_closed_snapshot(self):
+        self.writer.close()
+        self.assertIsNone(read_status_snapshot(self.path))
+        self.assertIsNone(read_status_snapshot_dir(self.tmp_dir))
+
+    def test_builds_rows_in_the_executor(self):
+        thread_list = []
+
+        def get_row_dict(path_list):
+            thread_list.append(threading.current_thread())
+            return {path: {"n": 1} for path in path_list}
+
+        with ThreadPoolExecutor(1) as executor:
+            self.writer.executor = executor
+            self.writer.get_row_dict = get_row_dict
+            self.writer.mark_dirty(["/a/run"])
+            self.loop.run_until_complete(asyncio.sleep(0.2))
+        self.assertEqual(
+            read_status_snapshot(self.path)["runners"], {"/a/run": {"n": 1}}
+        )
+        self.assertNotIn(threading.current_thread(), thread_list)
+
+    def test_merges_shards(self):
+        shard_path = get_status_snapshot_path(self.tmp_dir, 0)
+        shard_writer = StatusSnapshotWriter(
+            shard_path, self.loop, lambda path_list: {"/b/run": {"n": 2}}
+        )
+        try:
+            shard_writer.mark_dirty(["/b/run"])
+            shard_writer.flush()
+            self._publish({"/a/run": {"n": 1}})
+            self.assertEqual(
+                read_status_snapshot_dir(self.tmp_dir)["runners"],
+                {"/a/run": {"n": 1}, "/b/run": {"n": 2}},
+            )
+        finally:
+            shard_writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
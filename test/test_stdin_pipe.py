@@ -0,0 +1,48 @@
+import os
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+
+from juststart.stdin_pipe import (
+    MAX_STDIN_WRITE_SIZE,
+    make_stdin_pipe,
+    open_stdin_pipe,
+    write_stdin_pipe,
+)
+
+
+class StdinPipeTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp_dir.name) / "std" / "in"
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_replaces_a_regular_stdin_file(self):
+        make_stdin_pipe(str(self.path))
+        self.assertTrue(stat.S_ISFIFO(os.stat(self.path).st_mode))
+        self.path.unlink()
+        self.path.write_text("old")
+        make_stdin_pipe(str(self.path))
+        self.assertTrue(stat.S_ISFIFO(os.stat(self.path).st_mode))
+
+    def test_writes_whole_messages_without_blocking(self):
+        read_io, write_fd = open_stdin_pipe(str(self.path))
+        try:
+            self.assertEqual(write_stdin_pipe(write_fd, b"hello\n"), 6)
+            self.assertEqual(read_io.read(6), b"hello\n")
+            with self.assertRaises(ValueError):
+                write_stdin_pipe(write_fd, b"x" * (MAX_STDIN_WRITE_SIZE + 1))
+            # nobody reads, the pipe fills up
+            with self.assertRaises(BlockingIOError):
+                while True:
+                    write_stdin_pipe(write_fd, b"x" * MAX_STDIN_WRITE_SIZE)
+        finally:
+            read_io.close()
+            os.close(write_fd)
+
+
+if __name__ == "__main__":
+    unittest.main()
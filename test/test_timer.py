@@ -0,0 +1,96 @@
+import unittest
+from datetime import datetime
+
+from juststart.timer import CronSchedule, IntervalSchedule, parse_schedule
+
+
+def _timestamp(*args) -> float:
+    return datetime(*args).timestamp()
+
+
+class CronScheduleTest(unittest.TestCase):
+    def test_parses_fields(self):
+        schedule = CronSchedule("*/15 9-17 1,15 * 1-5")
+        self.assertEqual(schedule.minute_set, {0, 15, 30, 45})
+        self.assertEqual(schedule.hour_set, set(range(9, 18)))
+        self.assertEqual(schedule.day_set, {1, 15})
+        self.assertEqual(schedule.month_set, set(range(1, 13)))
+        # cron Monday to Friday, as datetime.weekday()
+        self.assertEqual(schedule.weekday_set, {0, 1, 2, 3, 4})
+
+    def test_sunday_is_0_and_7(self):
+        self.assertEqual(CronSchedule("0 0 * * 0").weekday_set, {6})
+        self.assertEqual(CronSchedule("0 0 * * 7").weekday_set, {6})
+
+    def test_rejects_invalid_expressions(self):
+        for expression in (
+            "* * * *",
+            "60 * * * *",
+            "* 24 * * *",
+            "* * 0 * *",
+            "* * * 13 *",
+            "5-1 * * * *",
+            "*/0 * * * *",
+            "a * * * *",
+        ):
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError):
+                    CronSchedule(expression)
+
+    def test_next_time(self):
+        schedule = CronSchedule("30 2 * * *")
+        self.assertEqual(
+            schedule.next_time(_timestamp(2024, 3, 10, 1, 0)),
+            _timestamp(2024, 3, 10, 2, 30),
+        )
+        self.assertEqual(
+            schedule.next_time(_timestamp(2024, 3, 10, 2, 30)),
+            _timestamp(2024, 3, 11, 2, 30),
+        )
+
+    def test_next_time_skips_to_the_next_month(self):
+        schedule = CronSchedule("0 0 1 * *")
+        self.assertEqual(
+            schedule.next_time(_timestamp(2024, 1, 31, 12, 0)),
+            _timestamp(2024, 2, 1, 0, 0),
+        )
+
+    def test_day_and_weekday_match_either(self):
+        # the 13th or any Friday, 2024-09-06 is a Friday
+        schedule = CronSchedule("0 0 13 * 5")
+        self.assertEqual(
+            schedule.next_time(_timestamp(2024, 9, 1)), _timestamp(2024, 9, 6)
+        )
+        self.assertEqual(
+            schedule.next_time(_timestamp(2024, 9, 12)), _timestamp(2024, 9, 13)
+        )
+
+    def test_restricted_weekday_only(self):
+        # 2024-09-02 is a Monday
+        schedule = CronSchedule("0 8 * * 1")
+        self.assertEqual(
+            schedule.next_time(_timestamp(2024, 9, 3)), _timestamp(2024, 9, 9, 8, 0)
+        )
+
+
+class ParseScheduleTest(unittest.TestCase):
+    def test_intervals(self):
+        for value, interval in (("30s", 30), ("5m", 300), ("every 2h", 7200)):
+            with self.subTest(value=value):
+                schedule = parse_schedule(value)
+                self.assertIsInstance(schedule, IntervalSchedule)
+                self.assertEqual(schedule.next_time(100), 100 + interval)
+
+    def test_aliases(self):
+        schedule = parse_schedule("@daily")
+        self.assertIsInstance(schedule, CronSchedule)
+        self.assertEqual(schedule.minute_set, {0})
+        self.assertEqual(schedule.hour_set, {0})
+
+    def test_rejects_expressions_that_never_fire(self):
+        with self.assertRaises(ValueError):
+            parse_schedule("0 0 31 2 *")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import signal
+import subprocess
+import unittest
+
+from juststart import watchdog
+from juststart.watchdog import ProcessUsage, check_usage_limit
+
+
+class CheckUsageLimitTest(unittest.TestCase):
+    def test_within_budget(self):
+        usage = ProcessUsage(rss=100, cpu_time=1.0)
+        self.assertIsNone(check_usage_limit(usage))
+        self.assertIsNone(check_usage_limit(usage, max_rss=100, max_cpu_time=1.0))
+
+    def test_over_budget(self):
+        usage = ProcessUsage(rss=200, cpu_time=2.0)
+        self.assertEqual(
+            check_usage_limit(usage, max_rss=100),
+            {"reason": "max_rss", "rss": 200, "max_rss": 100},
+        )
+        self.assertEqual(
+            check_usage_limit(usage, max_cpu_time=1.0),
+            {"reason": "max_cpu_time", "cpu_time": 2.0, "max_cpu_time": 1.0},
+        )
+
+
+@unittest.skipUnless(watchdog.is_supported(), "needs /proc")
+class SweepProcessUsageTest(unittest.TestCase):
+    def test_sums_the_usage_of_descendants(self):
+        # the shell waits for its sleep child instead of exec-ing it
+        process = subprocess.Popen(["sh", "-c", "sleep 30; :"], start_new_session=True)
+        try:
+            usage_dict = watchdog.sweep_process_usage([process.pid, os.getpid()])
+            self.assertGreater(usage_dict[process.pid].rss, 0)
+            # the test process is an ancestor, it includes the shell and sleep
+            self.assertGreater(usage_dict[os.getpid()].rss, usage_dict[process.pid].rss)
+        finally:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+    def test_skips_missing_processes(self):
+        process = subprocess.Popen(["true"])
+        process.wait()
+        self.assertEqual(watchdog.sweep_process_usage([process.pid]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()